@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 import os
+import sys
 import dj_database_url
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -38,9 +41,11 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "rest_framework",
 ]
 
 MIDDLEWARE = [
+    "users.middleware.ServerTimingMiddleware",  # first, so "total" covers the whole stack
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -49,10 +54,62 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "users.middleware.QueryBudgetMiddleware",
 ]
 
+# per-request query counting / N+1 warnings (development only)
+QUERY_BUDGET_ENABLED = os.environ.get('QUERY_BUDGET', 'False') == 'True'
+QUERY_BUDGET_MAX_QUERIES = int(os.environ.get('QUERY_BUDGET_MAX_QUERIES', 15))
+QUERY_BUDGET_N_PLUS_ONE = int(os.environ.get('QUERY_BUDGET_N_PLUS_ONE', 3))
+# QueryPlanTests (PostgreSQL): a sequential scan over a table with at least this many rows fails the test
+QUERY_PLAN_SEQSCAN_ROWS = int(os.environ.get('QUERY_PLAN_SEQSCAN_ROWS', 1000))
+
+# Server-Timing header + JSON slow request log on the users.performance logger
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING', 'False') == 'True'
+SERVER_TIMING_SLOW_MS = float(os.environ.get('SERVER_TIMING_SLOW_MS', 500))
+
+# background jobs (users/tasks.py), processed by `manage.py run_jobs`; eager runs them inline instead,
+# the default for `manage.py test` (test classes exercising the queue itself turn it off)
+TESTING = sys.argv[1:2] == ['test']
+JOBS_EAGER = os.environ.get('JOBS_EAGER', str(TESTING)) == 'True'
+JOBS_RETRY_DELAY = int(os.environ.get('JOBS_RETRY_DELAY', 10))# seconds, doubled after every failed attempt
+
+# read-only JSON API under /api/v1/ (users/api.py)
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'users.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+        'users.tasks': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 ROOT_URLCONF = "Final_Project.urls"
 
+# "asgi" serves the site with uvicorn workers (gunicorn.conf.py) and switches the hot views to their async versions
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', str(SERVER_MODE == 'asgi')) == 'True'
+
 
 
 TEMPLATES = [
@@ -65,6 +122,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "users.context_processors.sidebar",
             ],
         },
     },
@@ -93,6 +151,98 @@ else:
         }
     }
 
+# Connection reuse (PostgreSQL only). Each gunicorn worker process gets its own psycopg 3
+# pool, so the server holds up to WEB_CONCURRENCY x DB_POOL_MAX_SIZE connections: keep that
+# under max_connections. A sync worker serves one request at a time; raise the maximum for
+# threaded or asgi workers (run_jobs raises it to --threads + 1 itself). DB_POOL defaults to
+# on when psycopg_pool is installed; DB_POOL=False falls back to persistent connections
+# (CONN_MAX_AGE). Pool statistics of a worker: /ops/db-pool/ (staff only).
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+DB_POOL = os.environ.get('DB_POOL', str(ConnectionPool is not None)) == 'True'
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    if DB_POOL:
+        if ConnectionPool is None:
+            raise ImproperlyConfigured(
+                "DB_POOL=True needs psycopg 3 with its pool (pip install 'psycopg[binary,pool]'), or set DB_POOL=False."
+            )
+        DATABASES['default']['CONN_MAX_AGE'] = 0# the pool keeps the connections, Django must not
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 4 if SERVER_MODE == 'asgi' else 2)),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),# seconds to wait for a free connection
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 600)),
+            'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+            'check': ConnectionPool.check_connection,# health check before handing a connection out
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+        DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+
+# Cache
+# CACHE_BACKEND picks the backend: locmem (per process), file, redis, memcached or db.
+# Use a shared one (redis/memcached/file) when running several gunicorn workers.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+}
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHE_DEFAULT_LOCATIONS = {
+    'locmem': 'chefroots',
+    'file': os.path.join(BASE_DIR, '.cache'),
+    'redis': 'redis://127.0.0.1:6379/1',
+    'memcached': '127.0.0.1:11211',
+    'db': 'django_cache',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.environ.get('CACHE_LOCATION', CACHE_DEFAULT_LOCATIONS[CACHE_BACKEND]),
+        'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', 300)),
+    }
+}
+
+# dashboard recipe card fragments (users/cards.py)
+RECIPE_CARD_CACHE_ALIAS = os.environ.get('RECIPE_CARD_CACHE_ALIAS', 'default')
+RECIPE_CARD_CACHE_TIMEOUT = int(os.environ.get('RECIPE_CARD_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Entries below are invalidated by deleting or versioning keys, which only reaches the other
+# workers through a shared backend; with locmem they stay off (users.E001 if forced on).
+SHARED_CACHE = CACHE_BACKEND != 'locmem'
+# ordered ids of filtered dashboard listings, shared by everyone with the same filters (users/resultcache.py)
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE', str(SHARED_CACHE)) == 'True'
+RESULT_CACHE_TIMEOUT = int(os.environ.get('RESULT_CACHE_TIMEOUT', 60 * 5))
+RESULT_CACHE_MAX_ROWS = int(os.environ.get('RESULT_CACHE_MAX_ROWS', 1000))
+# dashboard facet counts (users/facets.py) and per-user sidebar lists (users/sidebar.py)
+FACET_CACHE_ENABLED = os.environ.get('FACET_CACHE', str(SHARED_CACHE)) == 'True'
+SIDEBAR_CACHE_ENABLED = os.environ.get('SIDEBAR_CACHE', str(SHARED_CACHE)) == 'True'
+
+
+# Sessions
+# SESSION_MODE picks the store: db (a row per session, the default), cache (no database
+# access at all; needs a shared CACHE_BACKEND, sessions are lost on eviction) or
+# cached_db (reads from the cache, writes through to the database).
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+}
+SESSION_MODE = os.environ.get('SESSION_MODE', 'db')
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+SESSION_CACHE_ALIAS = os.environ.get('SESSION_CACHE_ALIAS', 'default')
+SESSION_SAVE_EVERY_REQUEST = False# only save sessions that were modified
+# recommendation filters (users/session_filters.py): 'session', or 'cookie' for a signed
+# cookie of their own so the dashboard never writes the session
+TEMP_FILTERS_STORAGE = os.environ.get('TEMP_FILTERS_STORAGE', 'session')
+TEMP_FILTERS_COOKIE_AGE = 60 * 60 * 24 * 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
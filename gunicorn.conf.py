@@ -0,0 +1,9 @@
+# gunicorn settings, read by the web process in Procfile (PORT / WEB_CONCURRENCY are still picked up by gunicorn)
+import os
+
+if os.environ.get('SERVER_MODE', 'wsgi') == 'asgi':
+    # event-loop workers: a request waiting on the database no longer pins a whole worker process
+    wsgi_app = 'Final_Project.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'Final_Project.wsgi:application'
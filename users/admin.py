@@ -1,6 +1,7 @@
 from django.contrib import admin
 from .models import User
 from .models import ChefProfile,Recipe
+from .models import Job
 
 # Register your models here.
 admin.site.register(User)
@@ -10,4 +11,10 @@ admin.site.register(ChefProfile)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('title', 'chef', 'origin_country', 'created_at')
     search_fields = ('title', 'description')
-    list_filter = ('origin_country', 'meal_type', 'created_at')
\ No newline at end of file
+    list_filter = ('origin_country', 'meal_type', 'created_at')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_after', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('idempotency_key',)
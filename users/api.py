@@ -0,0 +1,214 @@
+"""Read-only REST API, version 1 (mounted at /api/v1/).
+
+    GET /api/v1/recipes/?q=jollof&meal_time=Lunch&fields=id,title,rating_avg
+    GET /api/v1/recipes/<id>/
+    GET /api/v1/recipes/<id>/reviews/
+    GET /api/v1/saved/
+
+Lists use keyset cursors (?cursor=, ?page_size=) and the dashboard filters
+(users/filters.py). Every page runs a fixed number of queries: the rows
+with their chef/user joined, and is_saved as an EXISTS annotation. Responses
+carry an ETag (and Last-Modified for recipes) computed from the loaded rows
+before serialization, so a client revalidating an unchanged page gets a
+304 without the serialization work.
+"""
+import hashlib
+
+from django.db.models import Exists, OuterRef
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import viewsets
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .filters import DEFAULT_ORDERING, filter_recipes
+from .models import Recipe, Review, SavedRecipe
+from .pagination import KeysetPaginator
+from .serializers import RecipeSerializer, ReviewSerializer, SavedRecipeSerializer
+
+
+class KeysetCursorPagination(BasePagination):
+    """DRF adapter of KeysetPaginator; the view's keyset_ordering decides the sort."""
+
+    page_size = 24
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        try:
+            size = int(request.query_params.get('page_size', self.page_size))
+        except ValueError:
+            size = self.page_size
+        size = max(1, min(size, self.max_page_size))
+        ordering = getattr(view, 'keyset_ordering', DEFAULT_ORDERING)
+        self.request = request
+        self.page = KeysetPaginator(size, ordering).paginate(queryset, request.query_params.get('cursor'))
+        return list(self.page)
+
+    def get_next_link(self):
+        if not self.page.has_next():
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), 'cursor', self.page.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+class ConditionalMixin:
+    """ETag / Last-Modified for list and detail responses, checked before serializing.
+
+    Views define fingerprint(obj): what of one object the ETag covers, e.g. (pk, updated_at).
+    """
+
+    def last_modified(self, objects):
+        return None
+
+    def validators(self, objects, extra=()):
+        user = self.request.user.pk if self.request.user.is_authenticated else None
+        state = [user, self.request.query_params.get('fields'), *extra, *(self.fingerprint(obj) for obj in objects)]
+        etag = quote_etag(hashlib.md5(repr(state).encode()).hexdigest())
+        return etag, self.last_modified(objects)
+
+    def conditional(self, etag, last_modified):
+        timestamp = last_modified.timestamp() if last_modified else None
+        return get_conditional_response(self.request._request, etag=etag, last_modified=timestamp)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, '_validators', None)
+        if validators and response.status_code in (200, 304):
+            etag, last_modified = validators
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+            response['Cache-Control'] = 'private, no-cache'# per-user data, always revalidate
+            response['Vary'] = 'Cookie, Authorization'
+        return response
+
+    def conditional_list(self, queryset):
+        rows = self.paginate_queryset(queryset)
+        self._validators = self.validators(rows, extra=[self.paginator.page.next_cursor])
+        not_modified = self.conditional(*self._validators)
+        if not_modified is not None:
+            return not_modified
+        serializer = self.get_serializer(rows, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class FieldsMixin:
+    """?fields=a,b,c -> serializer context, 400 on unknown names."""
+
+    def requested_fields(self):
+        raw = self.request.query_params.get('fields')
+        if not raw:
+            return None
+        fields = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = set(fields) - set(self.get_serializer_class().Meta.fields)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}"})
+        return fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.requested_fields()
+        return context
+
+
+class RecipeViewSet(ConditionalMixin, FieldsMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = RecipeSerializer
+    pagination_class = KeysetCursorPagination
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = Recipe.objects.all()
+        fields = self.requested_fields() or RecipeSerializer.Meta.fields
+        columns = RecipeSerializer.Meta.columns
+        if 'chef' in fields:
+            queryset = queryset.select_related('chef')
+        # read only the columns behind the requested fields (+ what the cursor and ETag need)
+        load = {'id', 'created_at', 'updated_at', 'rating_count', 'rating_avg'}
+        for name in fields:
+            load.update(columns.get(name, [name]))
+        queryset = queryset.only(*load)
+        if 'is_saved' in fields:
+            user = self.request.user
+            queryset = queryset.annotate(is_saved=Exists(SavedRecipe.objects.filter(user=user, recipe=OuterRef('pk'))))
+        if self.action != 'list':
+            return queryset
+
+        params = self.request.query_params
+        # the recommendation profile the dashboard keeps in the session, passed as parameters here
+        # (health_condition/dietary themselves are the tag filters of apply_params)
+        profile = {
+            'health_condition': params.get('health'),
+            'dietary': params.get('diet'),
+            'allergies': params.get('allergies'),
+        }
+        queryset, self.keyset_ordering, _ = filter_recipes(queryset, profile, params)
+        return queryset
+
+    def fingerprint(self, recipe):
+        chef = recipe.chef if 'chef' in recipe._state.fields_cache else None
+        return (
+            recipe.pk, recipe.updated_at.timestamp(), recipe.rating_count, recipe.rating_avg,
+            getattr(recipe, 'is_saved', None), chef and (chef.username, chef.first_name, chef.last_name),
+        )
+
+    def last_modified(self, recipes):
+        return max((recipe.updated_at for recipe in recipes), default=None)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_list(self.get_queryset())
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe = self.get_object()
+        self._validators = self.validators([recipe])
+        not_modified = self.conditional(*self._validators)
+        if not_modified is not None:
+            return not_modified
+        return Response(self.get_serializer(recipe).data)
+
+
+class ReviewViewSet(ConditionalMixin, FieldsMixin, viewsets.GenericViewSet):
+    """Reviews of one recipe, newest first (/api/v1/recipes/<recipe_pk>/reviews/)."""
+
+    serializer_class = ReviewSerializer
+    pagination_class = KeysetCursorPagination
+    permission_classes = [IsAuthenticated]
+    keyset_ordering = ['-created_at', '-id']
+
+    def get_queryset(self):
+        return Review.objects.filter(recipe_id=self.kwargs['recipe_pk']).select_related('user')
+
+    def fingerprint(self, review):
+        return review.pk, review.rating, review.content, review.user.username
+
+    def list(self, request, *args, **kwargs):
+        if not Recipe.objects.filter(pk=self.kwargs['recipe_pk']).exists():
+            raise NotFound()
+        return self.conditional_list(self.get_queryset())
+
+
+class SavedRecipeViewSet(ConditionalMixin, FieldsMixin, viewsets.GenericViewSet):
+    serializer_class = SavedRecipeSerializer
+    pagination_class = KeysetCursorPagination
+    permission_classes = [IsAuthenticated]
+    keyset_ordering = ['-saved_at', '-id']
+
+    def get_queryset(self):
+        return SavedRecipe.objects.filter(user=self.request.user).select_related('recipe__chef')
+
+    def fingerprint(self, saved):
+        recipe = saved.recipe
+        return (
+            recipe.pk, saved.saved_at.timestamp(), recipe.updated_at.timestamp(), recipe.rating_count,
+            recipe.rating_avg, recipe.chef.username, recipe.chef.first_name, recipe.chef.last_name,
+        )
+
+    def last_modified(self, rows):
+        return max((max(row.saved_at, row.recipe.updated_at) for row in rows), default=None)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_list(self.get_queryset())
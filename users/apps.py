@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = "users"
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401  (registers the system checks and model signal handlers)
@@ -0,0 +1,105 @@
+"""Async versions of the hot endpoints, used when the site runs under ASGI (ASYNC_VIEWS).
+
+The database work goes through the async ORM so a request waiting on the
+database does not hold a worker. Template rendering (cards, sidebar context
+processor, messages) is synchronous in Django and is done in one
+sync_to_async hop at the end of each view. Filtering, pagination and context
+building are shared with the sync views in views.py.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404, render
+from django.views.decorators.http import require_POST
+
+from .cards import arecipe_generation, render_recipe_body, render_recipe_cards
+from .facets import recipe_facets
+from .filters import filter_recipes, filter_signature
+from .forms import ReviewForm
+from .models import Recipe, SavedRecipe
+from .pagination import KeysetPaginator
+from .resultcache import acached_page
+from .session_filters import aget_temp_filters
+from .sidebar import ainvalidate_sidebar
+from .views import (
+    RecipeDetailView, RecipeListView, add_validators, conditional_detail, detail_queryset, next_page_urls,
+    recipe_body_context, uses_result_cache,
+)
+
+
+async def _user(request):
+    # share the user with request.user, otherwise the templates would load it a second time
+    request.user = await request.auser()
+    return request.user
+
+
+@require_POST
+async def toggle_recipe_save(request, pk):
+    user = await _user(request)
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=401)
+
+    try:
+        # one transaction, run in a thread: transaction.atomic is not available to async code
+        saved, title, saved_count = await sync_to_async(SavedRecipe.toggle)(user.pk, pk)
+    except Recipe.DoesNotExist:
+        raise Http404("No recipe matches the given query.")
+    await ainvalidate_sidebar(user.pk)
+    return JsonResponse({'saved': saved, 'recipe_title': title, 'saved_count': saved_count})
+
+
+def _render_dashboard(request, page, is_filtered, session_filters):
+    context = {
+        'facets': recipe_facets(session_filters, request.GET),
+        'recipes': page.object_list,
+        'object_list': page.object_list,
+        'page_obj': page,
+        'is_paginated': page.has_next(),
+        'is_filtered': is_filtered,
+        'recipe_cards': render_recipe_cards(page.object_list, request),
+    }
+    context['next_page_url'], context['next_feed_url'] = next_page_urls(request, page)
+    return render(request, RecipeListView.template_name, context)
+
+
+async def dashboard(request):
+    user = await _user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+
+    session_filters = await aget_temp_filters(request)
+    queryset, ordering, is_filtered = filter_recipes(Recipe.objects.select_related('chef'), session_filters, request.GET)
+    paginator = KeysetPaginator(RecipeListView.paginate_by, ordering)
+    cursor = request.GET.get('cursor')
+    page = None
+    if uses_result_cache(request, is_filtered):
+        signature = filter_signature(session_filters, request.GET)
+        page = await acached_page(queryset, Recipe.objects.select_related('chef'), signature, paginator, cursor)
+    if page is None:
+        page = await paginator.apaginate(queryset, cursor)
+    return await sync_to_async(_render_dashboard)(request, page, is_filtered, session_filters)
+
+
+def _render_detail(request, recipe, generation):
+    # the validators need the sidebar, and a body cache miss loads the reviews: both sync, so in this hop
+    not_modified = conditional_detail(request, recipe, generation)
+    if not_modified is not None:
+        return not_modified
+    context = {
+        'recipe': recipe,
+        'object': recipe,
+        'form': ReviewForm(),
+        'is_saved': getattr(recipe, 'is_saved', False),
+        'recipe_body': render_recipe_body(recipe, generation, lambda: recipe_body_context(recipe)),
+    }
+    return add_validators(request, render(request, RecipeDetailView.template_name, context))
+
+
+async def recipe_detail(request, pk):
+    if request.method != 'GET':# review submissions keep using the sync form handling
+        return await sync_to_async(RecipeDetailView.as_view())(request, pk=pk)
+
+    generation = await arecipe_generation(pk)
+    user = await _user(request)
+    recipe = await aget_object_or_404(detail_queryset(user), pk=pk)
+    return await sync_to_async(_render_detail)(request, recipe, generation)
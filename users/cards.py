@@ -0,0 +1,153 @@
+"""Fragment cache for the dashboard recipe cards and the recipe detail body.
+
+A card is cached under a key built from the recipe id, a per-recipe
+generation number, updated_at, the rating aggregates and the chef's display
+names. Model signals bump the generation when a recipe or one of its
+reviews changes. The versioned part of the key means a worker can never serve
+a card older than the row it just read, even with a per-process (locmem)
+cache. With a shared cache (redis, memcached, file) all workers reuse each
+other's renders.
+
+The detail page caches the parts every visitor sees the same way
+(ingredients, directions, review feed) under the same generation plus the
+time of the latest review write; the save
+button, review form and CSRF token are rendered per request around them.
+"""
+import hashlib
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+
+logger = logging.getLogger(__name__)
+
+CARD_TEMPLATE = 'users/partials/recipe_card.html'
+CARD_MARKUP_VERSION = 2# bump when recipe_card.html changes so shared caches drop the old markup
+
+DETAIL_TEMPLATES = {
+    'lists': 'users/partials/recipe_detail_lists.html',
+    'reviews': 'users/partials/recipe_reviews.html',
+}
+DETAIL_MARKUP_VERSION = 2# bump when the detail partials change
+
+STATS = Counter()# per-process hit/miss totals
+
+
+def card_cache():
+    return caches[settings.RECIPE_CARD_CACHE_ALIAS]
+
+
+def generation_key(recipe_id):
+    return f'recipe:{recipe_id}:gen'
+
+
+def bump_recipe_generation(recipe_id):
+    """Invalidate every cached fragment of a recipe (cards, and anything else keyed on its generation)."""
+    cache = card_cache()
+    key = generation_key(recipe_id)
+    try:
+        cache.incr(key)
+    except ValueError:# no generation stored yet
+        cache.set(key, 1, None)
+
+
+def recipe_generation(recipe_id):
+    return card_cache().get(generation_key(recipe_id), 0)
+
+
+async def arecipe_generation(recipe_id):
+    return await card_cache().aget(generation_key(recipe_id), 0)
+
+
+def card_key(recipe, generation):
+    chef = recipe.chef
+    names = hashlib.md5(f'{chef.username}|{chef.first_name}|{chef.last_name}'.encode()).hexdigest()[:8]
+    return (
+        f'recipe_card:v{CARD_MARKUP_VERSION}:{recipe.pk}:{generation}:'
+        f'{recipe.updated_at.timestamp()}:{recipe.rating_count}:{recipe.rating_avg}:{names}'
+    )
+
+
+def render_recipe_cards(recipes, request=None):
+    """Return the HTML of each card in order, rendering only the ones missing from the cache.
+
+    Costs two cache round trips per page (generations, then fragments) plus one
+    write for the misses.
+    """
+    recipes = list(recipes)
+    if not recipes:
+        return []
+    cache = card_cache()
+    generations = cache.get_many([generation_key(recipe.pk) for recipe in recipes])
+    keys = [card_key(recipe, generations.get(generation_key(recipe.pk), 0)) for recipe in recipes]
+    cached = cache.get_many(keys)
+
+    cards = []
+    rendered = {}
+    for recipe, key in zip(recipes, keys):
+        html = cached.get(key)
+        if html is None:
+            html = render_to_string(CARD_TEMPLATE, {'recipe': recipe})
+            rendered[key] = html
+        cards.append(html)
+    if rendered:
+        cache.set_many(rendered, settings.RECIPE_CARD_CACHE_TIMEOUT)
+
+    hits, misses = len(recipes) - len(rendered), len(rendered)
+    record_stats(hits, misses, request)
+    return cards
+
+
+def detail_key(recipe, generation):
+    # last_review_at (annotated by views.detail_queryset) moves on review edits too, which leave
+    # rating_count alone and only bump the generation in the worker that handled them
+    last_review_at = recipe.last_review_at.timestamp() if recipe.last_review_at else 0
+    return (
+        f'recipe_detail:v{DETAIL_MARKUP_VERSION}:{recipe.pk}:{generation}:'
+        f'{recipe.updated_at.timestamp()}:{recipe.rating_count}:{last_review_at}'
+    )
+
+
+def render_recipe_body(recipe, generation, get_context):
+    """Return {'lists': html, 'reviews': html} for the detail page; get_context() is only called on a miss.
+
+    Read the generation before loading the recipe, so a change committed in
+    between cannot be cached under the newer generation.
+    """
+    cache = card_cache()
+    key = detail_key(recipe, generation)
+    body = cache.get(key)
+    if body is None:
+        context = get_context()
+        body = {name: render_to_string(template, context) for name, template in DETAIL_TEMPLATES.items()}
+        cache.set(key, body, settings.RECIPE_CARD_CACHE_TIMEOUT)
+    return body
+
+
+def record_stats(hits, misses, request=None):
+    STATS['hits'] += hits
+    STATS['misses'] += misses
+    if request is not None:# picked up by the timing middleware / debug output
+        request.card_cache_stats = {'hits': hits, 'misses': misses}
+    cache = card_cache()
+    for name, amount in (('hits', hits), ('misses', misses)):
+        if amount:
+            key = f'recipe_card:stats:{name}'
+            if not cache.add(key, amount, None):
+                try:
+                    cache.incr(key, amount)
+                except ValueError:# evicted between add() and incr()
+                    cache.set(key, amount, None)
+    logger.debug("recipe cards: %s hits, %s misses", hits, misses)
+
+
+def shared_stats():
+    """Hit/miss totals across all workers (meaningful with a shared cache backend)."""
+    cache = card_cache()
+    totals = cache.get_many(['recipe_card:stats:hits', 'recipe_card:stats:misses'])
+    return {
+        'hits': totals.get('recipe_card:stats:hits', 0),
+        'misses': totals.get('recipe_card:stats:misses', 0),
+    }
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+SHARED_CACHE_SETTINGS = ['RESULT_CACHE_ENABLED', 'FACET_CACHE_ENABLED', 'SIDEBAR_CACHE_ENABLED']
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    # their invalidations would only reach the process that made the change
+    if settings.CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache':
+        return []
+    enabled = [name for name in SHARED_CACHE_SETTINGS if getattr(settings, name)]
+    if not enabled:
+        return []
+    return [Error(
+        f"{', '.join(enabled)} need a cache shared by every worker, the default cache is the per-process LocMemCache.",
+        hint="Set CACHE_BACKEND to redis, memcached, file or db, or turn these caches off.",
+        id='users.E001',
+    )]
@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from .sidebar import get_sidebar
+
+
+def sidebar(request):
+    # lazy: pages that never render the sidebar lists do not touch the cache
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'sidebar': SimpleLazyObject(lambda: get_sidebar(user))}
@@ -0,0 +1,127 @@
+"""Streaming exports of recipes, reviews and saved-recipe edges (JSONL or CSV, optionally gzipped).
+
+Rows are read with server-side cursors (iterator(chunk_size)) as value
+tuples, encoded one at a time and handed out in ~64 KB chunks, so memory
+stays flat whatever the table size. Used by the export_data command and the
+chef export endpoint (views.export_data).
+"""
+import csv
+import io
+import json
+import zlib
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Recipe, Review, SavedRecipe
+
+CHUNK_SIZE = 2000# rows per cursor fetch
+BUFFER_SIZE = 64 * 1024# bytes per yielded chunk
+FORMATS = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+COLUMN_LABELS = {'user__username': 'username'}# output name of joined columns
+
+# kind -> (model, columns, columns a chef does not get for their own recipes, chef lookup)
+EXPORTS = {
+    'recipes': (
+        Recipe,
+        [
+            'id', 'chef_id', 'title', 'description', 'origin_country', 'dietary', 'health_condition', 'meal_type',
+            'meal_time', 'budget', 'currency', 'cooking_time', 'video_url', 'image', 'ingredients', 'instructions',
+            'rating_avg', 'rating_count', 'created_at', 'updated_at',
+        ],
+        [],
+        'chef',
+    ),
+    'reviews': (
+        Review,
+        ['id', 'recipe_id', 'user_id', 'user__username', 'rating', 'content', 'created_at'],
+        ['user_id'],
+        'recipe__chef',
+    ),
+    'saved': (SavedRecipe, ['recipe_id', 'user_id', 'saved_at'], ['user_id'], 'recipe__chef'),
+}
+
+
+def export_columns(kind, chef=None):
+    _, columns, private, _ = EXPORTS[kind]
+    return [column for column in columns if chef is None or column not in private]
+
+
+def export_queryset(kind, chef=None):
+    """Value tuples of one export, ordered by primary key; `chef` limits it to their recipes."""
+    model, _, _, chef_lookup = EXPORTS[kind]
+    queryset = model.objects.all()
+    if chef is not None:
+        queryset = queryset.filter(**{chef_lookup: chef})
+    return queryset.order_by('pk').values_list(*export_columns(kind, chef))
+
+
+class Encoder:
+    """Turns value tuples into buffered (optionally gzipped) bytes."""
+
+    def __init__(self, columns, fmt='jsonl', compress=False):
+        self.columns = [COLUMN_LABELS.get(column, column) for column in columns]
+        self.text = io.StringIO()
+        self.writer = csv.writer(self.text) if fmt == 'csv' else None
+        self.compressor = zlib.compressobj(wbits=31) if compress else None# 31: gzip container
+        if self.writer:
+            self.writer.writerow(self.columns)
+
+    def _cell(self, value):
+        if isinstance(value, (list, dict)):
+            return json.dumps(value)
+        return '' if value is None else value
+
+    def feed(self, row):
+        """Encode one row; returns a chunk once BUFFER_SIZE bytes are pending, else b''."""
+        if self.writer:
+            self.writer.writerow([self._cell(value) for value in row])
+        else:
+            self.text.write(json.dumps(dict(zip(self.columns, row)), cls=DjangoJSONEncoder))
+            self.text.write('\n')
+        if self.text.tell() >= BUFFER_SIZE:
+            return self._drain()
+        return b''
+
+    def _drain(self):
+        data = self.text.getvalue().encode()
+        self.text.seek(0)
+        self.text.truncate()
+        if self.compressor:
+            data = self.compressor.compress(data)
+        return data
+
+    def close(self):
+        data = self._drain()
+        if self.compressor:
+            data += self.compressor.flush()
+        return data
+
+
+def stream_export(kind, fmt='jsonl', compress=False, chef=None, chunk_size=CHUNK_SIZE):
+    """Bytes chunks of an export."""
+    encoder = Encoder(export_columns(kind, chef), fmt, compress)
+    for row in export_queryset(kind, chef).iterator(chunk_size=chunk_size):
+        chunk = encoder.feed(row)
+        if chunk:
+            yield chunk
+    yield encoder.close()
+
+
+async def astream_export(kind, fmt='jsonl', compress=False, chef=None, chunk_size=CHUNK_SIZE):
+    """stream_export() for ASGI: StreamingHttpResponse would buffer a sync iterator there."""
+    encoder = Encoder(export_columns(kind, chef), fmt, compress)
+    # aiterator() runs a values_list() query in the event loop thread, so fetch the slices of a
+    # lazy sync iterator in the ORM thread instead (what aiterator does for model instances)
+    rows = export_queryset(kind, chef).iterator(chunk_size=chunk_size)
+    fetch = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while True:
+        batch = await fetch()
+        for row in batch:
+            chunk = encoder.feed(row)
+            if chunk:
+                yield chunk
+        if len(batch) < chunk_size:
+            break
+    yield encoder.close()
@@ -0,0 +1,114 @@
+"""Facet counts for the dashboard filter panel.
+
+Every count comes from one aggregate query: a COUNT(*) FILTER (WHERE ...) per
+option (a CASE on backends without FILTER) over the recipes that match the
+search box and the recommendation profile. An option counts with the
+selected filters of the other groups only, so ticking "Dinner" next to
+"Lunch" shows how many recipes it would add.
+
+With FACET_CACHE_ENABLED (a shared cache backend) the counts are cached
+under the normalized filter signature and the catalog version, which every
+recipe save or delete bumps (see resultcache.py).
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .filters import UNSET, apply_recommendation, apply_search, filter_signature, param_conditions
+from .forms import DIET_CHOICES, HEALTH_CHOICES, MEAL_TIME_CHOICES, MEAL_TYPE_CHOICES
+from .models import Recipe
+from .resultcache import catalog_version
+
+FACET_TIMEOUT = 60 * 10
+
+# [low, high) price ranges, each ending where the next starts, so no 2-decimal budget (999.50) falls between two
+BUDGET_BUCKETS = [(None, 1000), (1000, 3000), (3000, 7000), (7000, 15000), (15000, None)]
+BUDGET_STEP = Decimal('0.01')# Recipe.budget has 2 decimals: max_price=2999.99 is the same filter as budget < 3000
+
+
+def _budget_label(low, high):
+    if low is None:
+        return f'Under {high:,}'
+    if high is None:
+        return f'{low:,} and more'
+    return f'{low:,} - {high:,}'
+
+
+def _budget_condition(low, high):
+    condition = Q(budget__isnull=False)
+    if low is not None:
+        condition &= Q(budget__gte=low)
+    if high is not None:
+        condition &= Q(budget__lt=high)
+    return condition
+
+
+def _budget_inputs(low, high):
+    """(min_price, max_price) that select the bucket; the max_price input is inclusive."""
+    return '' if low is None else str(low), '' if high is None else str(high - BUDGET_STEP)
+
+
+# group -> [(value, label, condition)]; the group names are the keys of filters.param_conditions()
+FACETS = {
+    'meal_time': [(value, label, Q(meal_time=value)) for value, label in MEAL_TIME_CHOICES],
+    'meal_type': [(value, label, Q(meal_type=value)) for value, label in MEAL_TYPE_CHOICES],
+    'dietary': [(value, label, Q(dietary=value)) for value, label in DIET_CHOICES if value not in UNSET],
+    'health_condition': [(value, label, Q(health_condition=value)) for value, label in HEALTH_CHOICES if value not in UNSET],
+    'budget': [((low, high), _budget_label(low, high), _budget_condition(low, high)) for low, high in BUDGET_BUCKETS],
+}
+
+
+def count_facets(session_filters, params):
+    """{group: [count per option]} plus 'total', in one query."""
+    queryset, _ = apply_recommendation(Recipe.objects.all(), session_filters)
+    queryset, _ = apply_search(queryset, params)
+    selected = param_conditions(params)
+
+    aggregates = {'total': Count('pk', filter=Q(*selected.values()))}
+    for group, options in FACETS.items():
+        others = Q(*[condition for name, condition in selected.items() if name != group])
+        for index, (_, _, condition) in enumerate(options):
+            aggregates[f'{group}_{index}'] = Count('pk', filter=condition & others)
+    row = queryset.order_by().aggregate(**aggregates)
+
+    counts = {group: [row[f'{group}_{index}'] for index in range(len(options))] for group, options in FACETS.items()}
+    counts['total'] = row['total']
+    return counts
+
+
+def recipe_facets(session_filters, params):
+    """Options of every facet group with their counts and whether they are selected.
+
+    Returns {group: [{'value', 'label', 'count', 'selected'}], 'total': n};
+    budget options also carry 'min'/'max' for the price inputs.
+    """
+    if settings.FACET_CACHE_ENABLED:
+        key = f'facets:{catalog_version()}:{filter_signature(session_filters, params)}'
+        counts = cache.get(key)
+        if counts is None:
+            counts = count_facets(session_filters, params)
+            cache.set(key, counts, FACET_TIMEOUT)
+    else:
+        counts = count_facets(session_filters, params)
+
+    selected = {
+        'meal_time': set(params.getlist('meal_time')),
+        'meal_type': set(params.getlist('meal_type')),
+        'dietary': {params.get('dietary')},
+        'health_condition': {params.get('health_condition')},
+    }
+    price = (params.get('min_price') or '', params.get('max_price') or '')
+    facets = {'total': counts['total']}
+    for group, options in FACETS.items():
+        facets[group] = []
+        for (value, label, _), count in zip(options, counts[group]):
+            option = {'value': value, 'label': label, 'count': count}
+            if group == 'budget':
+                option['min'], option['max'] = _budget_inputs(*value)
+                option['selected'] = (option['min'], option['max']) == price
+            else:
+                option['selected'] = value in selected[group]
+            facets[group].append(option)
+    return facets
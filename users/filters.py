@@ -0,0 +1,149 @@
+"""Dashboard filters shared by the sync and async recipe listings.
+
+filter_recipes() only composes the queryset, it does not touch the database,
+so the same code serves ListView, the async view and anything else that
+lists recipes.
+"""
+import hashlib
+import json
+
+from django.db.models import Exists, F, OuterRef, Q, TextField
+from django.db.models.functions import Cast
+
+from .ingredients import MAX_PHRASE_WORDS, normalize_phrase
+from .models import RecipeIngredient
+from .restrictions import COMPAT_BITS, allergen_bits
+from .search import search_recipes
+
+DEFAULT_ORDERING = ['-created_at', '-id']# newest first, id breaks ties for the cursor
+RANKED_ORDERING = ['-search_rank', '-created_at', '-id']
+UNSET = ['None', '', 'Select']
+
+
+def apply_recommendation(queryset, session_filters):
+    """Narrow to the saved health/diet/allergy profile; returns (queryset, is_active)."""
+    if not session_filters:
+        return queryset, False
+
+    h_cond = session_filters.get('health_condition')
+    diet = session_filters.get('dietary')
+    allergies_text = session_filters.get('allergies')
+    is_active = False
+    required_bits = 0# compatibility bits every recipe must carry (see Recipe.compat_mask)
+
+    # Filter by Health: recipes the chef tagged for the condition, minus those whose ingredients conflict with it
+    # (the rule lists cannot be complete, so an ingredient check alone would let unknown ones through)
+    if h_cond and h_cond not in UNSET:
+        queryset = queryset.filter(health_condition=h_cond)
+        required_bits |= COMPAT_BITS.get(h_cond, 0)
+        is_active = True
+
+    # Filter by Diet, the same way
+    if diet and diet not in UNSET:
+        queryset = queryset.filter(dietary=diet)
+        required_bits |= COMPAT_BITS.get(diet, 0)
+        is_active = True
+
+    # Exclude allergies
+    if allergies_text:
+        is_active = True
+        # normalize the same way as the ingredient index (lowercase + singular), so "Peanuts" matches "peanut"
+        allergens = {normalize_phrase(a) for a in allergies_text.split(',')} - {''}
+        for allergen in list(allergens):
+            bits = allergen_bits(allergen)# common allergens ("nuts", "shellfish", "dairy") have their own bits
+            if bits:
+                required_bits |= bits
+                allergens.discard(allergen)
+        indexed = {a for a in allergens if len(a.split()) <= MAX_PHRASE_WORDS}
+        if indexed:
+            # a single anti-join on exact tokens, which recipe_ingredient_token_idx answers; compound words
+            # are indexed under their parts ("milk" for "buttermilk", see ingredient_tokens)
+            queryset = queryset.filter(~Exists(
+                RecipeIngredient.objects.filter(token__in=indexed, recipe=OuterRef('pk'))
+            ))
+        # phrases longer than the indexed ones still need the text scan of the JSON column
+        if allergens - indexed:
+            queryset = queryset.annotate(ingredient_str=Cast('ingredients', TextField()))
+            for allergen in allergens - indexed:
+                queryset = queryset.exclude(ingredient_str__icontains=allergen)
+
+    if required_bits:
+        # "safe for Diabetes AND Nut-Free AND no shellfish" is one bitwise test on an integer column
+        queryset = queryset.alias(compat=F('compat_mask').bitand(required_bits)).filter(compat=required_bits)
+    return queryset, is_active
+
+
+def param_conditions(params):
+    """{facet group: Q} for the sidebar filters in the query string (the search box is not one of them)."""
+    conditions = {}
+    dietary_query = params.get('dietary')# dietary filter parameter
+    if dietary_query:
+        conditions['dietary'] = Q(dietary=dietary_query)
+    health_query = params.get('health_condition')# recipes tagged for a condition (the profile also checks the ingredients)
+    if health_query:
+        conditions['health_condition'] = Q(health_condition=health_query)
+
+    min_price = params.get('min_price')# minimum price filter parameter
+    max_price = params.get('max_price')# maximum price filter parameter
+    budget = Q()
+    try:
+        if min_price:
+            budget &= Q(budget__gte=float(min_price))
+        if max_price:
+            budget &= Q(budget__lte=float(max_price))
+    except ValueError:
+        pass # If they typed text instead of numbers, simply ignore the filter
+    if budget:
+        conditions['budget'] = budget
+
+    meal_times = params.getlist('meal_time')
+    if meal_times:
+        conditions['meal_time'] = Q(meal_time__in=meal_times)
+
+    meal_types = params.getlist('meal_type')# verity if the mealtype was checked by the user
+    if meal_types:
+        conditions['meal_type'] = Q(meal_type__in=meal_types)
+    return conditions
+
+
+def apply_search(queryset, params):
+    """Search box; returns (queryset, keyset ordering)."""
+    ordering = list(DEFAULT_ORDERING)
+    query = params.get('q')#search query parameter
+    if query:
+        # full-text search over title, origin country, description and ingredients (see users/search.py)
+        queryset = search_recipes(queryset, query)
+        if params.get('sort') != 'newest':# best matches first unless the user asked for newest
+            ordering = list(RANKED_ORDERING)
+    return queryset, ordering
+
+
+def apply_params(queryset, params):
+    """Search box and sidebar filters from the query string; returns (queryset, keyset ordering)."""
+    queryset, ordering = apply_search(queryset, params)
+    for condition in param_conditions(params).values():
+        queryset = queryset.filter(condition)
+    return queryset, ordering
+
+
+def filter_recipes(queryset, session_filters, params):
+    """Returns (queryset, keyset ordering, recommendation active)."""
+    queryset, is_active = apply_recommendation(queryset, session_filters)
+    queryset, ordering = apply_params(queryset, params)
+    return queryset, ordering, is_active
+
+
+def filter_signature(session_filters, params):
+    """Stable hash of everything that changes the filtered recipe set (not the cursor or the sort)."""
+    profile = session_filters or {}
+    allergies = sorted({normalize_phrase(a) for a in (profile.get('allergies') or '').split(',')} - {''})
+    signature = {
+        'profile': [profile.get('health_condition'), profile.get('dietary'), allergies],
+        'q': ' '.join((params.get('q') or '').lower().split()),
+        'dietary': params.get('dietary') or '',
+        'health_condition': params.get('health_condition') or '',
+        'price': [params.get('min_price') or '', params.get('max_price') or ''],
+        'meal_time': sorted(set(params.getlist('meal_time'))),
+        'meal_type': sorted(set(params.getlist('meal_type'))),
+    }
+    return hashlib.md5(json.dumps(signature, sort_keys=True).encode()).hexdigest()
@@ -6,6 +6,7 @@ from .models import Recipe
 from .models import Review
 import json
 from django_countries.fields import CountryField
+from .restrictions import find_conflicts, rule_key
 
 
 DIET_CHOICES = [
@@ -38,6 +39,10 @@ HEALTH_CHOICES = [
     ('None', 'None'),
 ]
 
+# options of the dashboard filter panel
+MEAL_TIME_CHOICES = [('Breakfast', 'Breakfast'), ('Lunch', 'Lunch'), ('Dinner', 'Dinner')]
+MEAL_TYPE_CHOICES = [('Individual', 'Individual'), ('Family', 'Family')]
+
 class ChefSignUpForm(UserCreationForm):
     first_name = forms.CharField(max_length=30, required=True)
     last_name = forms.CharField(max_length=30, required=True)
@@ -136,51 +141,21 @@ class RecipeForm(forms.ModelForm):
         if not ing_data:
             return cleaned_data
         
-        ingredient_blob = str(ing_data).lower()
-
-        restrictions = {
-            # --- DIETARY  ---
-            'vegan': ['chicken', 'beef', 'pork', 'meat', 'fish', 'egg', 'milk', 'cheese', 'honey', 'yogurt', 'butter', 'cream', 'gelatin', 'whey'],
-            'vegetarian': ['chicken', 'beef', 'pork', 'meat', 'fish', 'tuna', 'salmon', 'shrimp', 'crab', 'gelatin'],
-            'pescatarian': ['chicken', 'beef', 'pork', 'lamb', 'bacon', 'ham', 'sausage'],
-            'halal': ['pork', 'bacon', 'ham', 'lard', 'wine', 'beer', 'alcohol', 'rum', 'liqueur', 'gelatin'],
-            'kosher': ['pork', 'bacon', 'ham', 'shrimp', 'crab', 'lobster', 'clam', 'oyster', 'cheeseburger'],
-            'keto': ['sugar', 'rice', 'pasta', 'bread', 'flour', 'potato', 'corn', 'syrup', 'banana', 'apple', 'candy', 'soda'], 
-            'gluten-free': ['wheat', 'barley', 'rye', 'flour', 'bread', 'pasta', 'couscous', 'malt', 'soy sauce', 'seitan', 'beer'], 
-            'dairy-free': ['milk', 'cheese', 'butter', 'cream', 'yogurt', 'whey', 'casein', 'lactose', 'ghee'],
-            'nut-free': ['peanut', 'almond', 'walnut', 'cashew', 'pecan', 'hazelnut', 'macadamia', 'pistachio', 'nutella'],
-            'shellfish-free': ['shrimp', 'crab', 'lobster', 'prawn', 'mussel', 'oyster', 'clam', 'scallop', 'squid'],
-
-            # --- HEALTH CONDITIONS ---
-            'diabetes': ['sugar', 'syrup', 'candy', 'chocolate', 'cake', 'soda', 'honey', 'molasses', 'jam', 'jelly', 'white rice'],
-            'hypertension': ['salt', 'soy sauce', 'sodium', 'bacon', 'pickle', 'canned', 'salami', 'sausage', 'msg'], 
-            'heart disease': ['butter', 'cream', 'bacon', 'lard', 'sausage', 'fried', 'coconut oil', 'palm oil'], 
-            'celiac': ['wheat', 'barley', 'rye', 'flour', 'bread', 'pasta', 'soy sauce', 'malt', 'beer'],
-            'gerd': ['spicy', 'chili', 'jalapeno', 'pepper', 'hot sauce', 'tomato', 'lemon', 'orange', 'coffee', 'chocolate', 'mint', 'garlic', 'onion'], 
-            'ibs': ['onion', 'garlic', 'milk', 'wheat', 'beans', 'lentils', 'apple', 'pear', 'honey', 'mushroom'],
-            'kidney disease': ['salt', 'banana', 'potato', 'spinach', 'avocado', 'tomato', 'brown rice', 'milk', 'yogurt'],
-            'gout': ['liver', 'kidney', 'anchovy', 'sardine', 'herring', 'beer', 'beef', 'pork', 'shellfish', 'sugar'], 
-        }
-
+        # one pass over the ingredient names checks every rule set (see users/restrictions.py)
+        conflicts = find_conflicts(ing_data)
         errors = []
 
         # 4. VALIDATE DIET (Single Check)
         if selected_diet and selected_diet not in ['', 'None']:
-            tag_key = selected_diet.lower() 
-            if tag_key in restrictions:
-                forbidden = restrictions[tag_key]
-                found = [word for word in forbidden if word in ingredient_blob]
-                if found:
-                    errors.append(f" Conflict! You selected '{selected_diet}', but ingredients mention: {', '.join(set(found))}.")
+            found = conflicts.get(rule_key(selected_diet))
+            if found:
+                errors.append(f" Conflict! You selected '{selected_diet}', but ingredients mention: {', '.join(sorted(found))}.")
 
         # 5. VALIDATE HEALTH (Single Check)
         if selected_health and selected_health not in ['', 'None']:
-            tag_key = selected_health.lower()
-            if tag_key in restrictions:
-                forbidden = restrictions[tag_key]
-                found = [word for word in forbidden if word in ingredient_blob]
-                if found:
-                    errors.append(f" Health Warning! '{selected_health}' typically avoids: {', '.join(set(found))}.")
+            found = conflicts.get(rule_key(selected_health))
+            if found:
+                errors.append(f" Health Warning! '{selected_health}' typically avoids: {', '.join(sorted(found))}.")
 
         if errors:
             raise ValidationError(errors)
@@ -0,0 +1,128 @@
+"""Resized, re-encoded copies of the recipe photos.
+
+An uploaded photo is decoded once and written at a few widths (card, detail
+and their 2x retina versions) as AVIF (when this Pillow build can encode it),
+WebP and a JPEG fallback. File names carry a hash of the original bytes, so
+they never change for a given upload and can be cached forever. Two recipes
+with the same photo share the same files.
+
+Recipe.image_derivatives records what was generated:
+
+    {"source": "recipe_images/soup.jpg", "hash": "3f2a...", "width": 1200, "height": 800,
+     "formats": {"avif": [[400, "recipe_images/derived/3f2a...-400w.avif"], ...], "webp": [...], "jpeg": [...]}}
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = 'recipe_images/derived'
+WIDTHS = (400, 600, 800, 1200)# card, detail, card @2x, detail @2x
+
+# best first, the last one is the <img> fallback every browser understands
+FORMATS = [
+    ('avif', 'image/avif', {'quality': 50}),
+    ('webp', 'image/webp', {'quality': 75, 'method': 4}),
+    ('jpeg', 'image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}),
+]
+SIZES = {
+    'card': '(max-width: 640px) 100vw, 340px',
+    'detail': '(max-width: 768px) 100vw, 45vw',
+}
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt[0] == 'jpeg' or features.check(fmt[0])]
+
+
+def is_stale(image_name, derivatives):
+    """True when the stored derivatives were not made from the current photo."""
+    return (image_name or '') != (derivatives or {}).get('source', '')
+
+
+def _flatten(image, mode):
+    if mode == 'RGB' and image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert(mode) if image.mode != mode else image
+
+
+def generate_derivatives(image_field, storage=default_storage):
+    """Write every width x format of the photo and return the image_derivatives dict ({} if unreadable)."""
+    with image_field.open('rb') as handle:
+        data = handle.read()
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    try:
+        image = Image.open(BytesIO(data))
+        image.draft('RGB', (max(WIDTHS), max(WIDTHS)))# JPEG: let the decoder downscale for free
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, OSError) as error:
+        logger.warning("could not read recipe image %s: %s", image_field.name, error)
+        return {}
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    widths = [width for width in WIDTHS if width <= image.width] or [image.width]# never upscale
+    if image.width < max(WIDTHS) and image.width not in widths:
+        widths.append(image.width)
+    height_for = {width: max(1, round(image.height * width / image.width)) for width in widths}
+
+    formats = {}
+    for ext, _, options in available_formats():
+        mode = 'RGBA' if has_alpha and ext != 'jpeg' else 'RGB'
+        source = _flatten(image, mode)
+        formats[ext] = []
+        for width in widths:
+            name = f'{DERIVED_DIR}/{digest}-{width}w.{ext}'
+            if not storage.exists(name):
+                resized = source.resize((width, height_for[width]), Image.LANCZOS, reducing_gap=3.0)
+                buffer = BytesIO()
+                resized.save(buffer, format=ext.upper(), **options)
+                storage.save(name, ContentFile(buffer.getvalue()))
+            formats[ext].append([width, name])
+
+    largest = widths[-1]
+    return {
+        'source': image_field.name,
+        'hash': digest,
+        'width': largest,
+        'height': height_for[largest],
+        'formats': formats,
+    }
+
+
+def delete_derivatives(derivatives, storage=default_storage):
+    for variants in (derivatives or {}).get('formats', {}).values():
+        for _, name in variants:
+            storage.delete(name)
+
+
+def picture(derivatives, purpose, storage=default_storage):
+    """Template data for a <picture>: one <source> per modern format and a JPEG <img> fallback."""
+    if not derivatives or not derivatives.get('formats'):
+        return None
+
+    def srcset(variants):
+        return ', '.join(f'{storage.url(name)} {width}w' for width, name in variants)
+
+    formats = derivatives['formats']
+    fallback = formats.get('jpeg') or next(iter(formats.values()))
+    default_width = min(WIDTHS) if purpose == 'card' else WIDTHS[1]
+    src = next((name for width, name in fallback if width >= default_width), fallback[-1][1])
+    return {
+        'sources': [
+            {'type': mime, 'srcset': srcset(formats[ext])}
+            for ext, mime, _ in FORMATS if ext != 'jpeg' and formats.get(ext)
+        ],
+        'src': storage.url(src),
+        'srcset': srcset(fallback),
+        'sizes': SIZES[purpose],
+        'width': derivatives['width'],
+        'height': derivatives['height'],
+    }
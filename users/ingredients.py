@@ -0,0 +1,127 @@
+import json
+import re
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+MAX_PHRASE_WORDS = 3# longest multi-word phrase stored in the token index ("white rice", "hot sauce")
+
+# compound words are indexed under their parts as well, so an allergy to "milk" finds "buttermilk";
+# only these heads split a word, which keeps "graham" from ever being indexed as "ham"
+COMPOUND_HEADS = frozenset({
+    'berry', 'bread', 'cake', 'corn', 'cream', 'fish', 'flour', 'fruit', 'meal', 'milk', 'nut', 'seed', 'wheat',
+})
+COMPOUND_MODIFIERS = COMPOUND_HEADS | {'almond', 'butter', 'cheese', 'egg', 'oat', 'pea', 'rice', 'soy'}
+
+
+def parse_ingredients(raw):
+    """Return the ingredient list of a recipe whatever shape it was stored in.
+
+    The create/update views store a JSON *string* inside the JSONField, older
+    rows hold a real list, and hand-written data may be a plain string.
+    """
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            return [{'name': raw, 'qty': ''}]
+        if isinstance(raw, str):
+            return [{'name': raw, 'qty': ''}]
+    if isinstance(raw, dict):
+        return [raw]
+    if isinstance(raw, list):
+        return raw
+    return []
+
+
+def ingredient_list(raw):
+    """The ingredients column as a list, whatever shape it holds (list or JSON string)."""
+    if isinstance(raw, list):# if it's already a list, use it directly
+        return raw
+    if isinstance(raw, str):# if it's a string, try to parse it as JSON
+        try:
+            return json.loads(raw)# parse JSON string to list
+        except (json.JSONDecodeError, TypeError):# handle parsing errors
+            return [{'name': raw, 'qty': ''}] # Fallback
+    return []
+
+
+def instruction_list(raw):
+    """The instructions column as a list, the same way."""
+    if isinstance(raw, list):
+        return raw
+    if isinstance(raw, str):
+        try:
+            return json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            return [raw] # Fallback
+    return []
+
+
+def recipe_lists(recipe):
+    """(ingredients, instructions) of a recipe as lists, for the detail page."""
+    return ingredient_list(recipe.ingredients), instruction_list(recipe.instructions)
+
+
+def ingredient_names(raw):
+    names = []
+    for item in parse_ingredients(raw):
+        if isinstance(item, dict):
+            name = item.get('name')
+        else:
+            name = item
+        if name:
+            names.append(str(name))
+    return names
+
+
+def singularize(word):
+    """Cheap English singular form, good enough for ingredient names."""
+    if len(word) <= 3 or word.endswith(('ss', 'us', 'is')):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'# berries -> berry
+    if word.endswith(('oes', 'ches', 'shes', 'sses', 'xes', 'zes')):
+        return word[:-2]# tomatoes -> tomato, peaches -> peach
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def normalize_words(text):
+    return [singularize(word) for word in WORD_RE.findall(str(text).lower())]
+
+
+def normalize_phrase(text):
+    """'Peanuts ' -> 'peanut', 'Soy Sauce' -> 'soy sauce'."""
+    return ' '.join(normalize_words(text))
+
+
+def phrase_tokens(text, max_words=MAX_PHRASE_WORDS):
+    """Every 1..max_words word run of a name, so 'creamy peanut butter' yields 'peanut' and 'peanut butter'."""
+    words = normalize_words(text)
+    tokens = set()
+    for size in range(1, max_words + 1):
+        for start in range(len(words) - size + 1):
+            tokens.add(' '.join(words[start:start + size]))
+    return tokens
+
+
+def compound_parts(word):
+    """'buttermilk' -> {'butter', 'milk'}, 'walnut' -> {'nut'}, 'graham' -> set()."""
+    parts = set()
+    for head in COMPOUND_HEADS:
+        rest = word[:-len(head)]
+        if word.endswith(head) and len(rest) >= 3:
+            parts.add(head)
+            if rest in COMPOUND_MODIFIERS:
+                parts.add(rest)# cheese in "cheesecake"
+    return parts
+
+
+def ingredient_tokens(raw):
+    """Lower-cased, singularized tokens for the RecipeIngredient index, compound words also under their parts."""
+    tokens = set()
+    for name in ingredient_names(raw):
+        tokens |= phrase_tokens(name)
+        for word in normalize_words(name):
+            tokens |= compound_parts(word)
+    return tokens
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import statistics
+import time
+import types
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, override_settings
+from django.urls import include, path
+
+from users import async_views, views
+from users.models import Recipe, User
+
+# scenario -> (sync view, async view, needs the recipe id, HTTP method)
+SCENARIOS = {
+    'dashboard': (views.RecipeListView.as_view(), async_views.dashboard, False, 'get'),
+    'recipe_detail': (views.RecipeDetailView.as_view(), async_views.recipe_detail, True, 'get'),
+    'toggle_save': (views.toggle_recipe_save, async_views.toggle_recipe_save, True, 'post'),
+}
+
+
+def bench_urlconf():
+    # both implementations side by side, plus the real routes the templates reverse
+    module = types.ModuleType('benchmark_async_urls')
+    patterns = []
+    for name, (sync_view, async_view, with_pk, _) in SCENARIOS.items():
+        route = f'{name}/<int:pk>/' if with_pk else f'{name}/'
+        patterns += [path(f'bench/sync/{route}', sync_view), path(f'bench/async/{route}', async_view)]
+    module.urlpatterns = patterns + [path('', include('users.urls'))]
+    return module
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent throughput of the sync and async versions of the dashboard, recipe detail and "
+        "toggle-save views, driven through the ASGI handler with many in-flight requests. --db-latency adds "
+        "a sleep to every query to emulate a remote database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per scenario and mode.")
+        parser.add_argument('--concurrency', type=int, default=20, help="Requests in flight (one customer each).")
+        parser.add_argument('--db-latency', type=float, default=0.0, help="Milliseconds added to every query.")
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS))
+        parser.add_argument('--recipe', type=int, help="Recipe for detail/toggle (default: most reviewed).")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        customers = list(User.objects.filter(is_customer=True).order_by('pk')[:options['concurrency']])
+        if len(customers) < options['concurrency']:
+            raise CommandError(f"Need {options['concurrency']} customer accounts, run seed_data first.")
+        recipe = (
+            Recipe.objects.filter(pk=options['recipe']) if options['recipe'] else Recipe.objects.order_by('-rating_count', 'pk')
+        ).first()
+        if recipe is None:
+            raise CommandError("No recipe to benchmark, run seed_data first.")
+
+        if connections['default'].vendor == 'sqlite':
+            self.stderr.write("SQLite allows one writer at a time, expect 'database is locked' errors on toggle_save.")
+        latency = options['db_latency'] / 1000
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(latency)# network round trip to the database
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow_query)
+
+        if latency:
+            connections.close_all()# new connections get the wrapper from the signal below
+            connection_created.connect(add_latency)
+        results = {}
+        try:
+            with override_settings(ROOT_URLCONF=bench_urlconf(), ALLOWED_HOSTS=['testserver']):
+                for name in options['scenario'] or SCENARIOS:
+                    results[name] = {}
+                    for mode in ('sync', 'async'):
+                        row = asyncio.run(self.run(name, mode, customers, recipe, options['requests']))
+                        results[name][mode] = row
+                        self.stdout.write(
+                            f"{name:<14} {mode:<5} {row['throughput_rps']:8.1f} req/s  "
+                            f"p50 {row['p50_ms']:7.1f} ms  p95 {row['p95_ms']:7.1f} ms  errors {row['errors']}"
+                        )
+        finally:
+            connection_created.disconnect(add_latency)
+
+        if options['output']:
+            report = {'options': {key: options[key] for key in ('requests', 'concurrency', 'db_latency')}, 'results': results}
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    async def run(self, name, mode, customers, recipe, total):
+        _, _, with_pk, method = SCENARIOS[name]
+        url = f'/bench/{mode}/{name}/' + (f'{recipe.pk}/' if with_pk else '')
+        clients = []
+        for customer in customers:
+            client = AsyncClient(raise_request_exception=False)# count failures instead of aborting the run
+            await client.aforce_login(customer)
+            clients.append(client)
+
+        timings, errors = [], 0
+        per_client = [total // len(clients) + (i < total % len(clients)) for i in range(len(clients))]
+
+        async def worker(client, count):
+            nonlocal errors
+            for _ in range(count):
+                started = time.perf_counter()
+                async with ThreadSensitiveContext():# per-request sync thread, as the real ASGIHandler does
+                    response = await getattr(client, method)(url)
+                    await sync_to_async(connections.close_all)()# request_finished, like the real handler
+                timings.append((time.perf_counter() - started) * 1000)
+                errors += response.status_code >= 400
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, count) for client, count in zip(clients, per_client)))
+        elapsed = time.perf_counter() - started
+        if method == 'post':# toggles: put back every save an odd number of clicks left behind
+            for client, count in zip(clients, per_client):
+                if count % 2:
+                    await getattr(client, method)(url)
+
+        timings.sort()
+        quantiles = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+        return {
+            'requests': len(timings),
+            'errors': errors,
+            'seconds': round(elapsed, 3),
+            'throughput_rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(quantiles[49], 2),
+            'p95_ms': round(quantiles[94], 2),
+        }
@@ -0,0 +1,52 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.restrictions import RESTRICTIONS, RestrictionMatcher, find_conflicts
+
+VOCABULARY = [
+    'chicken breast', 'olive oil', 'garlic cloves', 'red onions', 'tomatoes', 'white rice', 'basmati rice',
+    'peppermint leaves', 'black pepper', 'graham crackers', 'plantains', 'cassava', 'egusi seeds', 'palm oil',
+    'smoked fish', 'crayfish', 'maggi cubes', 'salt', 'sugar', 'soy sauce', 'ginger', 'spinach', 'avocado',
+    'peanut butter', 'coconut milk', 'lemon juice', 'fresh cream', 'all-purpose flour', 'beef stock', 'honey',
+    'green beans', 'lentils', 'mushrooms', 'carrots', 'potatoes', 'sweet corn', 'chili flakes', 'parsley',
+]
+
+
+def legacy_conflicts(ingredients):
+    # the substring scan RecipeForm.clean() used before the matcher, kept for comparison
+    blob = str(ingredients).lower()
+    return {
+        rule: {word for word in words if word in blob}
+        for rule, words in RESTRICTIONS.items()
+        if any(word in blob for word in words)
+    }
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark of the restriction matcher: per-recipe cost against the old substring scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=5000, help="Synthetic recipes to check.")
+        parser.add_argument('--ingredients', type=int, default=12, help="Ingredients per recipe.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        recipes = [
+            [{'name': rng.choice(VOCABULARY), 'qty': f'{rng.randint(1, 500)} g'} for _ in range(options['ingredients'])]
+            for _ in range(options['recipes'])
+        ]
+
+        started = time.perf_counter()
+        RestrictionMatcher(RESTRICTIONS)
+        build_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"matcher build (once per process): {build_ms:.2f} ms")
+
+        for label, check in (('matcher, all rule sets', find_conflicts), ('legacy substring scan', legacy_conflicts)):
+            started = time.perf_counter()
+            hits = sum(len(check(ingredients)) for ingredients in recipes)
+            elapsed = time.perf_counter() - started
+            per_recipe_us = elapsed / len(recipes) * 1_000_000
+            self.stdout.write(f"{label:<24} {per_recipe_us:8.1f} us/recipe   ({hits} rule hits over {len(recipes)} recipes)")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from users.cards import card_cache, shared_stats
+
+
+class Command(BaseCommand):
+    help = "Show the dashboard card fragment cache hit/miss counters (shared cache backends only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters after printing them.")
+
+    def handle(self, *args, **options):
+        stats = shared_stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total * 100 if total else 0
+        self.stdout.write(f"hits: {stats['hits']}  misses: {stats['misses']}  hit ratio: {ratio:.1f}%")
+        if options['reset']:
+            card_cache().delete_many(['recipe_card:stats:hits', 'recipe_card:stats:misses'])
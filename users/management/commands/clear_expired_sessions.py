@@ -0,0 +1,33 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions in small batches (clearsessions issues one DELETE for all of them)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Sessions deleted per statement.")
+        parser.add_argument('--sleep', type=float, default=0, help="Seconds to pause between batches.")
+
+    def handle(self, *args, **options):
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not hasattr(store, 'get_model_class'):# cache engine: entries expire on their own
+            self.stdout.write(f"{settings.SESSION_ENGINE} keeps no session rows, nothing to clear.")
+            return
+
+        model = store.get_model_class()
+        expired = model.objects.filter(expire_date__lt=timezone.now())
+        deleted = 0
+        while True:
+            keys = list(expired.values_list('session_key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+            deleted += model.objects.filter(session_key__in=keys).delete()[0]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired sessions."))
@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.export import CHUNK_SIZE, EXPORTS, FORMATS, stream_export
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Stream recipes, reviews or saved-recipe edges as JSONL or CSV (optionally gzipped) with flat memory use."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='jsonl')
+        parser.add_argument('--gzip', action='store_true', help="Compress the output while it is written.")
+        parser.add_argument('--output', '-o', help="File to write (default: standard output).")
+        parser.add_argument('--chef', help="Only this chef's recipes and the rows attached to them.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows per server-side cursor fetch.")
+
+    def handle(self, *args, **options):
+        chef = None
+        if options['chef']:
+            try:
+                chef = User.objects.get(username=options['chef'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named '{options['chef']}'.")
+
+        chunks = stream_export(
+            options['kind'], options['format'], options['gzip'], chef=chef, chunk_size=options['chunk_size'],
+        )
+        if not options['output']:
+            out = sys.stdout.buffer# bytes, the command's text stdout would not take them
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
+            return
+
+        written = 0
+        with open(options['output'], 'wb') as out:
+            for chunk in chunks:
+                out.write(chunk)
+                written += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}."))
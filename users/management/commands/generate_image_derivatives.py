@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from users.cards import bump_recipe_generation
+from users.images import available_formats
+from users.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Generate the resized AVIF/WebP/JPEG copies of recipe photos that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Recipes loaded per query.")
+        parser.add_argument('--ids', nargs='*', type=int, help="Only process these recipe ids.")
+        parser.add_argument('--force', action='store_true', help="Regenerate even when the derivatives are up to date.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Formats: {', '.join(ext for ext, _, _ in available_formats())}")
+        recipes = Recipe.objects.exclude(image='').exclude(image__isnull=True).order_by('pk').only('pk', 'image', 'image_derivatives')
+        if options['ids']:
+            recipes = recipes.filter(pk__in=options['ids'])
+
+        scanned = generated = failed = 0
+        last_pk = 0
+        while True:
+            batch = list(recipes.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            scanned += len(batch)
+            for recipe in batch:
+                if not options['force'] and not recipe.image_derivatives_stale():
+                    continue
+                try:
+                    derived = recipe.refresh_image_derivatives()
+                except OSError as error:# missing/unreadable file, keep going with the rest
+                    self.stderr.write(f"recipe {recipe.pk}: {error}")
+                    failed += 1
+                    continue
+                if derived:
+                    generated += 1
+                    bump_recipe_generation(recipe.pk)
+                else:
+                    failed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {scanned} recipes with photos, generated derivatives for {generated}, {failed} failed."
+        ))
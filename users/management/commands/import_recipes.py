@@ -0,0 +1,146 @@
+import csv
+import gzip
+import json
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from users.forms import RecipeForm
+from users.models import Recipe, RecipeIngredient, User
+from users.resultcache import bump_catalog_version
+from users.sidebar import invalidate_sidebar
+
+UNSET = ['None']# form values saved as '' (see RecipeCreateView.form_valid)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a chef's recipes from a JSONL or CSV file (optionally .gz), streamed row by row. "
+        "Rows are validated like RecipeForm and written with bulk_create together with their ingredient "
+        "tokens; rejects go to an error file. The search index is rebuilt once at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, .jsonl or .csv, optionally gzipped.")
+        parser.add_argument('--chef', required=True, help="Username of the chef the recipes belong to.")
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help="Input format (default: from the file name).")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per bulk insert and transaction.")
+        parser.add_argument('--errors', help="Where rejected rows are written (default: <path>.errors.jsonl).")
+        parser.add_argument('--skip-derived', action='store_true', help="Do not rebuild the search index afterwards.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.verbosity = options['verbosity']
+        try:
+            chef = User.objects.get(username=options['chef'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named '{options['chef']}'.")
+        fmt = options['format'] or ('csv' if path.removesuffix('.gz').endswith('.csv') else 'jsonl')
+        self.errors_path = options['errors'] or f'{path}.errors.jsonl'
+        self.errors_file = None
+
+        after_id = Recipe.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        imported = rejected = 0
+        batch = []
+        started = time.perf_counter()
+        opener = gzip.open if path.endswith('.gz') else open
+        try:
+            with opener(path, 'rt', encoding='utf-8', newline='') as source:
+                for line, row in self.rows(source, fmt):
+                    recipe, errors = self.build(row, chef)
+                    if errors:
+                        self.reject(line, row, errors)
+                        rejected += 1
+                        continue
+                    batch.append(recipe)
+                    if len(batch) >= options['batch_size']:
+                        imported += self.flush(batch)
+                        batch = []
+                        self.progress(imported, rejected, started)
+                imported += self.flush(batch)
+        finally:
+            if self.errors_file:
+                self.errors_file.close()
+        elapsed = time.perf_counter() - started
+
+        if imported:
+            invalidate_sidebar(chef.pk)# new entries in the chef's made recipes list
+            if not options['skip_derived']:
+                self.stdout.write("Running rebuild_search_index...")
+                call_command('rebuild_search_index', after_id=after_id, stdout=self.stdout)
+            # bulk_create sends no post_save, retire cached listings here; after the rebuild, or listings
+            # cached in between (new recipes without search documents) would stay
+            bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} recipes, rejected {rejected} in {elapsed:.1f}s "
+            f"({(imported + rejected) / max(elapsed, 1e-9):.0f} rows/s)."
+        ))
+        if rejected:
+            self.stdout.write(f"Rejected rows: {self.errors_path}")
+
+    def rows(self, source, fmt):
+        """(line number, dict) per input row; unparseable JSON lines come through as errors."""
+        if fmt == 'csv':
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for number, text in enumerate(source, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as exc:
+                row = {'__invalid__': f"Invalid JSON: {exc}", '__text__': text.rstrip('\n')}
+            yield number, row
+
+    def build(self, row, chef):
+        """(unsaved Recipe, None) or (None, errors) for one input row."""
+        if not isinstance(row, dict):
+            return None, {'__all__': ["Expected a JSON object."]}
+        if '__invalid__' in row:
+            return None, {'__all__': [row['__invalid__']]}
+        data = {}
+        for name in RecipeForm.Meta.fields:
+            value = row.get(name)
+            if isinstance(value, (list, dict)):# the form reads JSON fields as text
+                value = json.dumps(value)
+            data[name] = '' if value is None else value
+        form = RecipeForm(data=data)
+        if not form.is_valid():
+            return None, {field: list(messages) for field, messages in form.errors.items()}
+
+        recipe = form.save(commit=False)
+        recipe.chef = chef
+        for name in ('ingredients', 'instructions'):
+            value = form.cleaned_data.get(name)
+            setattr(recipe, name, value if isinstance(value, list) else [value] if value else [])
+        for name in ('dietary', 'health_condition'):
+            if getattr(recipe, name) in UNSET:
+                setattr(recipe, name, '')
+        recipe.refresh_compat_mask()# Recipe.save() is bypassed by bulk_create
+        return recipe, None
+
+    def flush(self, batch):
+        if not batch:
+            return 0
+        with transaction.atomic():
+            Recipe.objects.bulk_create(batch)# sets the pks on PostgreSQL and SQLite
+            # the allergy filter must never see a recipe without its tokens (see Recipe.save)
+            RecipeIngredient.rebuild_for(batch)
+        return len(batch)
+
+    def reject(self, line, row, errors):
+        if self.errors_file is None:
+            self.errors_file = open(self.errors_path, 'w', encoding='utf-8')
+        if isinstance(row, dict) and '__text__' in row:
+            row = row['__text__']
+        self.errors_file.write(json.dumps({'line': line, 'errors': errors, 'row': row}) + '\n')
+
+    def progress(self, imported, rejected, started):
+        if self.verbosity > 1:
+            rate = (imported + rejected) / max(time.perf_counter() - started, 1e-9)
+            self.stdout.write(f"{imported} imported, {rejected} rejected ({rate:.0f} rows/s)")
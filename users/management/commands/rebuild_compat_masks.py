@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Recompute Recipe.compat_mask (diet/health/allergen compatibility bits) in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Recipes updated per transaction.")
+        parser.add_argument('--ids', nargs='*', type=int, help="Only rebuild these recipe ids.")
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('pk').only('pk', 'ingredients', 'dietary', 'health_condition', 'compat_mask')
+        if options['ids']:
+            recipes = recipes.filter(pk__in=options['ids'])
+
+        scanned = changed = 0
+        last_pk = 0
+        while True:
+            batch = list(recipes.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            scanned += len(batch)
+
+            stale = []
+            for recipe in batch:
+                old_mask = recipe.compat_mask
+                recipe.refresh_compat_mask()
+                if recipe.compat_mask != old_mask:
+                    stale.append(recipe)
+            if stale:# only rows whose mask moved are written back
+                with transaction.atomic():
+                    Recipe.objects.bulk_update(stale, ['compat_mask'])
+                changed += len(stale)
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {scanned} recipes, updated {changed} compatibility masks."))
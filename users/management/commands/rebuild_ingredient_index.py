@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from users.models import Recipe, RecipeIngredient
+
+
+class Command(BaseCommand):
+    help = "Rebuild the normalized RecipeIngredient token index from Recipe.ingredients."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Recipes processed per transaction.")
+        parser.add_argument('--ids', nargs='*', type=int, help="Only rebuild these recipe ids.")
+        parser.add_argument('--after-id', type=int, default=0, help="Only rebuild recipes with a greater id.")
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('pk').only('pk', 'ingredients')
+        if options['ids']:
+            recipes = recipes.filter(pk__in=options['ids'])
+
+        total_recipes = total_tokens = 0
+        last_pk = options['after_id']
+        while True:
+            batch = list(recipes.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            total_tokens += RecipeIngredient.rebuild_for(batch)
+            total_recipes += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total_tokens} tokens for {total_recipes} recipes."))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from users.models import Recipe, Review
+
+
+class Command(BaseCommand):
+    help = "Recompute Recipe.rating_avg / rating_count / rating_histogram from the reviews table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Recipes updated per transaction.")
+        parser.add_argument('--ids', nargs='*', type=int, help="Only rebuild these recipe ids.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipes = Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        if options['ids']:
+            recipes = recipes.filter(pk__in=options['ids'])
+
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(recipes.filter(pk__gt=last_pk)[:batch_size])# keyset walk, no OFFSET
+            if not batch:
+                break
+            last_pk = batch[-1]
+            updated += rebuild_batch(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating stats for {updated} recipes."))
+
+
+def rebuild_batch(recipe_ids):
+    """Rebuild the aggregates of the given recipes with one grouped query."""
+    histograms = {pk: {} for pk in recipe_ids}
+    rows = (
+        Review.objects.filter(recipe_id__in=recipe_ids)
+        .values_list('recipe_id', 'rating')
+        .annotate(n=Count('pk'))
+        .order_by()
+    )
+    for recipe_id, rating, n in rows:
+        histograms[recipe_id][str(rating)] = n
+
+    recipes = []
+    for pk, histogram in histograms.items():
+        count, average = Recipe.summarize_histogram(histogram)
+        recipes.append(Recipe(pk=pk, rating_histogram=histogram, rating_count=count, rating_avg=average))
+
+    with transaction.atomic():
+        Recipe.objects.bulk_update(recipes, ['rating_histogram', 'rating_count', 'rating_avg'])
+    return len(recipes)
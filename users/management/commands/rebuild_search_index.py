@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from users import search
+from users.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search documents (PostgreSQL search_vector / SQLite FTS5 table)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Recipes indexed per transaction.")
+        parser.add_argument('--ids', nargs='*', type=int, help="Only rebuild these recipe ids.")
+        parser.add_argument('--after-id', type=int, default=0, help="Only rebuild recipes with a greater id.")
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('pk').only('pk', 'title', 'origin_country', 'description', 'ingredients')
+        if options['ids']:
+            recipes = recipes.filter(pk__in=options['ids'])
+
+        total = 0
+        last_pk = options['after_id']
+        while True:
+            batch = list(recipes.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            search.index_recipes(batch)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} recipes for search."))
@@ -0,0 +1,174 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from users.models import Recipe, Review, User
+from users.querybudget import QueryBudget
+
+# name -> (method, url name, query string / POST data, temp_filters stored in the session first)
+SCENARIOS = {
+    'dashboard': ('get', 'dashboard', {}, None),
+    'dashboard_search': ('get', 'dashboard', {'q': 'chicken rice'}, None),
+    'dashboard_price': ('get', 'dashboard', {'min_price': '1000', 'max_price': '5000'}, None),
+    'dashboard_meal': ('get', 'dashboard', {'meal_time': ['Lunch', 'Dinner'], 'meal_type': 'Family'}, None),
+    'dashboard_allergen': ('get', 'dashboard', {}, {'dietary': 'Vegetarian', 'health_condition': '', 'allergies': 'peanut, milk'}),
+    'recipe_detail': ('get', 'recipe-detail', {}, None),
+    'toggle_save': ('post', 'toggle-save', {}, None),
+    'review_post': ('post', 'recipe-detail', {'rating': '4', 'content': 'Benchmark review'}, None),
+}
+WRITE_SCENARIOS = {'toggle_save', 'review_post'}
+
+
+def percentile(samples, pct):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the hot pages through the Django test client and report p50/p95/p99 latency, query counts "
+        "and peak memory per scenario. Run it against a seeded database (see seed_data); write scenarios are "
+        "rolled back so runs stay comparable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help="Timed requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=5, help="Untimed requests per scenario (fills caches).")
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help="Only run these scenarios.")
+        parser.add_argument('--username', help="Account to log in as (default: the customer with the most saves).")
+        parser.add_argument('--recipe', type=int, help="Recipe for the detail/save/review scenarios (default: most reviewed).")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--compare', help="Earlier --output file to diff the p95 latencies against.")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        user = self.pick_user(options['username'])
+        recipe = self.pick_recipe(options['recipe'])
+        client = Client()
+        client.force_login(user)
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name in options['scenario'] or SCENARIOS:
+                results[name] = self.run_scenario(client, name, recipe, options['iterations'], options['warmup'])
+                row = results[name]
+                self.stdout.write(
+                    f"{name:<20} p50 {row['p50_ms']:8.1f} ms  p95 {row['p95_ms']:8.1f} ms  p99 {row['p99_ms']:8.1f} ms  "
+                    f"queries {row['queries_max']:3d}  peak {row['peak_memory_kb']:8.1f} KiB"
+                )
+
+        report = {'meta': self.meta(user, recipe, options), 'scenarios': results}
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        if options['compare']:
+            self.compare(results, options['compare'])
+
+    def pick_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {username!r}.")
+        user = (
+            User.objects.filter(is_customer=True)
+            .annotate(saves=Count('saved_entries')).order_by('-saves', 'pk').first()
+        )
+        if user is None:
+            raise CommandError("No customer accounts, run seed_data first.")
+        return user
+
+    def pick_recipe(self, recipe_id):
+        recipes = Recipe.objects.all()
+        recipe = recipes.filter(pk=recipe_id).first() if recipe_id else recipes.order_by('-rating_count', 'pk').first()
+        if recipe is None:
+            raise CommandError("No recipe to benchmark, run seed_data first.")
+        return recipe
+
+    def request(self, client, method, url, data):
+        return getattr(client, method)(url, data)
+
+    def run_scenario(self, client, name, recipe, iterations, warmup):
+        method, url_name, data, temp_filters = SCENARIOS[name]
+        url = reverse(url_name, args=[recipe.pk]) if url_name != 'dashboard' else reverse(url_name)
+        session = client.session
+        if temp_filters:
+            session['temp_filters'] = temp_filters
+        else:
+            session.pop('temp_filters', None)
+        session.save()
+
+        with transaction.atomic():
+            for _ in range(warmup):
+                self.request(client, method, url, data)
+
+            timings, queries, statuses = [], [], set()
+            for _ in range(iterations):
+                with QueryBudget() as budget:
+                    started = time.perf_counter()
+                    response = self.request(client, method, url, data)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(budget.count)
+                statuses.add(response.status_code)
+
+            # memory on a separate request, tracemalloc would distort the timings above
+            tracemalloc.start()
+            self.request(client, method, url, data)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            if name in WRITE_SCENARIOS:# keep the data set identical for the next run
+                transaction.set_rollback(True)
+
+        return {
+            'iterations': iterations,
+            'status_codes': sorted(statuses),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'queries_median': statistics.median_low(queries),
+            'queries_max': max(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def meta(self, user, recipe, options):
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'user': user.username,
+            'recipe': recipe.pk,
+            'iterations': options['iterations'],
+            'warmup': options['warmup'],
+            'counts': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'reviews': Review.objects.count(),
+            },
+        }
+
+    def compare(self, results, path):
+        with open(path) as handle:
+            previous = json.load(handle)['scenarios']
+        self.stdout.write(f"p95 against {path}:")
+        for name, row in results.items():
+            if name not in previous:
+                continue
+            before, after = previous[name]['p95_ms'], row['p95_ms']
+            change = (after - before) / before * 100 if before else 0
+            self.stdout.write(f"  {name:<20} {before:8.1f} -> {after:8.1f} ms  ({change:+.1f}%)")
@@ -0,0 +1,72 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+from users import tasks
+from users.models import Job
+
+
+class Command(BaseCommand):
+    help = "Process the background job queue (users/tasks.py) on a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="Jobs run in parallel.")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due instead of polling.")
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help="Seconds after which a 'running' job is assumed lost and queued again.")
+        parser.add_argument('--purge-after', type=int, default=7, help="Delete finished jobs older than this many days.")
+
+    def handle(self, *args, **options):
+        threads = max(1, options['threads'])
+        self.size_pools(threads)
+        stale_after = timedelta(seconds=options['stale_after'])
+        processed = failed = 0
+        last_maintenance = 0
+
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job') as pool:
+            try:
+                while True:
+                    if time.monotonic() - last_maintenance > 60:
+                        self.maintenance(stale_after, options['purge_after'])
+                        last_maintenance = time.monotonic()
+
+                    jobs = tasks.claim(threads)
+                    if not jobs:
+                        if options['once']:
+                            break
+                        close_old_connections()
+                        time.sleep(options['poll_interval'])
+                        continue
+                    for ok in pool.map(self.run_job, jobs):
+                        processed += 1
+                        failed += not ok
+            except KeyboardInterrupt:
+                self.stdout.write("Stopping, waiting for running jobs...")
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs, {failed} failed."))
+
+    def size_pools(self, threads):
+        # every thread holds a connection for a whole job (image encoding included), plus the claim loop
+        for connection in connections.all():
+            pool = connection.settings_dict.get('OPTIONS', {}).get('pool')
+            if isinstance(pool, dict) and pool.get('max_size', 0) < threads + 1:
+                pool['max_size'] = threads + 1
+                connection.close_pool()# created again with the new size on first use
+
+    def run_job(self, job):
+        try:
+            return tasks.run(job)
+        finally:
+            connections.close_all()# worker threads get their own connections, do not leak them
+
+    def maintenance(self, stale_after, purge_after):
+        requeued = tasks.requeue_stale(stale_after)
+        if requeued:
+            self.stderr.write(f"Requeued {requeued} stale jobs.")
+        cutoff = timezone.now() - timedelta(days=purge_after)
+        Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()
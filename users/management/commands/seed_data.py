@@ -0,0 +1,178 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from users.forms import DIET_CHOICES, HEALTH_CHOICES
+from users.models import ChefProfile, Recipe, Review, SavedRecipe, User
+
+INGREDIENTS = [
+    'chicken breast', 'beef', 'goat meat', 'smoked fish', 'dried crayfish', 'shrimp', 'eggs', 'tofu', 'lentils',
+    'black beans', 'white rice', 'basmati rice', 'brown rice', 'plantains', 'cassava', 'yam', 'sweet potatoes',
+    'potatoes', 'spaghetti', 'all-purpose flour', 'bread', 'tomatoes', 'red onions', 'garlic cloves', 'ginger',
+    'scotch bonnet pepper', 'green pepper', 'spinach', 'okra', 'egusi seeds', 'groundnuts', 'peanut butter',
+    'carrots', 'green beans', 'sweet corn', 'mushrooms', 'avocado', 'cabbage', 'palm oil', 'olive oil',
+    'vegetable oil', 'butter', 'fresh cream', 'milk', 'cheese', 'yogurt', 'coconut milk', 'honey', 'sugar', 'salt',
+    'black pepper', 'maggi cubes', 'soy sauce', 'curry powder', 'thyme', 'parsley', 'lemon juice', 'beef stock',
+]
+QUANTITIES = ['1', '2', '3', '1/2 cup', '1 cup', '2 cups', '1 tbsp', '2 tbsp', '1 tsp', '200 g', '500 g', '1 kg', 'to taste']
+STEPS = [
+    'Wash and chop the {a}.', 'Season the {a} with salt and pepper.', 'Heat the oil and fry the {a} until golden.',
+    'Add the {a} and stir for two minutes.', 'Simmer the {a} on low heat for {n} minutes.',
+    'Blend the {a} into a smooth paste.', 'Bring the {a} to a boil, then lower the heat.',
+    'Fold in the {a} and adjust the seasoning.', 'Serve hot with the {a}.',
+]
+DISHES = ['Stew', 'Soup', 'Jollof', 'Curry', 'Stir Fry', 'Salad', 'Porridge', 'Grill', 'Pepper Soup', 'Bake', 'Wrap']
+COUNTRIES = ['Cameroon', 'Nigeria', 'Ghana', 'Senegal', 'Kenya', 'Ethiopia', 'Morocco', 'France', 'India', 'Mexico']
+MEAL_TYPES = ['Family', 'Individual']
+MEAL_TIMES = ['Breakfast', 'Lunch', 'Dinner']
+REVIEW_TEXTS = ['Delicious!', 'My family loved it.', 'A bit too salty for me.', 'Easy to follow.', 'Will cook again.']
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic chefs, customers, recipes, reviews and saved recipes for load tests. "
+        "Rows are written with bulk_create, then the derived data (ratings, ingredient index, search, "
+        "compatibility masks) is rebuilt once at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chefs', type=int, default=100)
+        parser.add_argument('--customers', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--reviews', type=int, default=100000)
+        parser.add_argument('--saves', type=int, default=50000, help="Saved-recipe rows.")
+        parser.add_argument('--seed', type=int, default=42, help="Random seed, the same seed gives the same data.")
+        parser.add_argument('--prefix', default='seed', help="Username prefix of the generated accounts.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per bulk insert.")
+        parser.add_argument('--skip-derived', action='store_true', help="Do not run the rebuild_* commands afterwards.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f"Users prefixed '{prefix}_' already exist, pass another --prefix.")
+        if options['chefs'] < 1 and options['recipes']:
+            raise CommandError("Recipes need at least one chef.")
+        started = time.perf_counter()
+
+        password = make_password('password')# hashed once, every seeded account logs in with "password"
+        chef_ids = self.create_users(f'{prefix}_chef', options['chefs'], password, is_chef=True)
+        ChefProfile.objects.bulk_create(
+            [ChefProfile(user_id=pk, years_of_experience=self.rng.randint(0, 30)) for pk in chef_ids],
+            batch_size=self.batch_size,
+        )
+        customer_ids = self.create_users(f'{prefix}_user', options['customers'], password, is_customer=True)
+        recipe_ids = self.create_recipes(chef_ids, options['recipes'])
+        reviewers = customer_ids or chef_ids
+        self.create_reviews(recipe_ids, reviewers, options['reviews'])
+        self.create_saves(recipe_ids, reviewers, options['saves'])
+
+        if recipe_ids and not options['skip_derived']:
+            for command in ('rebuild_rating_stats', 'rebuild_compat_masks', 'rebuild_ingredient_index', 'rebuild_search_index'):
+                self.stdout.write(f"Running {command}...")
+                call_command(command, stdout=self.stdout)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Seeded the database in {elapsed:.1f}s."))
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield range(start, min(start + self.batch_size, total))
+
+    def insert(self, model, rows, **kwargs):
+        with transaction.atomic():
+            return model.objects.bulk_create(rows, batch_size=self.batch_size, **kwargs)
+
+    def create_users(self, prefix, count, password, **flags):
+        for batch in self.batches(count):
+            users = [
+                User(
+                    username=f'{prefix}_{n}', password=password, email=f'{prefix}_{n}@example.com',
+                    first_name=f'First{n}', last_name=f'Last{n}', country=self.rng.choice(COUNTRIES), **flags,
+                )
+                for n in batch
+            ]
+            self.insert(User, users)
+        ids = list(User.objects.filter(username__startswith=f'{prefix}_').order_by('pk').values_list('pk', flat=True))
+        self.stdout.write(f"{len(ids)} users '{prefix}_*'")
+        return ids
+
+    def recipe(self, chef_id):
+        rng = self.rng
+        ingredients = [
+            {'name': name, 'qty': rng.choice(QUANTITIES)}
+            for name in rng.sample(INGREDIENTS, rng.randint(4, 14))
+        ]
+        instructions = [
+            rng.choice(STEPS).format(a=rng.choice(ingredients)['name'], n=rng.randint(5, 45))
+            for _ in range(rng.randint(3, 10))
+        ]
+        main = ingredients[0]['name']
+        return Recipe(
+            chef_id=chef_id,
+            title=f'{main.title()} {rng.choice(DISHES)}',
+            origin_country=rng.choice(COUNTRIES),
+            description=f"A {rng.choice(['hearty', 'quick', 'spicy', 'light', 'classic'])} dish built around {main}.",
+            ingredients=ingredients,
+            instructions=instructions,
+            dietary=rng.choice(DIET_CHOICES[1:])[0] if rng.random() < 0.4 else '',
+            health_condition=rng.choice(HEALTH_CHOICES[1:])[0] if rng.random() < 0.2 else '',
+            meal_type=rng.choice(MEAL_TYPES),
+            meal_time=rng.choice(MEAL_TIMES),
+            budget=rng.randrange(500, 20000, 250),
+            cooking_time=rng.randrange(10, 180, 5),
+        )
+
+    def create_recipes(self, chef_ids, count):
+        first_new = (Recipe.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+        for batch in self.batches(count):
+            self.insert(Recipe, [self.recipe(self.rng.choice(chef_ids)) for _ in batch])
+        ids = list(Recipe.objects.filter(pk__gte=first_new).order_by('pk').values_list('pk', flat=True))
+        self.stdout.write(f"{len(ids)} recipes")
+        return ids
+
+    def pairs(self, recipe_ids, user_ids, count):
+        """Distinct (recipe, user) pairs, skewed so a few recipes collect most of the activity."""
+        seen = set()
+        limit = min(count, len(recipe_ids) * len(user_ids))
+        while len(seen) < limit:
+            recipe_id = recipe_ids[int(len(recipe_ids) * self.rng.random() ** 3)]
+            pair = (recipe_id, self.rng.choice(user_ids))
+            if pair not in seen:
+                seen.add(pair)
+                yield pair
+
+    def create_reviews(self, recipe_ids, user_ids, count):
+        if not recipe_ids or not user_ids:
+            return
+        pairs = self.pairs(recipe_ids, user_ids, count)
+        created = 0
+        for batch in self.batches(count):
+            reviews = [
+                Review(recipe_id=recipe_id, user_id=user_id, rating=self.rng.choices(range(1, 6), (1, 1, 3, 6, 5))[0],
+                       content=self.rng.choice(REVIEW_TEXTS))
+                for _, (recipe_id, user_id) in zip(batch, pairs)
+            ]
+            created += len(self.insert(Review, reviews))
+        self.stdout.write(f"{created} reviews")
+
+    def create_saves(self, recipe_ids, user_ids, count):
+        if not recipe_ids or not user_ids:
+            return
+        now = timezone.now()
+        pairs = self.pairs(recipe_ids, user_ids, count)
+        for batch in self.batches(count):
+            saves = [
+                SavedRecipe(recipe_id=recipe_id, user_id=user_id,
+                            saved_at=now - timedelta(minutes=self.rng.randint(0, 365 * 24 * 60)))
+                for _, (recipe_id, user_id) in zip(batch, pairs)
+            ]
+            self.insert(SavedRecipe, saves, ignore_conflicts=True)
+        self.stdout.write(f"{min(count, len(recipe_ids) * len(user_ids))} saved recipes")
@@ -0,0 +1,173 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .querybudget import QueryBudget
+from .session_filters import get_temp_filters
+
+logger = logging.getLogger('users.performance')
+
+
+class QueryBudgetMiddleware:
+    """Development aid: count the queries of each request and warn about N+1 patterns.
+
+    Enabled with QUERY_BUDGET_ENABLED; when off Django drops it at startup.
+    Sync and async capable, so it adds no thread switch under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.max_queries = settings.QUERY_BUDGET_MAX_QUERIES
+        self.threshold = settings.QUERY_BUDGET_N_PLUS_ONE
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with QueryBudget(self.max_queries, self.threshold) as budget:
+            response = self.get_response(request)
+        return self.report(request, response, budget)
+
+    async def __acall__(self, request):
+        async with QueryBudget(self.max_queries, self.threshold) as budget:# see querybudget: hooks the ORM thread
+            response = await self.get_response(request)
+        return self.report(request, response, budget)
+
+    def report(self, request, response, budget):
+        response['X-Query-Count'] = str(budget.count)
+        for problem in budget.violations():
+            logger.warning("%s %s: %s", request.method, request.path, problem)
+        return response
+
+
+class ServerTimingMiddleware:
+    """Report where the time of a request went.
+
+    Adds a Server-Timing header (db, view, render, total, plus the card cache
+    hit rate when the dashboard rendered cards) and logs requests slower than
+    SERVER_TIMING_SLOW_MS as one JSON line on the users.performance logger.
+
+    Enabled with SERVER_TIMING_ENABLED; when off Django drops it at startup, so
+    a disabled install pays nothing. "view" is the time spent in the view
+    itself; for TemplateResponse views "render" is the template render that
+    follows it, for views calling render() it is included in "view".
+
+    Sync and async capable. Under ASGI "db" counts the queries of the
+    request's sync_to_async thread, where the ORM runs (see querybudget).
+    """
+
+    IGNORED_PARAMS = {'cursor', 'csrfmiddlewaretoken'}# paging / form noise, not a filter
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = settings.SERVER_TIMING_SLOW_MS
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request._timing = {'view_name': None}
+        started = time.perf_counter()
+        with QueryBudget() as db:
+            response = self.get_response(request)
+        finished = time.perf_counter()
+        metrics, cards = self.add_header(request, response, db, started, finished)
+        if (finished - started) * 1000 >= self.slow_ms:
+            self._log_slow(request, response, request._timing, metrics, db.count, cards)
+        return response
+
+    async def __acall__(self, request):
+        request._timing = {'view_name': None}
+        started = time.perf_counter()
+        async with QueryBudget() as db:
+            response = await self.get_response(request)
+        finished = time.perf_counter()
+        metrics, cards = self.add_header(request, response, db, started, finished)
+        if (finished - started) * 1000 >= self.slow_ms:# may read the session: ORM thread
+            await sync_to_async(self._log_slow)(request, response, request._timing, metrics, db.count, cards)
+        return response
+
+    def add_header(self, request, response, db, started, finished):
+        """Set Server-Timing; returns the (name, seconds, desc) metrics and the card cache stats."""
+        timing = request._timing
+        metrics = [('db', db.duration, f'{db.count} queries')]
+        if 'view_start' in timing:
+            view_end = timing.get('render_start', finished)
+            metrics.append(('view', view_end - timing['view_start'], timing['view_name']))
+        if 'render_end' in timing:
+            metrics.append(('render', timing['render_end'] - timing['render_start'], None))
+        metrics.append(('total', finished - started, None))
+        header = [self._metric(name, seconds, desc) for name, seconds, desc in metrics]
+        cards = getattr(request, 'card_cache_stats', None)
+        if cards:
+            header.append(f'cards;desc="{cards["hits"]} hits, {cards["misses"]} misses"')
+        response['Server-Timing'] = ', '.join(header)
+        return metrics, cards
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        request._timing['view_name'] = (view_class or view_func).__name__
+        request._timing['view_start'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        timing = request._timing
+        timing['render_start'] = time.perf_counter()
+
+        def rendered(response):
+            timing['render_end'] = time.perf_counter()
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def _metric(name, seconds, desc):
+        metric = f'{name};dur={seconds * 1000:.1f}'
+        if desc:
+            metric += f';desc="{desc}"'
+        return metric
+
+    def filter_params(self, request):
+        """GET filters with sorted keys and values, plus the saved recommendation filters."""
+        params = {
+            key: sorted(values) if len(values) > 1 else values[0]
+            for key, values in sorted(request.GET.lists())
+            if key not in self.IGNORED_PARAMS and any(values)
+        }
+        if hasattr(request, 'session'):
+            filters = get_temp_filters(request)
+            if filters:
+                params['temp_filters'] = filters
+        return params
+
+    def _log_slow(self, request, response, timing, metrics, query_count, cards):
+        record = {
+            'event': 'slow_request',
+            'method': request.method,
+            'path': request.path,
+            'view': timing['view_name'],
+            'status': response.status_code,
+            'queries': query_count,
+            **{f'{name}_ms': round(seconds * 1000, 1) for name, seconds, _ in metrics},
+            'params': self.filter_params(request),
+        }
+        if cards:
+            record['card_cache'] = cards
+        logger.warning(json.dumps(record, default=str, sort_keys=True))
@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-18 12:01
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Recipe = apps.get_model("users", "Recipe")
+    Review = apps.get_model("users", "Review")
+    histograms = {}
+    rows = (
+        Review.objects.values_list("recipe_id", "rating")
+        .annotate(n=Count("pk"))
+        .order_by()
+    )
+    for recipe_id, rating, n in rows:
+        histograms.setdefault(recipe_id, {})[str(rating)] = n
+    for recipe_id, histogram in histograms.items():
+        count = sum(histogram.values())
+        total = sum(int(stars) * n for stars, n in histogram.items())
+        Recipe.objects.filter(pk=recipe_id).update(
+            rating_histogram=histogram, rating_count=count, rating_avg=total / count
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_avg",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_histogram",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
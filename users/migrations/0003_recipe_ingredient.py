@@ -0,0 +1,116 @@
+# Generated by Django 6.0 on 2026-10-18 12:03
+
+import json
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# frozen copy of users.ingredients as of this migration, so later changes there cannot alter it
+WORD_RE = re.compile(r"[a-z0-9]+")
+MAX_PHRASE_WORDS = 3
+
+
+def ingredient_names(raw):
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            raw = [raw]
+        if isinstance(raw, str):
+            raw = [raw]
+    if isinstance(raw, dict):
+        raw = [raw]
+    if not isinstance(raw, list):
+        return []
+    names = []
+    for item in raw:
+        name = item.get("name") if isinstance(item, dict) else item
+        if name:
+            names.append(str(name))
+    return names
+
+
+def singularize(word):
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def ingredient_tokens(raw):
+    tokens = set()
+    for name in ingredient_names(raw):
+        words = [singularize(word) for word in WORD_RE.findall(name.lower())]
+        for size in range(1, MAX_PHRASE_WORDS + 1):
+            for start in range(len(words) - size + 1):
+                tokens.add(" ".join(words[start : start + size]))
+    return tokens
+
+
+def backfill_ingredient_tokens(apps, schema_editor):
+    Recipe = apps.get_model("users", "Recipe")
+    RecipeIngredient = apps.get_model("users", "RecipeIngredient")
+    rows = []
+    for recipe in Recipe.objects.only("pk", "ingredients").iterator(chunk_size=500):
+        rows.extend(
+            RecipeIngredient(recipe_id=recipe.pk, token=token)
+            for token in ingredient_tokens(recipe.ingredients)
+            if len(token) <= 100
+        )
+        if len(rows) >= 5000:
+            RecipeIngredient.objects.bulk_create(rows)
+            rows = []
+    RecipeIngredient.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_recipe_rating_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipeIngredient",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=100)),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ingredient_tokens",
+                        to="users.recipe",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["token", "recipe"], name="recipe_ingredient_token_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("recipe", "token"),
+                        name="unique_recipe_ingredient_token",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_ingredient_tokens, migrations.RunPython.noop),
+    ]
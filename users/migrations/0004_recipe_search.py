@@ -0,0 +1,112 @@
+# Generated by Django 6.0 on 2026-10-18 12:04
+
+import json
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# frozen copy of the users.search structures and documents as of this migration
+FTS_TABLE = "users_recipe_fts"
+GIN_INDEX = "users_recipe_search_vector_gin"
+PG_UPDATE = (
+    "UPDATE users_recipe SET search_vector = "
+    "setweight(to_tsvector('english', %s), 'A') || setweight(to_tsvector('english', %s), 'B') || "
+    "setweight(to_tsvector('english', %s), 'C') || setweight(to_tsvector('english', %s), 'D') "
+    "WHERE id = %s"
+)
+SQLITE_INSERT = (
+    f"INSERT INTO {FTS_TABLE} (rowid, title, origin, description, ingredients) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+
+
+def ingredient_names(raw):
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            raw = [raw]
+        if isinstance(raw, str):
+            raw = [raw]
+    if isinstance(raw, dict):
+        raw = [raw]
+    if not isinstance(raw, list):
+        return []
+    names = []
+    for item in raw:
+        name = item.get("name") if isinstance(item, dict) else item
+        if name:
+            names.append(str(name))
+    return names
+
+
+def document(recipe):
+    # title, origin, description, ingredients: weights A to D
+    return (
+        recipe.title or "",
+        recipe.origin_country or "",
+        recipe.description or "",
+        " ".join(ingredient_names(recipe.ingredients)),
+    )
+
+
+def create_search_backend(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {GIN_INDEX} "
+            "ON users_recipe USING gin (search_vector)"
+        )
+        statement = PG_UPDATE
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            "USING fts5(title, origin, description, ingredients, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(f"DELETE FROM {FTS_TABLE}")  # a rerun starts over
+        statement = SQLITE_INSERT
+    else:
+        return
+
+    Recipe = apps.get_model("users", "Recipe")
+    recipes = Recipe.objects.using(schema_editor.connection.alias).only(
+        "pk", "title", "origin_country", "description", "ingredients"
+    )
+    batch = []
+    with schema_editor.connection.cursor() as cursor:
+        for recipe in recipes.iterator(chunk_size=500):
+            if vendor == "postgresql":
+                batch.append((*document(recipe), recipe.pk))
+            else:
+                batch.append((recipe.pk, *document(recipe)))
+            if len(batch) == 500:
+                cursor.executemany(statement, batch)
+                batch = []
+        if batch:
+            cursor.executemany(statement, batch)
+
+
+def drop_search_backend(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {GIN_INDEX}")
+    elif vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_recipe_ingredient"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_backend, drop_search_backend),
+    ]
@@ -0,0 +1,193 @@
+# Generated by Django 6.0 on 2026-10-18 12:06
+
+import json
+import re
+
+from django.db import migrations, models
+
+# frozen copy of the users.restrictions rules and matching as of this migration, so later
+# changes there cannot alter it (rebuild_compat_masks recomputes masks with the current rules)
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+# fmt: off
+# anything missing here counts as compatible for the diets built on it, so err on the long side
+MEAT = [
+    "chicken", "beef", "pork", "meat", "meatball", "lamb", "mutton", "goat", "veal", "venison", "rabbit", "turkey",
+    "duck", "goose", "quail", "bacon", "ham", "sausage", "salami", "pepperoni", "chorizo", "prosciutto", "pancetta",
+    "hot dog", "burger", "steak", "oxtail", "tripe", "liver", "suya", "lard", "gelatin", "bone broth",
+]
+SEAFOOD = [
+    "fish", "tuna", "salmon", "sardine", "anchovy", "herring", "cod", "tilapia", "mackerel", "catfish", "stockfish",
+    "shrimp", "prawn", "crayfish", "crab", "lobster", "mussel", "oyster", "clam", "scallop", "squid", "octopus",
+]
+ANIMAL_PRODUCTS = [
+    "egg", "milk", "cheese", "honey", "yogurt", "butter", "buttermilk", "cream", "whey", "casein", "ghee",
+    "mayonnaise", "custard",
+]
+
+RESTRICTIONS = {
+    # --- DIETARY  ---
+    "vegetarian": MEAT + SEAFOOD,
+    "vegan": MEAT + SEAFOOD + ANIMAL_PRODUCTS,  # everything a vegetarian avoids, and more
+    "pescatarian": MEAT,
+    "halal": ["pork", "bacon", "ham", "lard", "wine", "beer", "alcohol", "rum", "liqueur", "gelatin"],
+    "kosher": ["pork", "bacon", "ham", "shrimp", "crab", "lobster", "clam", "oyster", "cheeseburger"],
+    "keto": ["sugar", "rice", "pasta", "bread", "flour", "potato", "corn", "syrup", "banana", "apple", "candy", "soda"],
+    "gluten-free": ["wheat", "barley", "rye", "flour", "bread", "pasta", "couscous", "malt", "soy sauce", "seitan", "beer"],
+    "dairy-free": ["milk", "cheese", "butter", "cream", "yogurt", "whey", "casein", "lactose", "ghee"],
+    "nut-free": ["peanut", "almond", "walnut", "cashew", "pecan", "hazelnut", "macadamia", "pistachio", "nutella"],
+    "shellfish-free": ["shrimp", "crab", "lobster", "prawn", "mussel", "oyster", "clam", "scallop", "squid"],
+
+    # --- HEALTH CONDITIONS ---
+    "diabetes": ["sugar", "syrup", "candy", "chocolate", "cake", "soda", "honey", "molasses", "jam", "jelly", "white rice"],
+    "hypertension": ["salt", "soy sauce", "sodium", "bacon", "pickle", "canned", "salami", "sausage", "msg"],
+    "heart disease": ["butter", "cream", "bacon", "lard", "sausage", "fried", "coconut oil", "palm oil"],
+    "celiac": ["wheat", "barley", "rye", "flour", "bread", "pasta", "soy sauce", "malt", "beer"],
+    "gerd": ["spicy", "chili", "jalapeno", "pepper", "hot sauce", "tomato", "lemon", "orange", "coffee", "chocolate", "mint", "garlic", "onion"],
+    "ibs": ["onion", "garlic", "milk", "wheat", "beans", "lentils", "apple", "pear", "honey", "mushroom"],
+    "kidney disease": ["salt", "banana", "potato", "spinach", "avocado", "tomato", "brown rice", "milk", "yogurt"],
+    "gout": ["liver", "kidney", "anchovy", "sardine", "herring", "beer", "beef", "pork", "shellfish", "sugar"],
+}
+
+# common allergens for the recommendation filter, each one gets its own "free of" bit
+ALLERGENS = {
+    "peanut": ["peanut", "groundnut", "nutella"],
+    "tree-nut": ["nut", "almond", "walnut", "cashew", "pecan", "hazelnut", "macadamia", "pistachio", "brazil nut", "nutella"],
+    "milk": ["milk", "dairy", "cheese", "butter", "cream", "yogurt", "whey", "casein", "lactose", "ghee"],
+    "egg": ["egg", "mayonnaise", "meringue"],
+    "wheat": ["wheat", "gluten", "flour", "bread", "pasta", "couscous", "semolina", "seitan"],
+    "soy": ["soy", "soya", "soy sauce", "tofu", "edamame", "miso", "tempeh"],
+    "fish": ["fish", "tuna", "salmon", "sardine", "anchovy", "herring", "cod", "tilapia", "mackerel"],
+    "shellfish": ["shellfish", "seafood", "shrimp", "crab", "lobster", "prawn", "mussel", "oyster", "clam", "scallop", "squid", "crayfish"],
+    "sesame": ["sesame", "tahini"],
+}
+
+# names that contain an allergen word without containing the allergen
+ALLERGEN_LOOKALIKES = {
+    "egg": ["eggplant"],
+    "tree-nut": ["nutmeg", "butternut"],
+}
+
+# bit positions stored in Recipe.compat_mask
+COMPAT_FLAGS = [
+    # DIET_CHOICES
+    "Vegetarian", "Vegan", "Gluten-Free", "Dairy-Free", "Halal", "Kosher", "Keto", "Nut-Free", "Shellfish-Free", "Pescatarian",
+    # HEALTH_CHOICES
+    "Diabetes", "Hypertension", "Heart Disease", "Celiac", "GERD", "IBS", "Kidney Disease", "Obesity", "Gout", "Anemia",
+    # allergen-free bits
+    *(f"allergen:{name}" for name in ALLERGENS),
+]
+# fmt: on
+
+
+def ingredient_names(raw):
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            raw = [raw]
+        if isinstance(raw, str):
+            raw = [raw]
+    if isinstance(raw, dict):
+        raw = [raw]
+    if not isinstance(raw, list):
+        return []
+    names = []
+    for item in raw:
+        name = item.get("name") if isinstance(item, dict) else item
+        if name:
+            names.append(str(name))
+    return names
+
+
+def singularize(word):
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def normalize_words(text):
+    return [singularize(word) for word in WORD_RE.findall(str(text).lower())]
+
+
+def contains_phrase(words, phrase):
+    size = len(phrase)
+    return any(
+        words[start : start + size] == phrase for start in range(len(words) - size + 1)
+    )
+
+
+def conflicts(ingredients):
+    """Rule keys and "allergen:<name>" flags the ingredients conflict with."""
+    names = [normalize_words(name) for name in ingredient_names(ingredients)]
+    found = set()
+    for rule, phrases in RESTRICTIONS.items():
+        # whole words, a phrase never spans two ingredients
+        if any(
+            contains_phrase(words, normalize_words(phrase))
+            for phrase in phrases
+            for words in names
+        ):
+            found.add(rule)
+    for allergen, words in ALLERGENS.items():
+        for name in names:
+            name = " ".join(name)
+            for lookalike in ALLERGEN_LOOKALIKES.get(allergen, ()):
+                name = name.replace(lookalike, " ")
+            if any(word in name for word in words):  # substrings count for allergens
+                found.add(f"allergen:{allergen}")
+                break
+    return found
+
+
+def compat_mask(ingredients, dietary, health_condition):
+    found = conflicts(ingredients)
+    declared = {
+        (dietary or "").strip().lower(),
+        (health_condition or "").strip().lower(),
+    }
+    mask = 0
+    for position, flag in enumerate(COMPAT_FLAGS):
+        key = flag.lower()
+        if key in found:
+            continue
+        if key in RESTRICTIONS or key.startswith("allergen:") or key in declared:
+            mask |= 1 << position
+    return mask
+
+
+def backfill_compat_mask(apps, schema_editor):
+    Recipe = apps.get_model("users", "Recipe")
+    batch = []
+    recipes = Recipe.objects.only("pk", "ingredients", "dietary", "health_condition")
+    for recipe in recipes.iterator(chunk_size=1000):
+        recipe.compat_mask = compat_mask(
+            recipe.ingredients, recipe.dietary, recipe.health_condition
+        )
+        batch.append(recipe)
+        if len(batch) == 1000:
+            Recipe.objects.bulk_update(batch, ["compat_mask"])
+            batch = []
+    Recipe.objects.bulk_update(batch, ["compat_mask"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_recipe_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="compat_mask",
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_compat_mask, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 6.0 on 2026-10-18 12:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_recipe_compat_mask"),
+    ]
+
+    operations = [
+        # the auto-created users_user_saved_recipes table becomes the explicit SavedRecipe model,
+        # nothing changes in the database for this step
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="SavedRecipe",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "recipe",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="saved_entries",
+                                to="users.recipe",
+                            ),
+                        ),
+                        (
+                            "user",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="saved_entries",
+                                to=settings.AUTH_USER_MODEL,
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "users_user_saved_recipes",
+                        "unique_together": {("user", "recipe")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="user",
+                    name="saved_recipes",
+                    field=models.ManyToManyField(
+                        blank=True,
+                        related_name="saved_by",
+                        through="users.SavedRecipe",
+                        to="users.recipe",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="savedrecipe",
+            name="saved_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="savedrecipe",
+            index=models.Index(
+                fields=["user", "-saved_at"], name="saved_recipe_user_recent_idx"
+            ),
+        ),
+    ]
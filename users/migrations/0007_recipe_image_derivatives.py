@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0006_savedrecipe"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="image_derivatives",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 6.0 on 2026-10-18 12:35
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedupe_reviews(apps, schema_editor):
+    # keep the newest review of each (recipe, user) pair, then recount the recipes that lost some
+    Recipe = apps.get_model("users", "Recipe")
+    Review = apps.get_model("users", "Review")
+    duplicated = (
+        Review.objects.values_list("recipe_id", "user_id")
+        .annotate(n=Count("pk"))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    affected = set()
+    for recipe_id, user_id, _ in duplicated:
+        ids = list(
+            Review.objects.filter(recipe_id=recipe_id, user_id=user_id)
+            .order_by("-created_at", "-id")
+            .values_list("pk", flat=True)
+        )
+        Review.objects.filter(pk__in=ids[1:]).delete()
+        affected.add(recipe_id)
+    for recipe_id in affected:
+        histogram = {
+            str(rating): n
+            for rating, n in Review.objects.filter(recipe_id=recipe_id)
+            .values_list("rating")
+            .annotate(n=Count("pk"))
+            .order_by()
+        }
+        count = sum(histogram.values())
+        total = sum(int(stars) * n for stars, n in histogram.items())
+        Recipe.objects.filter(pk=recipe_id).update(
+            rating_histogram=histogram,
+            rating_count=count,
+            rating_avg=total / count if count else 0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0008_job"),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_reviews, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["recipe", "-created_at", "-id"], name="review_recipe_recent_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="review",
+            constraint=models.UniqueConstraint(
+                fields=("recipe", "user"), name="unique_review_per_user"
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.0 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0009_review_feed_unique"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["-created_at", "-id"], name="recipe_recent_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["meal_time", "-created_at", "-id"],
+                name="recipe_meal_time_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["meal_type", "-created_at", "-id"],
+                name="recipe_meal_type_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                condition=models.Q(("dietary__gt", "")),
+                fields=["dietary", "-created_at", "-id"],
+                name="recipe_dietary_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                condition=models.Q(("health_condition__gt", "")),
+                fields=["health_condition", "-created_at", "-id"],
+                name="recipe_health_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                condition=models.Q(("budget__isnull", False)),
+                fields=["budget"],
+                name="recipe_budget_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["chef", "-created_at"], name="recipe_chef_recent_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 14:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_updated_at(apps, schema_editor):
+    # existing reviews were last written when they were created
+    Review = apps.get_model("users", "Review")
+    Review.objects.update(updated_at=models.F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0010_recipe_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="review",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,121 @@
+# Generated by Django 6.0 on 2026-10-18 16:20
+
+import json
+import re
+
+from django.db import migrations
+
+# frozen copy of users.ingredients as of this migration, so later changes there cannot alter it
+WORD_RE = re.compile(r"[a-z0-9]+")
+MAX_PHRASE_WORDS = 3
+COMPOUND_HEADS = frozenset(
+    {
+        "berry",
+        "bread",
+        "cake",
+        "corn",
+        "cream",
+        "fish",
+        "flour",
+        "fruit",
+        "meal",
+        "milk",
+        "nut",
+        "seed",
+        "wheat",
+    }
+)
+COMPOUND_MODIFIERS = COMPOUND_HEADS | {
+    "almond",
+    "butter",
+    "cheese",
+    "egg",
+    "oat",
+    "pea",
+    "rice",
+    "soy",
+}
+
+
+def ingredient_names(raw):
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            raw = [raw]
+        if isinstance(raw, str):
+            raw = [raw]
+    if isinstance(raw, dict):
+        raw = [raw]
+    if not isinstance(raw, list):
+        return []
+    names = []
+    for item in raw:
+        name = item.get("name") if isinstance(item, dict) else item
+        if name:
+            names.append(str(name))
+    return names
+
+
+def singularize(word):
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def compound_parts(word):
+    parts = set()
+    for head in COMPOUND_HEADS:
+        rest = word[: -len(head)]
+        if word.endswith(head) and len(rest) >= 3:
+            parts.add(head)
+            if rest in COMPOUND_MODIFIERS:
+                parts.add(rest)
+    return parts
+
+
+def ingredient_tokens(raw):
+    tokens = set()
+    for name in ingredient_names(raw):
+        words = [singularize(word) for word in WORD_RE.findall(name.lower())]
+        for size in range(1, MAX_PHRASE_WORDS + 1):
+            for start in range(len(words) - size + 1):
+                tokens.add(" ".join(words[start : start + size]))
+        for word in words:
+            tokens |= compound_parts(word)
+    return tokens
+
+
+def add_compound_tokens(apps, schema_editor):
+    # the filter now matches tokens exactly, so compound words need their parts in the index;
+    # tokens only get added, the ones already there stay valid
+    Recipe = apps.get_model("users", "Recipe")
+    RecipeIngredient = apps.get_model("users", "RecipeIngredient")
+    rows = []
+    for recipe in Recipe.objects.only("pk", "ingredients").iterator(chunk_size=500):
+        rows.extend(
+            RecipeIngredient(recipe_id=recipe.pk, token=token)
+            for token in ingredient_tokens(recipe.ingredients)
+            if len(token) <= 100
+        )
+        if len(rows) >= 5000:
+            RecipeIngredient.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    RecipeIngredient.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0011_review_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_compound_tokens, migrations.RunPython.noop),
+    ]
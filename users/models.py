@@ -1,15 +1,21 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
-from django.db.models import Avg
+from django.contrib.postgres.search import SearchVectorField
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
 import re
 
+from . import images
+from .ingredients import ingredient_tokens
+from .restrictions import compat_mask
+
 # Create your models here.
 class User(AbstractUser):
     #additional fields based on user roles
     is_chef = models.BooleanField(default=False)
     is_customer = models.BooleanField(default=False)
     country = models.CharField(max_length=100, blank=True)
-    saved_recipes = models.ManyToManyField('Recipe', related_name='saved_by', blank=True)
+    saved_recipes = models.ManyToManyField('Recipe', through='SavedRecipe', related_name='saved_by', blank=True)
 
 class ChefProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
@@ -37,6 +43,58 @@ class Recipe(models.Model):
 
     video_url = models.URLField(max_length=200, blank=True, null=True) 
 
+    #denormalized review stats kept in sync by Review.save() and the review post_delete signal
+    rating_avg = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_histogram = models.JSONField(default=dict, blank=True)# {"<stars>": count}
+
+    #bit per diet/health choice and common allergen the ingredients are safe for (users/restrictions.py COMPAT_FLAGS)
+    compat_mask = models.BigIntegerField(default=0, db_index=True)
+
+    #weighted full-text document (PostgreSQL only, GIN index created in migration 0004), see users/search.py
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    #resized AVIF/WebP/JPEG copies of the photo, written by refresh_image_derivatives() (users/images.py)
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        # dashboard: optional filter + ORDER BY created_at DESC, id DESC (the keyset cursor), see users/filters.py;
+        # checked against real plans by QueryPlanTests on PostgreSQL
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='recipe_recent_idx'),
+            models.Index(fields=['meal_time', '-created_at', '-id'], name='recipe_meal_time_recent_idx'),
+            models.Index(fields=['meal_type', '-created_at', '-id'], name='recipe_meal_type_recent_idx'),
+            # most recipes leave these empty, so the partial indexes only hold the tagged rows
+            models.Index(
+                fields=['dietary', '-created_at', '-id'], condition=models.Q(dietary__gt=''),
+                name='recipe_dietary_recent_idx',
+            ),
+            models.Index(
+                fields=['health_condition', '-created_at', '-id'], condition=models.Q(health_condition__gt=''),
+                name='recipe_health_recent_idx',
+            ),
+            models.Index(fields=['budget'], condition=models.Q(budget__isnull=False), name='recipe_budget_idx'),
+            # "my recipes" and the chef sidebar
+            models.Index(fields=['chef', '-created_at'], name='recipe_chef_recent_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # the compatibility mask only depends on these columns, recompute it in memory (no query) when they are written
+        update_fields = kwargs.get('update_fields')
+        mask_inputs = {'ingredients', 'dietary', 'health_condition'}
+        if update_fields is None or mask_inputs & set(update_fields):
+            self.refresh_compat_mask()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'compat_mask'}
+        with transaction.atomic():# the recipe and its allergen tokens commit together
+            super().save(*args, **kwargs)
+            if update_fields is None or 'ingredients' in update_fields:
+                # inline, not a job: the allergy filter must never see the previous ingredient list
+                self.refresh_ingredient_index()
+
+    def refresh_compat_mask(self):
+        self.compat_mask = compat_mask(self.ingredients, self.dietary, self.health_condition)
+
     def get_video_id(self):
         """Extracts the ID from a YouTube URL to use in the player"""
         if not self.video_url:
@@ -51,16 +109,169 @@ class Recipe(models.Model):
         return None
 
     def get_average_rating(self):
-        reviews = self.reviews.all() 
-        
-        if reviews.exists():
-            # Calculate average of the 'rating' field
-            return reviews.aggregate(Avg('rating'))['rating__avg']
-        return 0
+        # read the stored aggregate, no query needed
+        return self.rating_avg if self.rating_count else 0
+
+    @staticmethod
+    def summarize_histogram(histogram):
+        """Return (count, average) for a {"<stars>": count} histogram."""
+        count = sum(histogram.values())
+        if not count:
+            return 0, 0
+        total = sum(int(stars) * n for stars, n in histogram.items())
+        return count, total / count
+
+    @classmethod
+    def update_rating_stats(cls, recipe_id, added=None, removed=None):
+        """Apply one review change to the stored aggregates of a recipe.
+
+        The recipe row is locked for the duration of the surrounding transaction
+        so concurrent reviews on the same recipe cannot lose updates.
+        """
+        with transaction.atomic():
+            histogram = (
+                cls.objects.select_for_update()
+                .filter(pk=recipe_id)
+                .values_list('rating_histogram', flat=True)
+                .first()
+            )
+            if histogram is None:# recipe is gone (e.g. cascade delete in progress)
+                return
+            histogram = dict(histogram)
+            if removed is not None:
+                key = str(removed)
+                histogram[key] = histogram.get(key, 0) - 1
+                if histogram[key] <= 0:
+                    del histogram[key]
+            if added is not None:
+                key = str(added)
+                histogram[key] = histogram.get(key, 0) + 1
+            count, average = cls.summarize_histogram(histogram)
+            # queryset update so Recipe.save() side effects (updated_at, signals) are not triggered
+            cls.objects.filter(pk=recipe_id).update(
+                rating_histogram=histogram, rating_count=count, rating_avg=average
+            )
     
 
+    def refresh_ingredient_index(self):
+        # keep the RecipeIngredient rows in line with the current ingredient list
+        RecipeIngredient.rebuild_for([self])
+
+    def image_derivatives_stale(self):
+        return images.is_stale(self.image.name if self.image else '', self.image_derivatives)
+
+    def refresh_image_derivatives(self):
+        # (re)generate the resized copies of the current photo and drop the files of the previous one
+        old = self.image_derivatives or {}
+        new = images.generate_derivatives(self.image) if self.image else {}
+        Recipe.objects.filter(pk=self.pk).update(image_derivatives=new)# no save(): leaves updated_at and signals alone
+        self.image_derivatives = new
+        self.__dict__.pop('card_picture', None)
+        self.__dict__.pop('detail_picture', None)
+        old_hash = old.get('hash')
+        if old_hash and old_hash != new.get('hash') and not Recipe.objects.filter(image_derivatives__hash=old_hash).exists():
+            images.delete_derivatives(old)
+        return new
+
+    @cached_property
+    def card_picture(self):
+        return images.picture(self.image_derivatives, 'card')
+
+    @cached_property
+    def detail_picture(self):
+        return images.picture(self.image_derivatives, 'detail')
+
     def __str__(self):
         return self.title
+
+
+class RecipeIngredient(models.Model):
+    # normalized (lower-cased, singular) ingredient tokens, one row per token, used for allergen exclusion
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='ingredient_tokens')
+    token = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'token'], name='unique_recipe_ingredient_token'),
+        ]
+        indexes = [
+            models.Index(fields=['token', 'recipe'], name='recipe_ingredient_token_idx'),
+        ]
+
+    @classmethod
+    def rebuild_for(cls, recipes):
+        """Replace the token rows of the given recipes in one delete and one bulk insert."""
+        rows = [
+            cls(recipe_id=recipe.pk, token=token)
+            for recipe in recipes
+            for token in ingredient_tokens(recipe.ingredients)
+            if len(token) <= cls._meta.get_field('token').max_length
+        ]
+        with transaction.atomic():
+            cls.objects.filter(recipe_id__in=[recipe.pk for recipe in recipes]).delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    def __str__(self):
+        return self.token
+    
+class SavedRecipe(models.Model):
+    # through table of User.saved_recipes (same table as the old auto-created one), adds when it was saved
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_entries')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='saved_entries')
+    saved_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'users_user_saved_recipes'
+        unique_together = [('user', 'recipe')]
+        indexes = [
+            models.Index(fields=['user', '-saved_at'], name='saved_recipe_user_recent_idx'),
+        ]
+
+    @classmethod
+    def toggle(cls, user_id, recipe_id):
+        """Flip the saved state in at most three statements; returns (saved, recipe title, times saved).
+
+        Delete first and insert only when nothing was deleted, so two quick
+        clicks always alternate instead of racing an exists() check. Raises
+        Recipe.DoesNotExist for an unknown recipe.
+        """
+        try:
+            with transaction.atomic():
+                deleted, _ = cls.objects.filter(user_id=user_id, recipe_id=recipe_id).delete()
+                row = (
+                    Recipe.objects.filter(pk=recipe_id)
+                    .annotate(times_saved=models.Count('saved_entries'))
+                    .values_list('title', 'times_saved')
+                    .first()
+                )
+                if row is None:
+                    raise Recipe.DoesNotExist
+                title, times_saved = row
+                if not deleted:
+                    cls.objects.bulk_create([cls(user_id=user_id, recipe_id=recipe_id)], ignore_conflicts=True)
+                    times_saved += 1
+        except IntegrityError:# recipe deleted between the lookup and the insert (foreign key checked at commit)
+            raise Recipe.DoesNotExist
+        return not deleted, title, times_saved
+
+    @classmethod
+    def set_saved(cls, user_id, save_ids=(), unsave_ids=()):
+        """Make the given recipes saved / not saved (idempotent); returns the ids that do not exist."""
+        requested = set(save_ids) | set(unsave_ids)
+        existing = set(Recipe.objects.filter(pk__in=requested).values_list('pk', flat=True))
+        with transaction.atomic():
+            if unsave_ids:
+                cls.objects.filter(user_id=user_id, recipe_id__in=unsave_ids).delete()
+            to_save = [recipe_id for recipe_id in save_ids if recipe_id in existing]
+            if to_save:
+                cls.objects.bulk_create(
+                    [cls(user_id=user_id, recipe_id=recipe_id) for recipe_id in to_save], ignore_conflicts=True
+                )
+        return sorted(requested - existing)
+
+    def __str__(self):
+        return f"{self.user_id} saved {self.recipe_id}"
     
 class Review(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='reviews')
@@ -68,6 +279,77 @@ class Review(models.Model):
     rating = models.IntegerField()
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)# upsert edits in place, the detail validators read this
+
+    class Meta:
+        constraints = [
+            # one review per user and recipe, posting again edits it (see upsert)
+            models.UniqueConstraint(fields=['recipe', 'user'], name='unique_review_per_user'),
+        ]
+        indexes = [
+            # the detail page feed: newest reviews of one recipe, id breaks ties for the cursor
+            models.Index(fields=['recipe', '-created_at', '-id'], name='review_recipe_recent_idx'),
+        ]
+
+    @classmethod
+    def upsert(cls, recipe, user, rating, content):
+        """Create the user's review of the recipe or update it; returns (review, created)."""
+        # update_or_create locks the existing row and retries the lookup when a concurrent insert wins
+        return cls.objects.update_or_create(recipe=recipe, user=user, defaults={'rating': rating, 'content': content})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember what the aggregates currently count for this review
+        instance._counted_rating = (instance.__dict__.get('recipe_id'), instance.__dict__.get('rating'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():# review row and recipe aggregates commit together
+            super().save(*args, **kwargs)
+            previous = getattr(self, '_counted_rating', None)
+            current = (self.recipe_id, self.rating)
+            if previous is None or previous[1] is None:# new review
+                Recipe.update_rating_stats(self.recipe_id, added=self.rating)
+            elif previous[0] == self.recipe_id:# edited in place
+                if previous[1] != self.rating:
+                    Recipe.update_rating_stats(self.recipe_id, added=self.rating, removed=previous[1])
+            else:# moved to another recipe
+                Recipe.update_rating_stats(previous[0], removed=previous[1])
+                Recipe.update_rating_stats(self.recipe_id, added=self.rating)
+            self._counted_rating = current
 
     def __str__(self):
         return f"{self.user.username} on {self.recipe.title}"
+
+
+class Job(models.Model):
+    # database-backed background job, see users/tasks.py and the run_jobs command
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)# key in tasks.TASKS
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=200, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)# pushed back between retries
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            # at most one queued job per key, enqueueing the same work again is a no-op until it starts
+            models.UniqueConstraint(
+                fields=['idempotency_key'], condition=models.Q(status='pending'), name='unique_pending_job_key'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
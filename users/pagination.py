@@ -0,0 +1,98 @@
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """One page of a keyset walk, shaped enough like Django's Page for the templates."""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Cursor pagination over a fixed ordering (e.g. ('-created_at', '-id')).
+
+    Each page is fetched with a WHERE on the last row's sort values instead of
+    OFFSET, so deep pages cost the same as the first one. The last ordering
+    field must be unique (normally the primary key).
+    """
+
+    def __init__(self, per_page, ordering=('-created_at', '-id')):
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+
+    def paginate(self, queryset, cursor=None):
+        return self._page(list(self._page_queryset(queryset, cursor)))
+
+    async def apaginate(self, queryset, cursor=None):
+        # same page through the async ORM, for the ASGI views
+        return self._page([row async for row in self._page_queryset(queryset, cursor)])
+
+    def _page_queryset(self, queryset, cursor):
+        queryset = queryset.order_by(*self.ordering)
+        values = self.decode_cursor(cursor, queryset.model)
+        if values is not None:
+            queryset = queryset.filter(self._after(values))
+        return queryset[:self.per_page + 1]# one extra row tells us if there is a next page
+
+    def _page(self, rows):
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return KeysetPage(rows, next_cursor)
+
+    def _after(self, values):
+        # (a, b, c) after (x, y, z)  ==  a>x OR (a=x AND b>y) OR (a=x AND b=y AND c>z)
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, obj):
+        return self.encode_values([getattr(obj, field.lstrip('-')) for field in self.ordering])
+
+    def encode_values(self, values):
+        """Cursor from the sort values of the last row shown (ordering order)."""
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+        raw = json.dumps(values, default=str, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, model):
+        """Return the sort values stored in `cursor`, or None if it is missing or garbled."""
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                return None
+            return [self._to_python(model, field.lstrip('-'), value) for field, value in zip(self.ordering, values)]
+        except (ValueError, TypeError, ValidationError):# bad base64/json/field value -> start from the top
+            return None
+
+    @staticmethod
+    def _to_python(model, name, value):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:# annotation (e.g. a rank), keep the JSON value
+            return value
+        return field.to_python(value)
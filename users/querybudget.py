@@ -0,0 +1,148 @@
+"""Query counting and N+1 detection.
+
+    with QueryBudget(max_queries=10) as budget:
+        client.get('/dashboard/')
+    budget.check()          # raises QueryBudgetExceeded with the offending SQL
+
+Every statement is reduced to its "shape" (literals, placeholders and IN
+lists collapsed) so that the same query run once per row of a loop is
+reported as a likely N+1.
+
+The counting hooks into the connections of the current thread. Async code
+runs its queries in the request's sync_to_async thread (thread_sensitive,
+the ORM default), so use `async with QueryBudget()` there: it installs the
+hooks in that thread. Queries sent to another thread
+(sync_to_async(thread_sensitive=False)) are not counted.
+
+sequential_scans() reads a PostgreSQL plan and reports the big tables it
+scans row by row, to catch filters that stopped matching an index.
+"""
+import json
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+# savepoints: inside TestCase every atomic() becomes one, in production the outermost is a plain BEGIN/COMMIT
+_SAVEPOINT_RE = re.compile(r'\s*(?:SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def sql_shape(sql):
+    """'SELECT ... WHERE id IN (%s, %s, %s)' -> 'SELECT ... WHERE id IN (?)'."""
+    shape = _STRING_RE.sub('?', sql)
+    shape = _NUMBER_RE.sub('?', shape)
+    shape = _PLACEHOLDER_RE.sub('?', shape)
+    shape = _LIST_RE.sub('(?)', shape)
+    return _SPACE_RE.sub(' ', shape).strip()
+
+
+class QueryBudget:
+    """Count the queries run inside the block and flag repeated statement shapes."""
+
+    def __init__(self, max_queries=None, n_plus_one_threshold=3, using=None):
+        self.max_queries = max_queries
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.aliases = [using] if using else list(connections)
+        self.queries = []# (sql, seconds)
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in self.aliases:
+            self._stack.enter_context(connections[alias].execute_wrapper(self._record))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        return False
+
+    async def __aenter__(self):
+        await sync_to_async(self.__enter__)()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await sync_to_async(self.__exit__)(*exc_info)
+
+    def _record(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if not _SAVEPOINT_RE.match(sql):
+                self.queries.append((sql, time.perf_counter() - started))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(seconds for _, seconds in self.queries)
+
+    def repeated_shapes(self):
+        """{shape: times} for statements run at least n_plus_one_threshold times."""
+        shapes = Counter(sql_shape(sql) for sql, _ in self.queries)
+        return {shape: times for shape, times in shapes.items() if times >= self.n_plus_one_threshold}
+
+    def violations(self):
+        problems = []
+        if self.max_queries is not None and self.count > self.max_queries:
+            problems.append(f"{self.count} queries, budget is {self.max_queries}")
+        for shape, times in self.repeated_shapes().items():
+            problems.append(f"possible N+1, same query ran {times} times: {shape[:300]}")
+        return problems
+
+    def check(self):
+        problems = self.violations()
+        if problems:
+            executed = '\n'.join(f'  {sql}' for sql, _ in self.queries)
+            raise QueryBudgetExceeded('\n'.join(problems) + f'\nQueries:\n{executed}')
+
+
+class QueryBudgetTestMixin:
+    """TestCase helper: `with self.assertQueryBudget(8): self.client.get(...)`."""
+
+    def assertQueryBudget(self, max_queries, n_plus_one_threshold=3, using=None):
+        return _AssertingBudget(max_queries, n_plus_one_threshold, using)
+
+
+class _AssertingBudget(QueryBudget):
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        if exc_type is None:
+            self.check()
+        return False
+
+
+def sequential_scans(queryset, min_rows=0):
+    """{table: rows} for each table of at least min_rows rows that the plan of `queryset` reads with a Seq Scan.
+
+    PostgreSQL only; the row counts are the planner's (pg_class.reltuples),
+    so ANALYZE the tables after loading test data.
+    """
+    plan = json.loads(queryset.explain(format='json'))
+    tables = set()
+    nodes = [entry['Plan'] for entry in plan]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            tables.add(node['Relation Name'])
+        nodes.extend(node.get('Plans', []))
+    if not tables:
+        return {}
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relname, reltuples FROM pg_class WHERE relname = ANY(%s)', [sorted(tables)])
+        return {table: int(rows) for table, rows in cursor.fetchall() if rows >= min_rows}
@@ -0,0 +1,208 @@
+"""Diet / health restriction rules and the matcher that checks ingredients against them.
+
+The rules are compiled once at import into a word-level Aho-Corasick
+automaton, so one pass over a recipe's ingredient names reports the conflicts
+for every rule set at once. Matching works on whole normalized words
+("pepper" does not match "peppermint", "ham" does not match "graham") and
+plural forms match their singular ("tomatoes" hits "tomato").
+
+Allergens are the exception: missing one is a health risk while excluding
+one recipe too many is not, so they match anywhere inside a name
+("cheesecake" and "buttermilk" contain milk), like the old text search did.
+"""
+from collections import deque
+
+from .ingredients import ingredient_names, normalize_phrase, normalize_words
+
+# anything missing here counts as compatible for the diets built on it, so err on the long side
+MEAT = [
+    'chicken', 'beef', 'pork', 'meat', 'meatball', 'lamb', 'mutton', 'goat', 'veal', 'venison', 'rabbit', 'turkey',
+    'duck', 'goose', 'quail', 'bacon', 'ham', 'sausage', 'salami', 'pepperoni', 'chorizo', 'prosciutto', 'pancetta',
+    'hot dog', 'burger', 'steak', 'oxtail', 'tripe', 'liver', 'suya', 'lard', 'gelatin', 'bone broth',
+]
+SEAFOOD = [
+    'fish', 'tuna', 'salmon', 'sardine', 'anchovy', 'herring', 'cod', 'tilapia', 'mackerel', 'catfish', 'stockfish',
+    'shrimp', 'prawn', 'crayfish', 'crab', 'lobster', 'mussel', 'oyster', 'clam', 'scallop', 'squid', 'octopus',
+]
+ANIMAL_PRODUCTS = [
+    'egg', 'milk', 'cheese', 'honey', 'yogurt', 'butter', 'buttermilk', 'cream', 'whey', 'casein', 'ghee',
+    'mayonnaise', 'custard',
+]
+
+RESTRICTIONS = {
+    # --- DIETARY  ---
+    'vegetarian': MEAT + SEAFOOD,
+    'vegan': MEAT + SEAFOOD + ANIMAL_PRODUCTS,# everything a vegetarian avoids, and more
+    'pescatarian': MEAT,
+    'halal': ['pork', 'bacon', 'ham', 'lard', 'wine', 'beer', 'alcohol', 'rum', 'liqueur', 'gelatin'],
+    'kosher': ['pork', 'bacon', 'ham', 'shrimp', 'crab', 'lobster', 'clam', 'oyster', 'cheeseburger'],
+    'keto': ['sugar', 'rice', 'pasta', 'bread', 'flour', 'potato', 'corn', 'syrup', 'banana', 'apple', 'candy', 'soda'],
+    'gluten-free': ['wheat', 'barley', 'rye', 'flour', 'bread', 'pasta', 'couscous', 'malt', 'soy sauce', 'seitan', 'beer'],
+    'dairy-free': ['milk', 'cheese', 'butter', 'cream', 'yogurt', 'whey', 'casein', 'lactose', 'ghee'],
+    'nut-free': ['peanut', 'almond', 'walnut', 'cashew', 'pecan', 'hazelnut', 'macadamia', 'pistachio', 'nutella'],
+    'shellfish-free': ['shrimp', 'crab', 'lobster', 'prawn', 'mussel', 'oyster', 'clam', 'scallop', 'squid'],
+
+    # --- HEALTH CONDITIONS ---
+    'diabetes': ['sugar', 'syrup', 'candy', 'chocolate', 'cake', 'soda', 'honey', 'molasses', 'jam', 'jelly', 'white rice'],
+    'hypertension': ['salt', 'soy sauce', 'sodium', 'bacon', 'pickle', 'canned', 'salami', 'sausage', 'msg'],
+    'heart disease': ['butter', 'cream', 'bacon', 'lard', 'sausage', 'fried', 'coconut oil', 'palm oil'],
+    'celiac': ['wheat', 'barley', 'rye', 'flour', 'bread', 'pasta', 'soy sauce', 'malt', 'beer'],
+    'gerd': ['spicy', 'chili', 'jalapeno', 'pepper', 'hot sauce', 'tomato', 'lemon', 'orange', 'coffee', 'chocolate', 'mint', 'garlic', 'onion'],
+    'ibs': ['onion', 'garlic', 'milk', 'wheat', 'beans', 'lentils', 'apple', 'pear', 'honey', 'mushroom'],
+    'kidney disease': ['salt', 'banana', 'potato', 'spinach', 'avocado', 'tomato', 'brown rice', 'milk', 'yogurt'],
+    'gout': ['liver', 'kidney', 'anchovy', 'sardine', 'herring', 'beer', 'beef', 'pork', 'shellfish', 'sugar'],
+}
+
+
+# common allergens for the recommendation filter, each one gets its own "free of" bit
+ALLERGENS = {
+    'peanut': ['peanut', 'groundnut', 'nutella'],
+    'tree-nut': ['nut', 'almond', 'walnut', 'cashew', 'pecan', 'hazelnut', 'macadamia', 'pistachio', 'brazil nut', 'nutella'],
+    'milk': ['milk', 'dairy', 'cheese', 'butter', 'cream', 'yogurt', 'whey', 'casein', 'lactose', 'ghee'],
+    'egg': ['egg', 'mayonnaise', 'meringue'],
+    'wheat': ['wheat', 'gluten', 'flour', 'bread', 'pasta', 'couscous', 'semolina', 'seitan'],
+    'soy': ['soy', 'soya', 'soy sauce', 'tofu', 'edamame', 'miso', 'tempeh'],
+    'fish': ['fish', 'tuna', 'salmon', 'sardine', 'anchovy', 'herring', 'cod', 'tilapia', 'mackerel'],
+    'shellfish': ['shellfish', 'seafood', 'shrimp', 'crab', 'lobster', 'prawn', 'mussel', 'oyster', 'clam', 'scallop', 'squid', 'crayfish'],
+    'sesame': ['sesame', 'tahini'],
+}
+
+# names that contain an allergen word without containing the allergen
+ALLERGEN_LOOKALIKES = {
+    'egg': ['eggplant'],
+    'tree-nut': ['nutmeg', 'butternut'],
+}
+
+# what a user may type in the allergy box (normalized, singular) -> allergen bits it stands for
+ALLERGEN_ALIASES = {
+    'nut': ['peanut', 'tree-nut'],
+    'tree nut': ['tree-nut'],
+    'peanut': ['peanut'],
+    'groundnut': ['peanut'],
+    'milk': ['milk'],
+    'dairy': ['milk'],
+    'lactose': ['milk'],
+    'egg': ['egg'],
+    'wheat': ['wheat'],
+    'gluten': ['wheat'],
+    'soy': ['soy'],
+    'soya': ['soy'],
+    'fish': ['fish'],
+    'seafood': ['fish', 'shellfish'],
+    'shellfish': ['shellfish'],
+    'sesame': ['sesame'],
+}
+
+# bit positions stored in Recipe.compat_mask -- APPEND ONLY, reordering would corrupt stored masks
+COMPAT_FLAGS = [
+    # DIET_CHOICES
+    'Vegetarian', 'Vegan', 'Gluten-Free', 'Dairy-Free', 'Halal', 'Kosher', 'Keto', 'Nut-Free', 'Shellfish-Free', 'Pescatarian',
+    # HEALTH_CHOICES
+    'Diabetes', 'Hypertension', 'Heart Disease', 'Celiac', 'GERD', 'IBS', 'Kidney Disease', 'Obesity', 'Gout', 'Anemia',
+    # allergen-free bits
+    *(f'allergen:{name}' for name in ALLERGENS),
+]
+COMPAT_BITS = {flag: 1 << position for position, flag in enumerate(COMPAT_FLAGS)}
+
+
+class RestrictionMatcher:
+    """Multi-pattern matcher over word sequences (Aho-Corasick on normalized words)."""
+
+    def __init__(self, rules):
+        self._goto = [{}]# state -> {word: next state}
+        self._fail = [0]
+        self._out = [[]]# state -> [(rule, forbidden phrase), ...] ending at this state
+        self.rules = frozenset(rules)
+
+        for rule, phrases in rules.items():
+            for phrase in phrases:
+                state = 0
+                for word in normalize_words(phrase):
+                    if word not in self._goto[state]:
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._out.append([])
+                        self._goto[state][word] = len(self._goto) - 1
+                    state = self._goto[state][word]
+                self._out[state].append((rule, phrase))
+
+        # breadth-first pass to wire the failure links and merge their outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(word, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def scan(self, names):
+        """Return {rule: {forbidden phrase, ...}} for every rule hit by the given ingredient names."""
+        found = {}
+        goto, fail, out = self._goto, self._fail, self._out
+        for name in names:
+            state = 0# each ingredient is scanned on its own, a phrase never spans two ingredients
+            for word in normalize_words(name):
+                while state and word not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(word, 0)
+                for rule, phrase in out[state]:
+                    found.setdefault(rule, set()).add(phrase)
+        return found
+
+
+ENGINE = RestrictionMatcher(RESTRICTIONS)
+
+
+def find_conflicts(ingredients, engine=ENGINE):
+    """Conflicts of a recipe's ingredients (any stored shape) with every rule set, in one pass."""
+    return engine.scan(ingredient_names(ingredients))
+
+
+def allergen_conflicts(ingredients):
+    """{'allergen:<name>', ...} for every allergen found inside the ingredient names, substrings included."""
+    names = [normalize_phrase(name) for name in ingredient_names(ingredients)]
+    found = set()
+    for allergen, words in ALLERGENS.items():
+        for name in names:
+            for lookalike in ALLERGEN_LOOKALIKES.get(allergen, ()):
+                name = name.replace(lookalike, ' ')
+            if any(word in name for word in words):
+                found.add(f'allergen:{allergen}')
+                break
+    return found
+
+
+def rule_key(choice):
+    # 'Gluten-Free' -> 'gluten-free', 'Heart Disease' -> 'heart disease'
+    return (choice or '').strip().lower()
+
+
+def compat_mask(ingredients, dietary=None, health_condition=None, engine=ENGINE):
+    """Bitmask of COMPAT_FLAGS the recipe is safe for.
+
+    A diet/health bit is set when the ingredients hit none of its rules; choices
+    without a rule set (e.g. 'Obesity') are only set when the chef tagged the
+    recipe with them. An allergen bit is set when no ingredient contains it.
+    """
+    conflicts = find_conflicts(ingredients, engine).keys() | allergen_conflicts(ingredients)
+    declared = {rule_key(dietary), rule_key(health_condition)}
+    mask = 0
+    for flag, bit in COMPAT_BITS.items():
+        key = rule_key(flag)
+        if key in conflicts:
+            continue
+        if key in engine.rules or key.startswith('allergen:') or key in declared:
+            mask |= bit
+    return mask
+
+
+def allergen_bits(allergen):
+    """Bits for a normalized allergen typed by a user, 0 if it is not one of the known allergens."""
+    bits = 0
+    for name in ALLERGEN_ALIASES.get(allergen, ()):
+        bits |= COMPAT_BITS[f'allergen:{name}']
+    return bits
+
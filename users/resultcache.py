@@ -0,0 +1,103 @@
+"""Cached result ids of filtered dashboard listings.
+
+A recommendation profile (health condition, diet, allergens) plus the sidebar
+filters is an expensive query: ingredient anti-joins, bit tests, maybe a full
+text search. Many users share the same few combinations, so the first visit
+stores the sort values and id of the matching recipes, in order, under
+
+    results:<catalog version>:<filters.filter_signature()>:<ordering>
+
+and every page after that (any user, any refresh) is a primary key fetch.
+Any recipe save or delete bumps the catalog version (signals.py), which
+retires all entries at once; the TTL bounds how long a stale one can live
+in a cache without eviction.
+
+Off unless RESULT_CACHE_ENABLED, which defaults to on with a shared cache
+backend only: under locmem the version bump would reach a single worker.
+Only the first RESULT_CACHE_MAX_ROWS matches are kept. Cursors past them,
+or from an older version of the list, fall back to the database query.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .pagination import KeysetPage
+
+CATALOG_VERSION_KEY = 'recipes:catalog_version'
+
+
+def catalog_version():
+    return cache.get(CATALOG_VERSION_KEY, 0)
+
+
+def bump_catalog_version():
+    """Invalidate everything cached about the recipe list as a whole (result ids, facet counts)."""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:# no version stored yet
+        cache.set(CATALOG_VERSION_KEY, 1, None)
+
+
+def _key(version, signature, ordering):
+    return f"results:{version}:{signature}:{','.join(ordering)}"
+
+
+def _rows_query(queryset, ordering):
+    # sort values + id of the first RESULT_CACHE_MAX_ROWS matches, one row more to know the list is cut
+    fields = [field.lstrip('-') for field in ordering]
+    return queryset.order_by(*ordering).values_list(*fields)[:settings.RESULT_CACHE_MAX_ROWS + 1]
+
+
+def _slice(rows, paginator, cursor, model):
+    """(ids of the page, next cursor), or None when the cursor is not in the cached list."""
+    start = 0
+    values = paginator.decode_cursor(cursor, model)
+    if values is not None:
+        positions = {row[-1]: index for index, row in enumerate(rows)}# the last ordering field is the pk
+        if values[-1] not in positions:
+            return None
+        start = positions[values[-1]] + 1
+    end = start + paginator.per_page
+    truncated = len(rows) > settings.RESULT_CACHE_MAX_ROWS
+    if truncated and end >= settings.RESULT_CACHE_MAX_ROWS:# the page runs past what was cached
+        return None
+    page_rows = rows[start:end]
+    next_cursor = paginator.encode_values(page_rows[-1]) if page_rows and len(rows) > end else None
+    return [row[-1] for row in page_rows], next_cursor
+
+
+def _page(objects, ids, next_cursor):
+    by_id = {obj.pk: obj for obj in objects}
+    return KeysetPage([by_id[pk] for pk in ids if pk in by_id], next_cursor)
+
+
+def cached_page(queryset, fetch, signature, paginator, cursor):
+    """KeysetPage of `queryset` served from the cached ids, or None to use the database path.
+
+    `fetch` is the queryset the page rows are loaded from by primary key
+    (e.g. with select_related), `paginator` a KeysetPaginator on the listing's
+    ordering.
+    """
+    key = _key(catalog_version(), signature, paginator.ordering)
+    rows = cache.get(key)
+    if rows is None:
+        rows = list(_rows_query(queryset, paginator.ordering))
+        cache.set(key, rows, settings.RESULT_CACHE_TIMEOUT)
+    sliced = _slice(rows, paginator, cursor, queryset.model)
+    if sliced is None:
+        return None
+    ids, next_cursor = sliced
+    return _page(fetch.filter(pk__in=ids) if ids else [], ids, next_cursor)
+
+
+async def acached_page(queryset, fetch, signature, paginator, cursor):
+    """cached_page() through the async cache and ORM."""
+    key = _key(await cache.aget(CATALOG_VERSION_KEY, 0), signature, paginator.ordering)
+    rows = await cache.aget(key)
+    if rows is None:
+        rows = [row async for row in _rows_query(queryset, paginator.ordering)]
+        await cache.aset(key, rows, settings.RESULT_CACHE_TIMEOUT)
+    sliced = _slice(rows, paginator, cursor, queryset.model)
+    if sliced is None:
+        return None
+    ids, next_cursor = sliced
+    return _page([obj async for obj in fetch.filter(pk__in=ids)] if ids else [], ids, next_cursor)
@@ -0,0 +1,118 @@
+"""Ranked full-text search over recipes.
+
+PostgreSQL keeps a weighted tsvector in Recipe.search_vector (GIN indexed),
+SQLite keeps the same four columns in the users_recipe_fts FTS5 table; the
+index and the table are created by migration 0004. Saving a recipe does not
+refresh either: the post_save signal (signals.recipe_saved) queues a
+recipes.search_index job, and the run_jobs worker calls index_recipes() for
+it (inline when JOBS_EAGER is set). search_recipes() filters and annotates
+`search_rank` (higher is better) the same way on either backend.
+Weights: title > origin > description > ingredients.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections, transaction
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .ingredients import ingredient_names
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'users_recipe_fts'
+FTS_WEIGHTS = (10.0, 5.0, 2.0, 1.0)# bm25 column weights: title, origin, description, ingredients
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    return TERM_RE.findall((query or '').lower())
+
+
+def _vendor(using):
+    return connections[using].vendor
+
+
+def _document(recipe):
+    return (
+        recipe.title or '',
+        recipe.origin_country or '',
+        recipe.description or '',
+        ' '.join(ingredient_names(recipe.ingredients)),
+    )
+
+
+def index_recipes(recipes, using='default'):
+    """Refresh the search document of the given Recipe instances."""
+    recipes = list(recipes)
+    if not recipes:
+        return
+    vendor = _vendor(using)
+    with transaction.atomic(using=using):
+        if vendor == 'postgresql':
+            # one UPDATE ... FROM (VALUES ...) for the whole batch instead of one statement per recipe
+            table = recipes[0]._meta.db_table
+            rows = ', '.join(['(%s, %s::text, %s::text, %s::text, %s::text)'] * len(recipes))
+            vector = ' || '.join(
+                f"setweight(to_tsvector(%s::regconfig, v.{column}), '{weight}')"
+                for column, weight in zip(('title', 'origin', 'description', 'ingredients'), 'ABCD')
+            )
+            with connections[using].cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE "{table}" SET search_vector = {vector} '
+                    f'FROM (VALUES {rows}) AS v(id, title, origin, description, ingredients) '
+                    f'WHERE "{table}"."id" = v.id',
+                    [SEARCH_CONFIG] * 4 + [value for recipe in recipes for value in (recipe.pk, *_document(recipe))],
+                )
+        elif vendor == 'sqlite':
+            with connections[using].cursor() as cursor:
+                cursor.executemany(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(recipe.pk,) for recipe in recipes]
+                )
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, title, origin, description, ingredients) '
+                    'VALUES (%s, %s, %s, %s, %s)',
+                    [(recipe.pk, *_document(recipe)) for recipe in recipes],
+                )
+
+
+def remove_recipe(recipe_id, using='default'):
+    # the PostgreSQL vector lives on the recipe row itself, only the FTS table needs cleaning
+    if _vendor(using) == 'sqlite':
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id])
+
+
+def search_recipes(queryset, query):
+    """Filter `queryset` to recipes matching every term of `query` (prefix match) and annotate `search_rank`."""
+    terms = search_terms(query)
+    if not terms:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    vendor = _vendor(queryset.db)
+    if vendor == 'postgresql':
+        search_query = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms), search_type='raw', config=SEARCH_CONFIG
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        )
+
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)# terms are \w+ only, nothing to escape
+        table = queryset.model._meta.db_table
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        # bm25() is lower-is-better, negate it so both backends sort on -search_rank
+        rank = RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = "{table}"."id"',
+            (match,),
+            output_field=FloatField(),
+        )
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+    # other backends: unranked substring search
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(description__icontains=term) | Q(origin_country__icontains=term)
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
@@ -0,0 +1,88 @@
+from rest_framework import serializers
+
+from .ingredients import ingredient_list, instruction_list
+from .models import Recipe, Review, SavedRecipe, User
+
+
+class SparseFieldsMixin:
+    """Drop every field not listed in context['fields'] (the ?fields= query parameter)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ChefSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name']
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    chef = ChefSerializer(read_only=True)
+    image = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    ingredients = serializers.SerializerMethodField()
+    instructions = serializers.SerializerMethodField()
+    is_saved = serializers.BooleanField(read_only=True, default=False)# annotated by the view, no query per row
+
+    class Meta:
+        model = Recipe
+        fields = [
+            'id', 'title', 'description', 'origin_country', 'chef', 'image', 'thumbnail',
+            'dietary', 'health_condition', 'meal_type', 'meal_time', 'budget', 'currency', 'cooking_time',
+            'video_url', 'rating_avg', 'rating_count', 'is_saved', 'ingredients', 'instructions',
+            'created_at', 'updated_at',
+        ]
+        # serializer field -> model columns it reads, used to load only what ?fields asks for
+        columns = {
+            'chef': ['chef__id', 'chef__username', 'chef__first_name', 'chef__last_name'],
+            'image': ['image'],
+            'thumbnail': ['image', 'image_derivatives'],
+            'is_saved': [],
+        }
+
+    def get_image(self, recipe):
+        return recipe.image.url if recipe.image else None
+
+    def get_thumbnail(self, recipe):
+        picture = recipe.card_picture
+        return picture['src'] if picture else self.get_image(recipe)
+
+    def get_ingredients(self, recipe):
+        return ingredient_list(recipe.ingredients)# only this column: ?fields may have deferred the other
+
+    def get_instructions(self, recipe):
+        return instruction_list(recipe.instructions)
+
+
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    user = serializers.CharField(source='user.username', read_only=True)
+
+    class Meta:
+        model = Review
+        fields = ['id', 'recipe', 'user', 'rating', 'content', 'created_at']
+
+
+class RecipeSummarySerializer(serializers.ModelSerializer):
+    # what the saved list shows per recipe; not sparse, ?fields applies to the outer object
+    chef = ChefSerializer(read_only=True)
+    thumbnail = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Recipe
+        fields = ['id', 'title', 'thumbnail', 'rating_avg', 'rating_count', 'chef']
+
+    get_thumbnail = RecipeSerializer.get_thumbnail
+    get_image = RecipeSerializer.get_image
+
+
+class SavedRecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    recipe = RecipeSummarySerializer(read_only=True)
+
+    class Meta:
+        model = SavedRecipe
+        fields = ['recipe', 'saved_at']
@@ -0,0 +1,57 @@
+"""Where the recommendation filters (health condition, diet, allergies) live between requests.
+
+TEMP_FILTERS_STORAGE = 'session' keeps them under session['temp_filters']
+(whatever SESSION_ENGINE is), 'cookie' in a signed cookie of their own, so
+applying or reading them never touches the session store. Either way a
+write only happens when the value actually changes.
+"""
+import json
+
+from django.conf import settings
+
+COOKIE_NAME = 'temp_filters'
+COOKIE_SALT = 'users.session_filters'
+SESSION_KEY = 'temp_filters'
+
+
+def _in_cookie():
+    return settings.TEMP_FILTERS_STORAGE == 'cookie'
+
+
+def get_temp_filters(request):
+    if not _in_cookie():
+        return request.session.get(SESSION_KEY)
+    raw = request.get_signed_cookie(
+        COOKIE_NAME, default=None, salt=COOKIE_SALT, max_age=settings.TEMP_FILTERS_COOKIE_AGE
+    )
+    try:
+        filters = json.loads(raw) if raw else None
+    except ValueError:
+        return None
+    return filters if isinstance(filters, dict) else None
+
+
+async def aget_temp_filters(request):
+    if _in_cookie():
+        return get_temp_filters(request)# no I/O, the cookie came with the request
+    return await request.session.aget(SESSION_KEY)
+
+
+def set_temp_filters(request, response, filters):
+    """Store `filters` for the next requests (None clears them); returns the response."""
+    if filters == get_temp_filters(request):# unchanged: no session save, no Set-Cookie
+        return response
+    if _in_cookie():
+        if filters is None:
+            response.delete_cookie(COOKIE_NAME, samesite='Lax')
+        else:
+            response.set_signed_cookie(
+                COOKIE_NAME, json.dumps(filters, separators=(',', ':')), salt=COOKIE_SALT,
+                max_age=settings.TEMP_FILTERS_COOKIE_AGE, secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True, samesite='Lax',
+            )
+    elif filters is None:
+        del request.session[SESSION_KEY]
+    else:
+        request.session[SESSION_KEY] = filters
+    return response
@@ -0,0 +1,71 @@
+"""Per-user cache of the sidebar lists (saved recipes, recipes made by the chef).
+
+Only (pk, title) pairs are stored, capped at SIDEBAR_LIMIT per list, with a
+flag telling the template to show a "show all" link. Views that change either
+list call invalidate_sidebar() / invalidate_recipe_sidebars(). Without
+SIDEBAR_CACHE_ENABLED (a shared cache backend) the lists are built per request.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Recipe, SavedRecipe
+
+SIDEBAR_LIMIT = 10
+SIDEBAR_TIMEOUT = 60 * 60
+
+
+def sidebar_key(user_id):
+    return f'sidebar:{user_id}'
+
+
+def _capped(rows):
+    rows = list(rows)
+    return [{'pk': pk, 'title': title} for pk, title in rows[:SIDEBAR_LIMIT]], len(rows) > SIDEBAR_LIMIT
+
+
+def build_sidebar(user):
+    # fetch one row more than the cap to know whether "show all" is needed without a COUNT
+    saved, saved_more = _capped(
+        SavedRecipe.objects.filter(user=user)
+        .order_by('-saved_at')
+        .values_list('recipe_id', 'recipe__title')[:SIDEBAR_LIMIT + 1]
+    )
+    authored, authored_more = [], False
+    if user.is_chef:
+        authored, authored_more = _capped(
+            Recipe.objects.filter(chef=user)
+            .order_by('-created_at')
+            .values_list('pk', 'title')[:SIDEBAR_LIMIT + 1]
+        )
+    return {'saved': saved, 'saved_more': saved_more, 'authored': authored, 'authored_more': authored_more}
+
+
+def get_sidebar(user):
+    if not settings.SIDEBAR_CACHE_ENABLED:# process-local cache: another worker would not see the invalidation
+        data = getattr(user, '_sidebar', None)# built once per request, request.user lives as long
+        if data is None:
+            data = user._sidebar = build_sidebar(user)
+        return data
+    key = sidebar_key(user.pk)
+    data = cache.get(key)
+    if data is None:
+        data = build_sidebar(user)
+        cache.set(key, data, SIDEBAR_TIMEOUT)
+    return data
+
+
+def invalidate_sidebar(*user_ids):
+    cache.delete_many([sidebar_key(user_id) for user_id in user_ids])
+
+
+async def ainvalidate_sidebar(*user_ids):
+    await cache.adelete_many([sidebar_key(user_id) for user_id in user_ids])
+
+
+def recipe_sidebar_users(recipe):
+    """Users whose sidebar shows this recipe: its chef and everyone who saved it."""
+    return [recipe.chef_id, *SavedRecipe.objects.filter(recipe=recipe).values_list('user_id', flat=True)]
+
+
+def invalidate_recipe_sidebars(recipe):
+    invalidate_sidebar(*recipe_sidebar_users(recipe))
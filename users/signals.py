@@ -0,0 +1,64 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import search
+from .cards import bump_recipe_generation
+from .models import Recipe, Review
+from .resultcache import bump_catalog_version
+from .tasks import enqueue
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, update_fields=None, **kwargs):
+    # the derived data is rebuilt by the job workers (users/tasks.py), the request only queues it;
+    # the ingredient tokens behind the allergy filter are the exception, Recipe.save() writes them
+    pk = instance.pk
+    if update_fields is None or {'title', 'origin_country', 'description', 'ingredients'} & set(update_fields):
+        enqueue('recipes.search_index', key=f'recipe:{pk}:search', recipe_id=pk)
+    if instance.image_derivatives_stale():
+        enqueue('recipes.images', key=f'recipe:{pk}:images', recipe_id=pk)
+    invalidate_recipe_fragments(pk)
+    transaction.on_commit(bump_catalog_version)# cached result ids and facet counts
+    enqueue('recipes.warm_card', key=f'recipe:{pk}:card', recipe_id=pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    search.remove_recipe(instance.pk, using=kwargs.get('using', 'default'))# inline: deleted recipes must leave search at once
+    derived = instance.image_derivatives
+    if derived.get('hash'):
+        enqueue('recipes.delete_images', derivatives=derived)
+    invalidate_recipe_fragments(instance.pk)
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, origin=None, **kwargs):
+    # Collector.delete() sends every pre_delete before any post_delete, so the reviews of this
+    # deletion can tell that their recipe goes too (see review_deleted)
+    if origin is not None:
+        if not hasattr(origin, '_deleted_recipe_ids'):
+            origin._deleted_recipe_ids = set()
+        origin._deleted_recipe_ids.add(instance.pk)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, **kwargs):
+    invalidate_recipe_fragments(instance.recipe_id)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, origin=None, **kwargs):
+    # runs inside the deletion transaction, also for queryset and cascade deletes
+    recipe_id, rating = getattr(instance, '_counted_rating', (instance.recipe_id, instance.rating))
+    if recipe_id in getattr(origin, '_deleted_recipe_ids', ()):
+        return# no recount for a recipe deleted by the same call
+    if recipe_id is not None and rating is not None:
+        Recipe.update_rating_stats(recipe_id, removed=rating)
+        invalidate_recipe_fragments(recipe_id)
+
+
+def invalidate_recipe_fragments(recipe_id):
+    # after commit, so no other request can re-cache the old state under the new generation
+    transaction.on_commit(lambda: bump_recipe_generation(recipe_id))
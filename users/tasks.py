@@ -0,0 +1,191 @@
+"""Small database-backed task queue (no broker).
+
+    @task('recipes.search_index')
+    def index_recipe(recipe_id): ...
+
+    enqueue('recipes.search_index', key=f'search:{recipe.pk}', recipe_id=recipe.pk)
+
+enqueue() inserts the Job row once the caller's transaction has committed,
+so no worker can run it against the state from before the change. A
+pending job with the same idempotency key absorbs the new request, which is
+safe for the same reason: it has not started, and the tasks below always
+read the current state of the row. Work queued by a process that dies
+between its commit and the insert is lost; the rebuild_* commands redo it.
+The run_jobs command claims due jobs and runs them on a thread pool. A
+failing job is retried with exponential backoff until max_attempts.
+
+With JOBS_EAGER (tests, local hacking) enqueue() runs the task inline and
+lets its exceptions propagate.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name):
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, key=None, delay=None, max_attempts=None, **payload):
+    """Queue TASKS[name](**payload) when the current transaction commits (at once outside of one)."""
+    if name not in TASKS:
+        raise KeyError(f"unknown task {name!r}")
+    if settings.JOBS_EAGER:
+        TASKS[name](**payload)
+        return
+    # inserted before the commit, a pending job with the same key could be claimed and run
+    # against the old row, absorbing this request with it
+    transaction.on_commit(lambda: _insert(name, key, delay, max_attempts, payload))
+
+
+def _insert(name, key, delay, max_attempts, payload):
+    from .models import Job
+
+    fields = {'name': name, 'payload': payload, 'run_after': timezone.now() + (delay or timedelta())}
+    if max_attempts is not None:
+        fields['max_attempts'] = max_attempts
+    if key is None:
+        Job.objects.create(**fields)
+        return
+    try:
+        with transaction.atomic():# savepoint, so a duplicate key does not poison a surrounding transaction
+            Job.objects.create(idempotency_key=key, **fields)
+    except IntegrityError:
+        pass# absorbed by the pending job with this key
+
+
+def claim(limit):
+    """Mark up to `limit` due jobs as running and return them."""
+    from .models import Job
+
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.PENDING, run_after__lte=now)
+            .order_by('run_after', 'pk')
+            .values_list('pk', flat=True)[:limit]
+        )
+        # the status check keeps two workers from taking the same job on backends without row locks (SQLite)
+        claimed = [
+            pk for pk in candidates
+            if Job.objects.filter(pk=pk, status=Job.PENDING).update(
+                status=Job.RUNNING, started_at=now, attempts=F('attempts') + 1
+            )
+        ]
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_after', 'pk'))
+
+
+def run(job):
+    """Run a claimed job and record the outcome; returns True when it succeeded."""
+    from .models import Job
+
+    func = TASKS.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f"unknown task {job.name!r}")
+        func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        retry = func is not None and job.attempts < job.max_attempts
+        backoff = timedelta(seconds=settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1))
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.PENDING if retry else Job.FAILED,
+            run_after=timezone.now() + backoff,
+            finished_at=None if retry else timezone.now(),
+            last_error=error,
+        )
+        log = logger.warning if retry else logger.error
+        log("job %s (%s) attempt %s/%s failed", job.pk, job.name, job.attempts, job.max_attempts, exc_info=True)
+        return False
+    Job.objects.filter(pk=job.pk).update(status=Job.DONE, finished_at=timezone.now(), last_error='')
+    return True
+
+
+def requeue_stale(older_than):
+    """Put back jobs whose worker died mid-run (still 'running' after `older_than`)."""
+    from .models import Job
+
+    requeued = 0
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=timezone.now() - older_than)
+    for pk in stale.values_list('pk', flat=True):
+        try:
+            with transaction.atomic():
+                requeued += Job.objects.filter(pk=pk, status=Job.RUNNING).update(status=Job.PENDING, run_after=timezone.now())
+        except IntegrityError:# the same work is already queued again
+            Job.objects.filter(pk=pk).update(status=Job.FAILED, finished_at=timezone.now(), last_error='superseded after a stale run')
+    return requeued
+
+
+# --- recipe derived data -------------------------------------------------------------------------
+
+def _recipe(recipe_id, *fields):
+    from .models import Recipe
+
+    recipes = Recipe.objects.filter(pk=recipe_id)
+    return (recipes.only(*fields) if fields else recipes).first()# None when it was deleted since
+
+
+@task('recipes.ingredient_index')
+def refresh_ingredient_index(recipe_id):
+    # Recipe.save() keeps the tokens current, this only serves jobs queued before it did
+    from .resultcache import bump_catalog_version
+
+    recipe = _recipe(recipe_id, 'pk', 'ingredients')
+    if recipe is not None:
+        recipe.refresh_ingredient_index()
+        transaction.on_commit(bump_catalog_version)
+
+
+@task('recipes.search_index')
+def refresh_search_index(recipe_id):
+    from . import search
+
+    from .resultcache import bump_catalog_version
+
+    recipe = _recipe(recipe_id, 'pk', 'title', 'origin_country', 'description', 'ingredients')
+    if recipe is not None:
+        search.index_recipes([recipe])
+        # the recipe's save already bumped it, but search listings cached since then missed the new document
+        transaction.on_commit(bump_catalog_version)
+
+
+@task('recipes.images')
+def refresh_images(recipe_id):
+    from .cards import bump_recipe_generation
+
+    recipe = _recipe(recipe_id, 'pk', 'image', 'image_derivatives')
+    if recipe is not None and recipe.image_derivatives_stale():
+        recipe.refresh_image_derivatives()
+        bump_recipe_generation(recipe_id)
+        enqueue('recipes.warm_card', key=f'recipe:{recipe_id}:card', recipe_id=recipe_id)
+
+
+@task('recipes.delete_images')
+def delete_unused_images(derivatives):
+    from . import images
+    from .models import Recipe
+
+    if not Recipe.objects.filter(image_derivatives__hash=derivatives['hash']).exists():
+        images.delete_derivatives(derivatives)
+
+
+@task('recipes.warm_card')
+def warm_card(recipe_id):
+    from .cards import render_recipe_cards
+    from .models import Recipe
+
+    # renders (and caches) the dashboard card so the first visitor after an edit gets a hit
+    render_recipe_cards(Recipe.objects.select_related('chef').filter(pk=recipe_id))
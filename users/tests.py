@@ -1,3 +1,1147 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib
+import io
+import json
+import os
+import re
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import TextField
+from django.db.models.functions import Cast
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import async_views, images, search, tasks
+from .checks import shared_cache_check
+from .facets import recipe_facets
+from .filters import filter_recipes
+from .ingredients import ingredient_tokens
+from .models import Job, Recipe, RecipeIngredient, Review, User
+from .pagination import KeysetPaginator
+from .querybudget import QueryBudget, QueryBudgetTestMixin, sequential_scans, sql_shape
+from .restrictions import COMPAT_BITS, COMPAT_FLAGS, RESTRICTIONS, RestrictionMatcher, compat_mask, find_conflicts
+from .views import RecipeListView
+
+
+def make_catalog(chef, customers, recipes=6, reviews_per_recipe=3):
+    created = []
+    for i in range(recipes):
+        recipe = Recipe.objects.create(
+            chef=chef, title=f'Recipe {i}', description='Tasty',
+            meal_type='Family', meal_time='Lunch',
+            ingredients=[{'name': 'rice', 'qty': '1 cup'}, {'name': 'tomatoes', 'qty': '2'}],
+        )
+        for customer in customers[:reviews_per_recipe]:
+            Review.objects.create(recipe=recipe, user=customer, rating=4, content='Nice')
+        created.append(recipe)
+    return created
+
+
+class QueryShapeTests(TestCase):
+    def test_literals_and_in_lists_collapse(self):
+        self.assertEqual(
+            sql_shape('SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = \'x\' LIMIT 21'),
+            sql_shape('SELECT * FROM t WHERE id IN (%s) AND name = \'yy\' LIMIT 5'),
+        )
+
+    def test_repeated_shape_is_reported(self):
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        with QueryBudget(n_plus_one_threshold=3) as budget:
+            for _ in range(3):
+                list(User.objects.filter(pk=chef.pk))
+        self.assertEqual(list(budget.repeated_shapes().values()), [3])
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """Pin the number of queries of the hot pages so N+1 regressions fail CI.
+
+    Every page is requested with a small and a larger catalog under the same
+    budget, so a per-row query cannot hide below the limit.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.chef = User.objects.create_user('chef', password='pw', is_chef=True, first_name='Ada', last_name='Chef')
+        self.customers = [User.objects.create_user(f'user{i}', password='pw', is_customer=True) for i in range(5)]
+        self.client.force_login(self.customers[0])
+
+    def test_dashboard(self):
+        for size in (3, 20):
+            make_catalog(self.chef, self.customers, recipes=size)
+            cache.clear()
+            with self.assertQueryBudget(5):# session, user, recipes, sidebar, facet counts
+                response = self.client.get(reverse('dashboard'))
+            self.assertEqual(response.status_code, 200)
+
+    @override_settings(SIDEBAR_CACHE_ENABLED=True)# as with a shared cache backend in production
+    def test_recipe_detail(self):
+        recipe = make_catalog(self.chef, self.customers, recipes=1, reviews_per_recipe=1)[0]
+        url = reverse('recipe-detail', args=[recipe.pk])
+        with self.assertQueryBudget(5):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        for customer in self.customers[1:]:
+            Review.objects.create(recipe=recipe, user=customer, rating=5, content='Great')
+        cache.clear()
+        with self.assertQueryBudget(5):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertQueryBudget(3):# body cached: no review feed query
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_recipe_detail_revalidation(self):
+        recipe = make_catalog(self.chef, self.customers, recipes=1, reviews_per_recipe=1)[0]
+        url = reverse('recipe-detail', args=[recipe.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post(reverse('toggle-save', args=[recipe.pk]))# per-user state is part of the validator
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        Review.objects.create(recipe=recipe, user=self.customers[3], rating=2, content='Too salty')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(response, 'Too salty')
+
+        # no Last-Modified: a date cannot tell that the save button changed
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.client.post(reverse('toggle-save', args=[recipe.pk]))
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_toggle_save(self):
+        recipe = make_catalog(self.chef, self.customers, recipes=1, reviews_per_recipe=0)[0]
+        url = reverse('toggle-save', args=[recipe.pk])
+        with self.assertQueryBudget(5):
+            data = self.client.post(url).json()
+        self.assertEqual((data['saved'], data['saved_count']), (True, 1))
+        with self.assertQueryBudget(4):
+            data = self.client.post(url).json()
+        self.assertEqual((data['saved'], data['saved_count']), (False, 0))
+        self.assertEqual(self.client.post(reverse('toggle-save', args=[recipe.pk + 1000])).status_code, 404)
+
+
+@override_settings(SERVER_TIMING_ENABLED=True, SERVER_TIMING_SLOW_MS=60000)
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        self.customer = User.objects.create_user('user', password='pw', is_customer=True)
+        self.recipe = make_catalog(chef, [self.customer], recipes=3, reviews_per_recipe=1)[0]
+
+    def query_count(self, response):
+        header = response['Server-Timing']
+        self.assertRegex(header, r'total;dur=[\d.]+')
+        return int(re.match(r'db;dur=[\d.]+;desc="(\d+) queries"', header).group(1))
+
+    def test_header_counts_the_queries(self):
+        self.client.force_login(self.customer)
+        with QueryBudget() as budget:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(self.query_count(response), budget.count)
+        self.assertRegex(response['Server-Timing'], r'view;dur=[\d.]+;desc="\w+"')
+        self.assertNotIn('X-Query-Count', response)# QueryBudgetMiddleware is off
+
+    async def test_header_counts_the_queries_under_asgi(self):
+        # the ORM runs in a sync_to_async thread, its queries must still be counted
+        url = reverse('recipe-detail', args=[self.recipe.pk])
+        await self.async_client.aforce_login(self.customer)
+        await self.async_client.get(url)# body cached
+        budget = QueryBudget()
+        async with budget:
+            response = await self.async_client.get(url)
+        self.assertEqual(self.query_count(response), budget.count)
+        self.assertGreaterEqual(budget.count, 3)# session, user, recipe
+
+    @override_settings(SERVER_TIMING_SLOW_MS=0)
+    def test_slow_requests_are_logged_with_their_filters(self):
+        self.client.force_login(self.customer)
+        with self.assertLogs('users.performance', 'WARNING') as logs:
+            self.client.get(reverse('dashboard'), {'meal_time': 'Lunch', 'cursor': 'abc', 'q': ''})
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['event'], record['path'], record['status']), ('slow_request', '/dashboard/', 200))
+        self.assertEqual(record['params'], {'meal_time': 'Lunch'})# cursor and empty values dropped
+        self.assertGreater(record['queries'], 0)
+        self.assertIn('total_ms', record)
+
+    @override_settings(SERVER_TIMING_SLOW_MS=0, QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_MAX_QUERIES=1)
+    async def test_async_stack_logs_and_counts(self):
+        await self.async_client.aforce_login(self.customer)
+        with self.assertLogs('users.performance', 'WARNING') as logs:
+            response = await self.async_client.get(reverse('dashboard'))
+        self.assertEqual(int(response['X-Query-Count']), self.query_count(response))
+        messages = [record.getMessage() for record in logs.records]
+        self.assertTrue(any('budget is 1' in message for message in messages))
+        self.assertTrue(any('"event": "slow_request"' in message for message in messages))
+
+
+class AsyncViewUrls:
+    """URLconf serving the async views whatever ASYNC_VIEWS was when users.urls was imported."""
+
+    urlpatterns = [
+        path('dashboard/', async_views.dashboard, name='dashboard'),
+        path('recipe/<int:pk>/', async_views.recipe_detail, name='recipe-detail'),
+        path('recipe/<int:pk>/save/', async_views.toggle_recipe_save, name='toggle-save'),
+        path('', include('Final_Project.urls')),
+    ]
+
+
+@override_settings(ROOT_URLCONF=AsyncViewUrls)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        self.customers = [User.objects.create_user(f'user{i}', password='pw', is_customer=True) for i in range(2)]
+        self.recipes = make_catalog(self.chef, self.customers, recipes=14, reviews_per_recipe=1)
+        self.recipe = self.recipes[0]
+
+    async def test_dashboard(self):
+        self.assertIs(resolve(reverse('dashboard')).func, async_views.dashboard)
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 302)# login first
+
+        await self.async_client.aforce_login(self.customers[0])
+        with mock.patch.object(RecipeListView, 'paginate_by', 12):
+            response = await self.async_client.get(reverse('dashboard'))
+            self.assertEqual(len(response.context['recipes']), 12)
+            self.assertContains(response, 'Recipe 13')
+            response = await self.async_client.get(response.context['next_page_url'])
+        self.assertEqual([recipe.title for recipe in response.context['recipes']], ['Recipe 1', 'Recipe 0'])
+
+        response = await self.async_client.get(reverse('dashboard'), {'q': 'recipe', 'meal_time': 'Dinner'})
+        self.assertEqual(len(response.context['recipes']), 0)
+
+    async def test_recipe_detail(self):
+        url = reverse('recipe-detail', args=[self.recipe.pk])
+        await self.async_client.aforce_login(self.customers[1])
+        response = await self.async_client.get(url)
+        self.assertContains(response, 'Recipe 0')
+        self.assertEqual(response.context['is_saved'], False)
+        response = await self.async_client.get(url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual((await self.async_client.get(reverse('recipe-detail', args=[999999]))).status_code, 404)
+
+    async def test_review_posts_go_through_the_form_view(self):
+        url = reverse('recipe-detail', args=[self.recipe.pk])
+        await self.async_client.aforce_login(self.customers[1])
+        response = await self.async_client.post(url, {'rating': 2, 'content': 'Needs salt'})
+        self.assertEqual((response.status_code, response['Location']), (302, url))
+        review = await Review.objects.aget(recipe=self.recipe, user=self.customers[1])
+        self.assertEqual(review.content, 'Needs salt')
+        self.assertContains(await self.async_client.get(url), 'Needs salt')
+
+    async def test_toggle_recipe_save(self):
+        url = reverse('toggle-save', args=[self.recipe.pk])
+        self.assertEqual((await self.async_client.post(url)).status_code, 401)
+
+        await self.async_client.aforce_login(self.customers[0])
+        self.assertEqual((await self.async_client.get(url)).status_code, 405)
+        data = (await self.async_client.post(url)).json()
+        self.assertEqual((data['saved'], data['recipe_title'], data['saved_count']), (True, 'Recipe 0', 1))
+        response = await self.async_client.get(reverse('recipe-detail', args=[self.recipe.pk]))
+        self.assertEqual(response.context['is_saved'], True)
+        data = (await self.async_client.post(url)).json()
+        self.assertEqual((data['saved'], data['saved_count']), (False, 0))
+        self.assertEqual((await self.async_client.post(reverse('toggle-save', args=[999999]))).status_code, 404)
+
+
+class ReviewFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        self.customers = [User.objects.create_user(f'user{i}', password='pw', is_customer=True) for i in range(13)]
+        self.recipe = make_catalog(chef, self.customers, recipes=1, reviews_per_recipe=13)[0]
+
+    def test_posting_again_updates_the_review(self):
+        self.client.force_login(self.customers[0])
+        url = reverse('recipe-detail', args=[self.recipe.pk])
+        self.client.post(url, {'rating': 1, 'content': 'Changed my mind'})
+        self.assertEqual(Review.objects.filter(recipe=self.recipe, user=self.customers[0]).count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.rating_count, self.recipe.rating_avg), (13, 49 / 13))
+
+    def test_edit_handled_by_another_worker_changes_the_page(self):
+        self.client.force_login(self.customers[0])
+        url = reverse('recipe-detail', args=[self.recipe.pk])
+        etag = self.client.get(url)['ETag']# body cached in this worker
+        with mock.patch('users.signals.bump_recipe_generation'):# a locmem cache elsewhere sees the bump
+            Review.upsert(self.recipe, self.customers[5], 4, 'Even better reheated')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Even better reheated')
+
+    def test_load_more_walks_the_feed(self):
+        self.client.force_login(self.customers[0])
+        response = self.client.get(reverse('recipe-detail', args=[self.recipe.pk]))
+        self.assertEqual(response.content.count(b'class="review-item"'), 10)
+        self.assertContains(response, 'id="reviews-more"')
+
+        feed = reverse('recipe-reviews', args=[self.recipe.pk])
+        data = self.client.get(feed).json()
+        self.assertEqual(data['count'], 10)
+        data = self.client.get(data['next']).json()
+        self.assertEqual((data['count'], data['next']), (3, None))
+        self.assertEqual(self.client.get(reverse('recipe-reviews', args=[999999])).status_code, 404)
+
+
+class RatingStatsTests(TestCase):
+    """The stored aggregates against a recount of the review rows after every kind of change."""
+
+    def setUp(self):
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        self.customers = [User.objects.create_user(f'user{i}', password='pw', is_customer=True) for i in range(4)]
+        self.recipes = make_catalog(chef, self.customers, recipes=2, reviews_per_recipe=0)
+
+    def assertStatsMatchReviews(self):
+        for recipe in self.recipes:
+            recipe.refresh_from_db()
+            ratings = list(Review.objects.filter(recipe=recipe).values_list('rating', flat=True))
+            histogram = {str(stars): ratings.count(stars) for stars in set(ratings)}
+            self.assertEqual(recipe.rating_histogram, histogram)
+            self.assertEqual(recipe.rating_count, len(ratings))
+            self.assertAlmostEqual(recipe.rating_avg, sum(ratings) / len(ratings) if ratings else 0)
+
+    def test_create_edit_and_delete(self):
+        first, second = self.recipes
+        reviews = [
+            Review.objects.create(recipe=first, user=customer, rating=stars, content='Ok')
+            for customer, stars in zip(self.customers, (5, 3, 3, 1))
+        ]
+        self.assertStatsMatchReviews()
+
+        reviews[0].rating = 2
+        reviews[0].save()
+        Review.upsert(first, self.customers[1], 4, 'Better the next day')
+        Review.upsert(first, self.customers[2], 3, 'Same stars, new words')
+        self.assertStatsMatchReviews()
+
+        reviews[3].delete()
+        Review.objects.filter(user=self.customers[2]).delete()
+        self.assertStatsMatchReviews()
+        self.assertEqual(second.rating_count, 0)
+
+    def test_moving_a_review_to_another_recipe(self):
+        first, second = self.recipes
+        review = Review.objects.create(recipe=first, user=self.customers[0], rating=5, content='Ok')
+        Review.objects.create(recipe=first, user=self.customers[1], rating=2, content='Ok')
+        review.recipe = second
+        review.rating = 4
+        review.save()
+        self.assertStatsMatchReviews()
+        self.assertEqual((first.rating_count, second.rating_count), (1, 1))
+
+    def test_cascade_delete_of_the_reviewer(self):
+        for recipe in self.recipes:
+            for customer, stars in zip(self.customers, (1, 2, 5)):
+                Review.objects.create(recipe=recipe, user=customer, rating=stars, content='Ok')
+        self.customers[2].delete()
+        self.assertStatsMatchReviews()
+        self.assertEqual(self.recipes[0].rating_histogram, {'1': 1, '2': 1})
+
+    def test_deleting_recipes_does_not_recount_their_reviews(self):
+        for recipe in self.recipes:
+            for customer, stars in zip(self.customers, (1, 2, 5)):
+                Review.objects.create(recipe=recipe, user=customer, rating=stars, content='Ok')
+        updates = lambda queries: [q['sql'] for q in queries if q['sql'].startswith('UPDATE "users_recipe"')]
+        with CaptureQueriesContext(connection) as queries:
+            self.recipes[0].delete()
+        self.assertEqual(updates(queries), [])
+        with CaptureQueriesContext(connection) as queries:
+            self.recipes[1].chef.delete()
+        self.assertEqual(updates(queries), [])
+        self.assertFalse(Review.objects.exists())
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        self.recipes = make_catalog(chef, [], recipes=7, reviews_per_recipe=0)
+        self.paginator = KeysetPaginator(3)
+
+    def walk(self, queryset):
+        pages, cursor = [], None
+        while True:
+            page = self.paginator.paginate(queryset, cursor)
+            pages.append([recipe.pk for recipe in page])
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_cursor_round_trip(self):
+        recipe = self.recipes[2]
+        cursor = self.paginator.encode_cursor(recipe)
+        self.assertEqual(self.paginator.decode_cursor(cursor, Recipe), [recipe.created_at, recipe.pk])
+        self.assertNotIn('=', cursor)# padding stripped, safe in a query string
+
+    def test_ties_on_created_at_fall_back_to_the_id(self):
+        Recipe.objects.update(created_at=timezone.now())
+        pages = self.walk(Recipe.objects.all())
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), sorted((recipe.pk for recipe in self.recipes), reverse=True))
+
+    def test_last_page(self):
+        cursor = self.paginator.encode_cursor(self.recipes[1])# two older recipes left
+        page = self.paginator.paginate(Recipe.objects.all(), cursor)
+        self.assertEqual(([recipe.pk for recipe in page], page.has_next()), ([self.recipes[0].pk], False))
+        page = self.paginator.paginate(Recipe.objects.all(), self.paginator.encode_cursor(self.recipes[0]))
+        self.assertEqual((len(page), page.next_cursor), (0, None))
+
+    def test_tampered_cursor_starts_from_the_top(self):
+        first = [recipe.pk for recipe in self.paginator.paginate(Recipe.objects.all())]
+        for cursor in (
+            'not-a-cursor!',
+            self.paginator.encode_values(['2026-01-01T00:00:00']),# wrong number of values
+            self.paginator.encode_values(['yesterday', 3]),# not a datetime
+        ):
+            page = self.paginator.paginate(Recipe.objects.all(), cursor)
+            self.assertEqual([recipe.pk for recipe in page], first, cursor)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        rows = [
+            ('Jollof rice', 'Nigeria', 'Smoky party rice', ['rice', 'tomatoes']),
+            ('Fried plantain', 'Ghana', 'Serve with jollof', ['plantain']),
+            ('Pepper soup', 'Nigeria', 'Hot and light', ['goat', 'jollof spice']),
+            ('Rice and beans', 'Ghana', 'Waakye', ['rice', 'beans']),
+        ]
+        self.recipes = {}
+        for title, origin, description, ingredients in rows:
+            self.recipes[title] = Recipe.objects.create(
+                chef=chef, title=title, origin_country=origin, description=description,
+                ingredients=[{'name': name, 'qty': '1'} for name in ingredients],
+            )
+        search.index_recipes(self.recipes.values())
+
+    def titles(self, query):
+        return [recipe.title for recipe in search.search_recipes(Recipe.objects.all(), query).order_by('-search_rank')]
+
+    def test_title_outranks_description_outranks_ingredients(self):
+        self.assertEqual(self.titles('jollof'), ['Jollof rice', 'Fried plantain', 'Pepper soup'])
+        self.assertEqual(self.titles('jol'), self.titles('jollof'))# prefix match while typing
+        self.assertEqual(self.titles('nigeria rice'), ['Jollof rice'])# every term must match
+
+    def test_quotes_and_operators_are_plain_words(self):
+        for query in ('"jollof"', 'jollof*', '-jollof', '(jollof', 'jollof^', 'jollof)', '"jollof'):
+            self.assertEqual(self.titles(query), self.titles('jollof'), query)
+        self.assertEqual(self.titles('rice AND beans'), ['Rice and beans'])# AND is searched, not applied
+        self.assertEqual(self.titles('rice OR plantain'), [])
+        self.assertEqual(self.titles('NEAR(jollof rice)'), [])
+        self.assertEqual(len(self.titles('*" ^')), len(self.recipes))# no terms: no filter
+
+    def test_other_backends_fall_back_to_substring_search(self):
+        with mock.patch('users.search._vendor', return_value='mysql'):
+            results = search.search_recipes(Recipe.objects.all(), 'GHANA "rice"')
+            self.assertEqual([recipe.title for recipe in results], ['Rice and beans'])
+            self.assertEqual({recipe.search_rank for recipe in results}, {0.0})
+
+
+class FacetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        for meal_time, meal_type, dietary, budget in [
+            ('Lunch', 'Family', 'Vegan', 800), ('Lunch', 'Individual', '', 2500),
+            ('Dinner', 'Family', 'Vegan', 5000), ('Breakfast', 'Family', 'Keto', 20000),
+        ]:
+            Recipe.objects.create(
+                chef=self.chef, title='R', description='d', meal_time=meal_time, meal_type=meal_type,
+                dietary=dietary, budget=budget,
+            )
+
+    def facets(self, query):
+        return recipe_facets({}, QueryDict(query))
+
+    def test_counts_ignore_their_own_group(self):
+        with self.assertQueryBudget(1):
+            facets = self.facets('meal_time=Lunch&meal_type=Family')
+        counts = lambda group: {option['label']: option['count'] for option in facets[group]}
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(counts('meal_time'), {'Breakfast': 1, 'Lunch': 1, 'Dinner': 1})# within Family
+        self.assertEqual(counts('meal_type'), {'Individual': 1, 'Family': 1})# within Lunch
+        self.assertEqual(counts('budget')['Under 1,000'], 1)
+        self.assertEqual([option['selected'] for option in facets['meal_time']], [False, True, False])
+
+    @override_settings(FACET_CACHE_ENABLED=True)
+    def test_cached_until_the_catalog_changes(self):
+        self.facets('dietary=Vegan')
+        with self.assertQueryBudget(0):
+            self.assertEqual(self.facets('dietary=Vegan')['total'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(chef=self.chef, title='R', description='d', dietary='Vegan')
+        self.assertEqual(self.facets('dietary=Vegan')['total'], 3)
+
+    def test_budget_buckets_leave_no_gaps(self):
+        for budget in ('999.50', '2999.99', '3000'):
+            Recipe.objects.create(chef=self.chef, title='R', description='d', budget=budget)
+        buckets = self.facets('')['budget']
+        self.assertEqual([option['count'] for option in buckets], [2, 2, 2, 0, 1])
+        for option in buckets:
+            # clicking a bucket fills the price inputs, which must select the recipes it counted
+            query = f"min_price={option['min']}&max_price={option['max']}"
+            self.assertEqual(self.facets(query)['total'], option['count'], query)
+
+
+class RestrictionMatcherTests(TestCase):
+    def test_whole_words_only(self):
+        matcher = RestrictionMatcher({'gerd': ['pepper', 'mint'], 'halal': ['ham']})
+        self.assertEqual(matcher.scan(['peppermint tea', 'graham crackers', 'hamburger bun']), {})
+        self.assertEqual(
+            matcher.scan(['Black pepper', 'fresh mint leaves', 'smoked ham']),
+            {'gerd': {'pepper', 'mint'}, 'halal': {'ham'}},
+        )
+
+    def test_plurals_and_case_match_the_singular(self):
+        matcher = RestrictionMatcher({'gerd': ['tomato'], 'celiac': ['soy sauce']})
+        self.assertEqual(matcher.scan(['TOMATOES, chopped', 'Soy Sauces']), {'gerd': {'tomato'}, 'celiac': {'soy sauce'}})
+
+    def test_overlapping_phrases(self):
+        matcher = RestrictionMatcher({'a': ['red hot sauce'], 'b': ['hot sauce', 'sauce pan'], 'c': ['rice']})
+        self.assertEqual(
+            matcher.scan(['extra red hot sauce pan', 'white rice']),
+            {'a': {'red hot sauce'}, 'b': {'hot sauce', 'sauce pan'}, 'c': {'rice'}},
+        )
+
+    def test_phrases_never_span_two_ingredients(self):
+        matcher = RestrictionMatcher({'celiac': ['soy sauce']})
+        self.assertEqual(matcher.scan(['soy', 'sauce']), {})
+
+    def test_engine_lookalikes(self):
+        conflicts = find_conflicts([{'name': 'peppermint', 'qty': '1'}, {'name': 'graham crackers', 'qty': '4'}])
+        self.assertNotIn('gerd', conflicts)
+        self.assertNotIn('halal', conflicts)
+        self.assertIn('gerd', find_conflicts(['ground black pepper']))
+        self.assertEqual(find_conflicts(['ham hock'])['halal'], {'ham'})
+
+
+class DietFilterTests(TestCase):
+    def test_meat_is_never_vegetarian_or_vegan(self):
+        for names in (['bacon'], ['lamb chops'], ['goat meat'], ['smoked fish'], ['chicken stock']):
+            mask = compat_mask([{'name': name} for name in names], 'Vegetarian')
+            self.assertFalse(mask & COMPAT_BITS['Vegetarian'], names)
+            self.assertFalse(mask & COMPAT_BITS['Vegan'], names)
+        self.assertTrue(compat_mask([{'name': 'beans'}], 'Vegetarian') & COMPAT_BITS['Vegetarian'])
+
+    def test_vegan_includes_every_vegetarian_rule(self):
+        self.assertLessEqual(set(RESTRICTIONS['vegetarian']), set(RESTRICTIONS['vegan']))
+        self.assertFalse(compat_mask([{'name': 'cheese'}], 'Vegan') & COMPAT_BITS['Vegan'])
+
+    def test_profile_needs_the_declared_diet_and_no_conflict(self):
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        for title, dietary, names in [
+            ('Bean stew', 'Vegetarian', ['beans', 'onion']),
+            ('Bacon beans', 'Vegetarian', ['beans', 'bacon']),# mis-tagged by the chef
+            ('Untagged beans', '', ['beans']),
+            ('Lamb chops', '', ['lamb chops']),
+        ]:
+            Recipe.objects.create(
+                chef=chef, title=title, description='d', dietary=dietary,
+                ingredients=[{'name': name, 'qty': '1'} for name in names],
+            )
+        profile = {'health_condition': 'None', 'dietary': 'Vegetarian', 'allergies': ''}
+        queryset, _, active = filter_recipes(Recipe.objects.all(), profile, QueryDict())
+        self.assertTrue(active)
+        self.assertEqual(list(queryset.values_list('title', flat=True)), ['Bean stew'])
+
+
+@override_settings(JOBS_EAGER=False)
+class AllergyFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        self.client.force_login(User.objects.create_user('user', password='pw', is_customer=True))
+        self.profile = {'health_condition': 'None', 'dietary': 'None', 'allergies': 'tomato'}
+
+    def create(self, title, *names):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Recipe.objects.create(
+                chef=self.chef, title=title, description='Tasty', ingredients=[{'name': n, 'qty': '1'} for n in names],
+            )
+
+    def allowed(self):
+        queryset, _, _ = filter_recipes(Recipe.objects.all(), self.profile, QueryDict())
+        return set(queryset.values_list('title', flat=True))
+
+    def test_new_and_edited_recipes_are_filtered_before_any_job_runs(self):
+        self.create('Plain rice', 'rice')
+        recipe = self.create('Jollof', 'rice', 'tomatoes')
+        self.assertEqual(self.allowed(), {'Plain rice'})
+        self.assertFalse(Job.objects.filter(name='recipes.ingredient_index').exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.ingredients = [{'name': 'rice', 'qty': '1'}]
+            recipe.save()
+        self.assertEqual(self.allowed(), {'Plain rice', 'Jollof'})
+
+    def test_compound_names_are_excluded_like_the_old_text_search(self):
+        self.create('Cheesecake', 'cheesecake', 'sugar')
+        self.create('Pancakes', 'buttermilk', 'flour')
+        self.create('Eggplant stew', 'eggplant', 'onion')
+        self.create('Rice', 'rice')
+        for allergy, expected in [
+            ('cheese', {'Pancakes', 'Eggplant stew', 'Rice'}),
+            ('milk', {'Eggplant stew', 'Rice'}),
+            ('dairy', {'Eggplant stew', 'Rice'}),
+            ('Cheeses', {'Pancakes', 'Eggplant stew', 'Rice'}),
+        ]:
+            self.profile['allergies'] = allergy
+            allowed = self.allowed()
+            self.assertEqual(allowed, expected, allergy)
+            # never more than the icontains exclusion this index replaced let through
+            old = Recipe.objects.annotate(text=Cast('ingredients', TextField())).exclude(text__icontains=allergy)
+            self.assertLessEqual(allowed, set(old.values_list('title', flat=True)), allergy)
+        self.profile['allergies'] = 'eggs'
+        self.assertEqual(self.allowed(), {'Cheesecake', 'Pancakes', 'Eggplant stew', 'Rice'})
+
+    def test_allergens_match_whole_tokens_and_compound_parts(self):
+        self.create('Ham hock soup', 'smoked ham hock', 'onion')
+        self.create('Graham pie', 'graham crackers', 'sugar')
+        self.create('Walnut cake', 'walnuts', 'flour')
+        self.profile['allergies'] = 'ham'
+        self.assertEqual(self.allowed(), {'Graham pie', 'Walnut cake'})
+        self.assertIn('nut', RecipeIngredient.objects.filter(recipe__title='Walnut cake').values_list('token', flat=True))
+
+    @override_settings(RESULT_CACHE_ENABLED=True)
+    def test_cached_listing_never_shows_a_new_unsafe_recipe(self):
+        self.create('Plain rice', 'rice')
+        self.client.post(reverse('recommendation'), self.profile)
+        titles = lambda: {recipe.title for recipe in self.client.get(reverse('dashboard')).context['recipes']}
+        self.assertEqual(titles(), {'Plain rice'})# caches the result ids
+        self.create('Tomato soup', 'tomatoes', 'onion')
+        self.assertEqual(titles(), {'Plain rice'})
+
+
+@override_settings(RESULT_CACHE_ENABLED=True)
+class ResultCacheTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        self.recipes = make_catalog(chef, [], recipes=30)
+        Recipe.objects.filter(pk__in=[r.pk for r in self.recipes[::3]]).update(meal_time='Dinner')
+        self.client.force_login(User.objects.create_user('user', password='pw', is_customer=True))
+
+    def walk(self, url):
+        # ids of every card, following the dashboard's "load more" links
+        ids = []
+        while url:
+            response = self.client.get(url)
+            ids += [recipe.pk for recipe in response.context['recipes']]
+            url = response.context['next_page_url']
+        return ids
+
+    def test_pages_match_the_database_path(self):
+        url = reverse('dashboard') + '?meal_time=Lunch'
+        with override_settings(RESULT_CACHE_ENABLED=False):
+            expected = self.walk(url)
+        self.assertEqual(len(expected), 20)
+        self.assertEqual(self.walk(url), expected)# fills the cache
+        self.assertEqual(self.walk(url), expected)# served from it
+
+    def test_filtered_query_runs_once_until_the_catalog_changes(self):
+        url = reverse('dashboard') + '?meal_time=Dinner'
+        self.client.get(url)
+        with mock.patch('users.resultcache._rows_query', side_effect=AssertionError('cache miss')):
+            self.assertEqual(len(self.client.get(url).context['recipes']), 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[1].meal_time = 'Dinner'
+            self.recipes[1].save()
+        self.assertEqual(len(self.client.get(url).context['recipes']), 11)
+
+
+class SharedCacheTests(TestCase):
+    def test_cross_worker_caches_need_a_shared_backend(self):
+        self.assertEqual(settings.CACHES['default']['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        self.assertFalse(settings.RESULT_CACHE_ENABLED or settings.FACET_CACHE_ENABLED or settings.SIDEBAR_CACHE_ENABLED)
+        self.assertEqual(shared_cache_check(None), [])
+        with override_settings(RESULT_CACHE_ENABLED=True):
+            self.assertEqual([error.id for error in shared_cache_check(None)], ['users.E001'])
+
+    @override_settings(SIDEBAR_CACHE_ENABLED=True)
+    def test_recipe_edit_only_invalidates_sidebars_for_a_new_title(self):
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        recipe = make_catalog(chef, [], recipes=1)[0]
+        self.client.force_login(chef)
+        data = {
+            'title': recipe.title, 'description': 'Changed', 'cooking_time': 30, 'dietary': 'None',
+            'health_condition': 'None', 'ingredients': '[]', 'instructions': '[]',
+        }
+        url = reverse('recipe-update', args=[recipe.pk])
+        with mock.patch('users.views.invalidate_recipe_sidebars') as invalidate:
+            self.client.post(url, data)
+            invalidate.assert_not_called()
+            self.client.post(url, {**data, 'title': 'Renamed'})
+            invalidate.assert_called_once()
+
+
+@override_settings(TEMP_FILTERS_STORAGE='cookie')
+class SessionFilterTests(TestCase):
+    def setUp(self):
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        make_catalog(chef, [], recipes=3)
+        self.client.force_login(User.objects.create_user('user', password='pw', is_customer=True))
+        self.profile = {'health_condition': 'None', 'dietary': 'None', 'allergies': 'tomato'}
+
+    def test_filters_round_trip_through_a_signed_cookie(self):
+        session = Session.objects.get()
+        response = self.client.post(reverse('recommendation'), self.profile)
+        self.assertIn('temp_filters', response.cookies)
+        self.assertEqual(Session.objects.get().session_data, session.session_data)# session left alone
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertTrue(response.context['is_filtered'])
+
+        response = self.client.post(reverse('recommendation'), self.profile)
+        self.assertNotIn('temp_filters', response.cookies)# unchanged, nothing rewritten
+
+        self.client.cookies['temp_filters'] = 'forged'
+        self.assertFalse(self.client.get(reverse('dashboard')).context['is_filtered'])
+
+    def test_reset_deletes_the_cookie(self):
+        self.client.post(reverse('recommendation'), self.profile)
+        response = self.client.get(reverse('reset_filters'))
+        self.assertEqual(response.cookies['temp_filters'].value, '')
+        self.assertFalse(self.client.get(reverse('dashboard')).context['is_filtered'])
+
+    def test_clear_expired_sessions_in_batches(self):
+        past = timezone.now() - timedelta(days=1)
+        Session.objects.bulk_create(Session(session_key=f'old{i}', session_data='', expire_date=past) for i in range(5))
+        out = StringIO()
+        with self.assertNumQueries(2 * 3 + 1):# 3 batches of select + delete, then the empty select
+            call_command('clear_expired_sessions', batch_size=2, stdout=out)
+        self.assertIn('Deleted 5 expired sessions', out.getvalue())
+        self.assertEqual(Session.objects.count(), 1)# the logged-in one
+
+
+class ImportRecipesTests(TestCase):
+    def test_imports_valid_rows_and_reports_rejects(self):
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        rows = [
+            {'title': 'Jollof', 'description': 'Rice', 'cooking_time': 40, 'dietary': 'Vegan', 'meal_time': 'Lunch',
+             'ingredients': [{'name': 'rice', 'qty': '2 cups'}, {'name': 'tomatoes', 'qty': '3'}]},
+            {'title': 'Omelette', 'description': 'Eggs', 'cooking_time': 10, 'dietary': 'Vegan',
+             'ingredients': [{'name': 'eggs', 'qty': '3'}]},# conflicts with the diet, like in RecipeForm
+            {'title': 'Soup', 'description': 'Hot', 'cooking_time': 'soon'},
+            {'title': 'Stew', 'description': 'Slow', 'cooking_time': 90, 'dietary': 'None',
+             'ingredients': [{'name': 'beef', 'qty': '500 g'}]},
+            {'title': 'Salad', 'description': 'Fresh', 'cooking_time': 5},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recipes.jsonl')
+            with open(path, 'w') as source:
+                source.write('\n'.join(json.dumps(row) for row in rows[:2]) + '\n{"title": \n')
+                source.write('\n'.join(json.dumps(row) for row in rows[2:]) + '\n')
+            out = StringIO()
+            call_command('import_recipes', path, chef='chef', batch_size=2, stdout=out)
+            with open(path + '.errors.jsonl') as errors:
+                rejects = [json.loads(line) for line in errors]
+
+        self.assertIn('Imported 3 recipes, rejected 3', out.getvalue())
+        self.assertEqual([reject['line'] for reject in rejects], [2, 3, 4])
+        self.assertIn('Vegan', rejects[0]['errors']['__all__'][0])
+        self.assertIn('cooking_time', rejects[2]['errors'])
+
+        recipes = {recipe.title: recipe for recipe in Recipe.objects.filter(chef=chef)}
+        self.assertEqual(set(recipes), {'Jollof', 'Stew', 'Salad'})
+        self.assertEqual(recipes['Stew'].dietary, '')
+        self.assertEqual(recipes['Salad'].ingredients, [])
+        self.assertNotEqual(recipes['Jollof'].compat_mask, 0)
+        self.assertTrue(RecipeIngredient.objects.filter(recipe=recipes['Stew'], token='beef').exists())
+
+    def test_catalog_version_is_bumped_after_the_search_rebuild(self):
+        User.objects.create_user('chef', password='pw', is_chef=True)
+        command = 'users.management.commands.import_recipes'
+        calls = mock.Mock()
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch(f'{command}.call_command', calls.rebuild), \
+                mock.patch(f'{command}.bump_catalog_version', calls.bump):
+            path = os.path.join(directory, 'recipes.jsonl')
+            with open(path, 'w') as source:
+                source.write(json.dumps({'title': 'Salad', 'description': 'Fresh', 'cooking_time': 5}) + '\n')
+            call_command('import_recipes', path, chef='chef', stdout=StringIO())
+        self.assertEqual([name for name, *_ in calls.mock_calls], ['rebuild', 'bump'])
+        self.assertEqual(calls.rebuild.call_args.args, ('rebuild_search_index',))
+
+    def test_tokens_are_written_with_each_batch_even_without_derived_data(self):
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        rows = [
+            {'title': f'Stew {i}', 'description': 'Slow', 'cooking_time': 90,
+             'ingredients': [{'name': 'button mushrooms', 'qty': '200 g'}]}
+            for i in range(3)
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recipes.jsonl')
+            with open(path, 'w') as source:
+                source.write(''.join(json.dumps(row) + '\n' for row in rows))
+            with mock.patch('users.management.commands.import_recipes.call_command') as rebuild:
+                call_command('import_recipes', path, chef='chef', batch_size=2, skip_derived=True, stdout=StringIO())
+        rebuild.assert_not_called()
+        tokens = RecipeIngredient.objects.filter(recipe__chef=chef, token='mushroom')
+        self.assertEqual(tokens.count(), 3)
+        queryset, _, _ = filter_recipes(Recipe.objects.all(), {'allergies': 'mushroom'}, QueryDict())
+        self.assertFalse(queryset.exists())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        other = User.objects.create_user('other', password='pw', is_chef=True)
+        self.customer = User.objects.create_user('user', password='pw', is_customer=True)
+        self.recipes = make_catalog(self.chef, [self.customer], recipes=3, reviews_per_recipe=1)
+        make_catalog(other, [self.customer], recipes=2, reviews_per_recipe=1)
+        self.customer.saved_recipes.add(self.recipes[0])
+
+    def download(self, kind, **params):
+        response = self.client.get(reverse('export-data', args=[kind]), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_chef_export_is_scoped_and_streamed(self):
+        self.client.force_login(self.chef)
+        with mock.patch('users.export.BUFFER_SIZE', 1):# a chunk per row
+            rows = [json.loads(line) for line in self.download('recipes').splitlines()]
+        self.assertEqual([row['id'] for row in rows], [recipe.pk for recipe in self.recipes])
+        self.assertEqual(rows[0]['ingredients'][0], {'name': 'rice', 'qty': '1 cup'})
+
+        reviews = list(csv.DictReader(io.StringIO(self.download('reviews', format='csv').decode())))
+        self.assertEqual(len(reviews), 3)
+        self.assertEqual(reviews[0]['username'], 'user')
+        self.assertNotIn('user_id', reviews[0])
+
+        saved = gzip.decompress(self.download('saved', gzip='1')).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in saved][0]['recipe_id'], self.recipes[0].pk)
+
+    async def test_asgi_streams_asynchronously(self):
+        await self.async_client.aforce_login(self.chef)
+        response = await self.async_client.get(reverse('export-data', args=['recipes']), {'format': 'csv'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(body.decode().splitlines()), 4)# header + 3 recipes
+
+    def test_only_chefs(self):
+        self.assertEqual(self.client.get(reverse('export-data', args=['recipes'])).status_code, 401)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get(reverse('export-data', args=['recipes'])).status_code, 403)
+        self.client.force_login(self.chef)
+        self.assertEqual(self.client.get(reverse('export-data', args=['users'])).status_code, 404)
+
+    def test_command_exports_every_row(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'reviews.csv.gz')
+            call_command('export_data', 'reviews', format='csv', gzip=True, output=path, chunk_size=2, stdout=StringIO())
+            with gzip.open(path, 'rt') as export:
+                rows = list(csv.DictReader(export))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['user_id'], str(self.customer.pk))
+
+
+class BatchSaveTests(TestCase):
+    def setUp(self):
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        self.user = User.objects.create_user('user', password='pw', is_customer=True)
+        self.recipes = make_catalog(chef, [], recipes=3)
+        self.client.force_login(self.user)
+
+    def post(self, payload):
+        return self.client.post(reverse('batch-save'), payload, content_type='application/json')
+
+    def test_sets_saved_state_idempotently(self):
+        a, b, c = (recipe.pk for recipe in self.recipes)
+        self.user.saved_recipes.add(self.recipes[2])
+        payload = {'save': [a, b, 999999], 'unsave': [c]}
+        for _ in range(2):
+            response = self.post(payload)
+            self.assertEqual(response.json(), {'saved': [a, b], 'unsaved': [c], 'missing': [999999]})
+        self.assertEqual(set(self.user.saved_recipes.values_list('pk', flat=True)), {a, b})
+
+    def test_rejects_bad_payloads(self):
+        pk = self.recipes[0].pk
+        for payload in ({'save': [pk], 'unsave': [pk]}, {'save': 'all'}, {'save': [str(pk)]}, [pk]):
+            self.assertEqual(self.post(payload).status_code, 400)
+
+
+class DbPoolStatsTests(TestCase):
+    def test_staff_only(self):
+        url = reverse('db-pool-stats')
+        self.client.force_login(User.objects.create_user('user', password='pw', is_customer=True))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        stats = self.client.get(url).json()
+        self.assertEqual(stats['vendor'], connection.vendor)
+        if connection.vendor != 'postgresql' or not settings.DB_POOL:
+            self.assertIsNone(stats['pool'])
+        else:
+            self.assertIn('pool_max', stats['pool'])
+
+
+class RecipeApiTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        self.customers = [User.objects.create_user(f'user{i}', password='pw', is_customer=True) for i in range(3)]
+        self.client.force_login(self.customers[0])
+
+    def test_list_query_count_is_fixed(self):
+        url = reverse('api-v1:recipe-list') + '?fields='
+        for size in (2, 12):
+            make_catalog(self.chef, self.customers, recipes=size)
+            for fields in ('id,title,chef,is_saved', 'id,ingredients', 'id,instructions'):
+                with self.assertQueryBudget(3):# session, user, one page of recipes
+                    response = self.client.get(url + fields)
+                self.assertEqual(set(response.json()['results'][0]), set(fields.split(',')))
+        self.assertEqual(response.json()['results'][0]['instructions'], [])
+        self.assertEqual(self.client.get(reverse('api-v1:recipe-list') + '?fields=nope').status_code, 400)
+
+    def test_unchanged_page_revalidates_with_304(self):
+        recipe = make_catalog(self.chef, self.customers, recipes=1, reviews_per_recipe=1)[0]
+        url = reverse('api-v1:recipe-detail', args=[recipe.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Review.objects.create(recipe=recipe, user=self.customers[2], rating=1, content='Meh')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+def photo(size=(1000, 500), color=(200, 80, 40, 255), fmt='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGBA' if fmt == 'PNG' else 'RGB', size, color[:4 if fmt == 'PNG' else 3]).save(buffer, fmt)
+    return SimpleUploadedFile(f'dish.{fmt.lower()}', buffer.getvalue())
+
+
+@override_settings(JOBS_EAGER=True)
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+        self.chef = User.objects.create_user('chef', password='pw', is_chef=True)
+
+    def create(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(chef=self.chef, title='Soup', image=image)
+        recipe.refresh_from_db()
+        return recipe
+
+    def files(self):
+        return sorted(os.listdir(os.path.join(self.media, images.DERIVED_DIR)))
+
+    def test_every_width_and_format_without_upscaling(self):
+        derived = self.create(photo()).image_derivatives
+        self.assertEqual((derived['width'], derived['height']), (1000, 500))
+        self.assertEqual(set(derived['formats']), {ext for ext, _, _ in images.available_formats()})
+        for variants in derived['formats'].values():
+            self.assertEqual([width for width, _ in variants], [400, 600, 800, 1000])
+        self.assertEqual(len(self.files()), 4 * len(derived['formats']))
+        with default_storage.open(derived['formats']['jpeg'][0][1]) as handle:
+            self.assertEqual(Image.open(handle).size, (400, 200))
+
+        self.create(photo())# same photo: same files, nothing written twice
+        self.assertEqual(len(self.files()), 4 * len(derived['formats']))
+
+    def test_sources_exactly_a_width_wide_get_that_width(self):
+        for size, expected in [(1200, [400, 600, 800, 1200]), (400, [400]), (300, [300])]:
+            derived = self.create(photo(size=(size, size // 2))).image_derivatives
+            self.assertEqual([width for width, _ in derived['formats']['jpeg']], expected, size)
+
+    def test_unreadable_photo_has_no_derivatives(self):
+        with self.assertLogs('users.images', 'WARNING'):
+            recipe = self.create(SimpleUploadedFile('dish.jpg', b'not an image'))
+        self.assertEqual((recipe.image_derivatives, recipe.card_picture), ({}, None))
+
+    def test_picture_context_and_markup(self):
+        recipe = self.create(photo(fmt='JPEG'))
+        card = recipe.card_picture
+        self.assertEqual((card['sizes'], card['width'], card['height']), (images.SIZES['card'], 1000, 500))
+        self.assertTrue(card['src'].endswith('-400w.jpeg'))
+        self.assertEqual(card['srcset'].count('w, '), 3)# four widths
+        self.assertIn('image/webp', [source['type'] for source in card['sources']])
+        self.assertTrue(recipe.detail_picture['src'].endswith('-600w.jpeg'))
+
+        self.client.force_login(self.chef)
+        response = self.client.get(reverse('recipe-detail', args=[recipe.pk]))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, f'srcset="{recipe.detail_picture["srcset"]}"')
+
+    def test_delete_removes_files_no_other_recipe_uses(self):
+        first = self.create(photo())
+        second = self.create(photo())
+        other = self.create(photo(color=(10, 120, 10, 255)))
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(second.image_derivatives['formats']['jpeg'][0][1]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.files(), sorted(
+            os.path.basename(name) for variants in other.image_derivatives['formats'].values() for _, name in variants
+        ))
+
+
+class FrozenMigrationTests(TestCase):
+    """The data migrations carry their own copy of the derived-data logic; today it must match the live one."""
+
+    INGREDIENTS = [
+        [{'name': 'Creamy Peanut Butter', 'qty': '2 tbsp'}, {'name': 'tomatoes', 'qty': '3'}],
+        json.dumps([{'name': 'smoked ham hock', 'qty': '1'}, {'name': 'peppermint', 'qty': ''}]),
+        'graham crackers',
+        json.dumps('eggplant and nutmeg'),
+        {'name': 'buttermilk', 'qty': '1 cup'},
+        ['white rice', 'soy sauce', {'name': 'Cheesecake'}],
+        [{'name': 'soy'}, {'name': 'sauce'}, {'name': 'hot dogs'}],
+        ['walnuts', 'oatmeal', 'Blueberries'],
+        42,
+        [],
+    ]
+
+    def migration(self, name):
+        return importlib.import_module(f'users.migrations.{name}')
+
+    def test_ingredient_tokens(self):
+        frozen = self.migration('0012_recipe_ingredient_compounds')
+        for ingredients in self.INGREDIENTS:
+            self.assertEqual(frozen.ingredient_tokens(ingredients), ingredient_tokens(ingredients), ingredients)
+
+    def test_search_documents(self):
+        frozen = self.migration('0004_recipe_search')
+        for ingredients in self.INGREDIENTS:
+            recipe = Recipe(title='Soup', origin_country='Ghana', description=None, ingredients=ingredients)
+            self.assertEqual(frozen.document(recipe), search._document(recipe), ingredients)
+
+    def test_compat_masks(self):
+        frozen = self.migration('0005_recipe_compat_mask')
+        self.assertEqual(frozen.COMPAT_FLAGS, COMPAT_FLAGS)
+        for ingredients in self.INGREDIENTS:
+            for dietary, health in [('', ''), ('Vegan', 'Obesity'), ('Keto', 'Anemia'), ('None', 'GERD')]:
+                self.assertEqual(
+                    frozen.compat_mask(ingredients, dietary, health), compat_mask(ingredients, dietary, health),
+                    (ingredients, dietary, health),
+                )
+
+
+@override_settings(JOBS_EAGER=True)
+class EagerJobTests(TestCase):
+    def test_derived_data_is_built_inline(self):
+        chef = User.objects.create_user('chef', password='pw', is_chef=True)
+        recipe = make_catalog(chef, [], recipes=1)[0]
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(
+            set(RecipeIngredient.objects.filter(recipe=recipe).values_list('token', flat=True)),
+            {'rice', 'tomato'},
+        )
+
+
+@override_settings(JOBS_EAGER=False, JOBS_RETRY_DELAY=10)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.chef = User.objects.create_user('chef', password='pw', is_chef=True)
+
+    def run_due_jobs(self):
+        for job in tasks.claim(10):
+            tasks.run(job)
+
+    def test_saving_queues_the_derived_work_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = make_catalog(self.chef, [], recipes=1)[0]
+            self.assertFalse(Job.objects.exists())# nothing a worker could run before the commit
+        queued = Job.objects.filter(status=Job.PENDING).count()
+        self.assertGreater(queued, 0)
+        self.assertTrue(RecipeIngredient.objects.filter(recipe=recipe, token='rice').exists())# written by save()
+        self.assertFalse(Job.objects.filter(name='recipes.ingredient_index').exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()# same idempotency keys, nothing new is queued
+        self.assertEqual(Job.objects.count(), queued)
+
+        self.run_due_jobs()
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+        self.assertTrue(Job.objects.filter(name='recipes.search_index', status=Job.DONE).exists())
+
+    def test_worker_pool_fits_every_thread(self):
+        from .management.commands.run_jobs import Command
+
+        small, sized = ({'OPTIONS': {'pool': {'max_size': size}}} for size in (2, 10))
+        fakes = [mock.Mock(settings_dict=small), mock.Mock(settings_dict=sized)]
+        with mock.patch('users.management.commands.run_jobs.connections') as connections:
+            connections.all.return_value = fakes
+            Command().size_pools(threads=4)
+        self.assertEqual(small['OPTIONS']['pool']['max_size'], 5)# 4 job threads + the claim loop
+        fakes[0].close_pool.assert_called_once_with()
+        self.assertEqual(sized['OPTIONS']['pool']['max_size'], 10)
+        fakes[1].close_pool.assert_not_called()
+
+    def test_failing_job_is_retried_then_marked_failed(self):
+        broken = mock.Mock(side_effect=RuntimeError('boom'))
+        with mock.patch.dict(tasks.TASKS, {'tests.broken': broken}):
+            with self.captureOnCommitCallbacks(execute=True):
+                tasks.enqueue('tests.broken', key='broken', max_attempts=2, value=1)
+            job = Job.objects.get(idempotency_key='broken')
+
+            with self.assertLogs('users.tasks', 'WARNING'):
+                self.run_due_jobs()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+            self.assertGreater(job.run_after, timezone.now())# backing off
+            self.assertIn('boom', job.last_error)
+
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now() - timedelta(seconds=1))
+            with self.assertLogs('users.tasks', 'ERROR'):
+                self.run_due_jobs()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        broken.assert_called_with(value=1)
+
+    def test_stale_running_job_is_requeued(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue('recipes.warm_card', key='card', recipe_id=0)
+        job = Job.objects.get(idempotency_key='card')
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(tasks.requeue_stale(timedelta(minutes=10)), 1)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.PENDING)
+
+
+@skipUnless(connection.vendor == 'postgresql', "needs PostgreSQL query plans")
+class QueryPlanTests(TestCase):
+    """EXPLAIN the first dashboard page for the standard filter combinations.
+
+    Fails when a plan reads a table of QUERY_PLAN_SEQSCAN_ROWS rows or more
+    with a sequential scan. Run with a PostgreSQL DATABASE_URL.
+    """
+    COMBINATIONS = [
+        ({}, ''),
+        ({}, 'dietary=Vegan'),
+        ({}, 'meal_time=Lunch'),
+        ({}, 'meal_time=Lunch&meal_time=Dinner'),
+        ({}, 'meal_type=Family'),
+        ({}, 'min_price=1000&max_price=3000'),
+        ({}, 'meal_time=Dinner&meal_type=Individual&max_price=5000'),
+        ({'health_condition': 'Diabetes'}, ''),
+        ({'dietary': 'Vegan', 'allergies': 'peanuts'}, 'meal_time=Breakfast'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_data', chefs=5, customers=1, recipes=settings.QUERY_PLAN_SEQSCAN_ROWS * 5, reviews=0, saves=0,
+            stdout=StringIO(),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_dashboard_filters_use_indexes(self):
+        for session_filters, params in self.COMBINATIONS:
+            with self.subTest(session=session_filters, params=params):
+                queryset, ordering, _ = filter_recipes(
+                    Recipe.objects.select_related('chef'), session_filters, QueryDict(params)
+                )
+                page = KeysetPaginator(RecipeListView.paginate_by, ordering)._page_queryset(queryset, None)
+                self.assertEqual(sequential_scans(page, settings.QUERY_PLAN_SEQSCAN_ROWS), {})
@@ -1,34 +1,64 @@
 # users/urls.py
+from django.conf import settings
 from django.views.generic import TemplateView
-from django.urls import path
+from django.urls import include, path
 from django.contrib.auth import views as auth_views
-from . import views
+from rest_framework.routers import DefaultRouter
+from . import api, async_views, views
 from .views import (
     RecipeListView, 
+    RecipeFeedView,
     RecipeDetailView, 
     RecipeCreateView, 
     RecipeUpdateView, 
     RecipeDeleteView
 )
 
+# under ASGI the hot endpoints are served by their async versions (users/async_views.py)
+if settings.ASYNC_VIEWS:
+    dashboard_view = async_views.dashboard
+    recipe_detail_view = async_views.recipe_detail
+    toggle_save_view = async_views.toggle_recipe_save
+else:
+    dashboard_view = RecipeListView.as_view()
+    recipe_detail_view = RecipeDetailView.as_view()
+    toggle_save_view = views.toggle_recipe_save
+
+# read-only JSON API, versioned by path; reverse as 'api-v1:recipe-list' etc.
+router = DefaultRouter()
+router.register('recipes', api.RecipeViewSet, basename='recipe')
+router.register('saved', api.SavedRecipeViewSet, basename='saved')
+api_v1 = router.urls + [
+    path('recipes/<int:recipe_pk>/reviews/', api.ReviewViewSet.as_view({'get': 'list'}), name='recipe-reviews'),
+]
+
 urlpatterns = [
     path('select/', views.signup_selection, name='signup-select'),
     path('signup/chef/', views.chef_signup, name='chef-signup'),
     path('signup/user/', views.customer_signup, name='user-signup'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
-    path('dashboard/', RecipeListView.as_view(), name='dashboard'),
+    path('dashboard/', dashboard_view, name='dashboard'),
+    path('dashboard/feed/', RecipeFeedView.as_view(), name='dashboard-feed'),
     
     # Add this line to your existing urlpatterns
-    path('recipe/<int:pk>/save/', views.toggle_recipe_save, name='toggle-save'),
+    path('recipe/<int:pk>/save/', toggle_save_view, name='toggle-save'),
+    path('saved/batch/', views.batch_save_recipes, name='batch-save'),
+    path('export/<str:kind>/', views.export_data, name='export-data'),
     path('recommendation/', views.recommendation, name='recommendation'),
     path('reset-filters/', views.reset_filters, name='reset_filters'),
+    path('saved/', views.SavedRecipeListView.as_view(), name='saved-recipes'),
+    path('my-recipes/', views.ChefRecipeListView.as_view(), name='my-recipes'),
     # CRUD Operations
     path('recipe/new/', RecipeCreateView.as_view(), name='recipe_create'),
-    path('recipe/<int:pk>/', RecipeDetailView.as_view(), name='recipe-detail'),
+    path('recipe/<int:pk>/', recipe_detail_view, name='recipe-detail'),
+    path('recipe/<int:pk>/reviews/', views.recipe_reviews, name='recipe-reviews'),
     path('recipe/<int:pk>/update/', RecipeUpdateView.as_view(), name='recipe-update'),
     path('recipe/<int:pk>/delete/', RecipeDeleteView.as_view(), name='recipe-delete'),
 
+    path('api/v1/', include((api_v1, 'api-v1'))),
+    path('ops/db-pool/', views.db_pool_stats, name='db-pool-stats'),
+
     path('about/', TemplateView.as_view(template_name='users/about.html'), name='about'),
     path('terms_chef/', TemplateView.as_view(template_name='users/terms_chef.html'), name='terms-chef'),
     path('terms_user/', TemplateView.as_view(template_name='users/terms_user.html'), name='terms-user'),
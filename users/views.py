@@ -1,33 +1,118 @@
+import hashlib
+import os
 import json# convert between JSON strings and Python lists
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404# returns , redirect and get object or 404 error
 from django.contrib import messages# message framework for user feedback
 from django.contrib.auth import authenticate, login, logout# login and removes a user session
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin# blocks access to views based on authentication and user permissions
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView# display lists, details, create, update, delete views
 from django.views.generic.edit import FormMixin# mixin to add form handling to detail views used to submit reviews
 from django.urls import reverse_lazy, reverse# for URL resolution (lazy and immediate )
-from django.http import JsonResponse# for returning JSON responses used in saving recipes
-from django.db.models import Q, TextField# complex queries with OR conditions used for search functionality
-from django.db.models.functions import Cast# cast fields to different types for querying
-from .models import Recipe
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse# for returning JSON responses used in saving recipes
+from django.views.decorators.http import require_POST# state-changing endpoints only accept POST
+from django.template.loader import render_to_string# render the card fragments for the infinite scroll feed
+from django.db import connection
+from django.db.models import Exists, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from .models import Recipe, Review, SavedRecipe
 from django.contrib.auth.models import User
 from .forms import ChefSignUpForm, UserSignUpForm, LoginForm, RecipeForm, ReviewForm
+from .ingredients import recipe_lists
+from .pagination import KeysetPaginator
+from .cards import DETAIL_MARKUP_VERSION, recipe_generation, render_recipe_body, render_recipe_cards
+from .sidebar import get_sidebar, invalidate_sidebar, invalidate_recipe_sidebars, recipe_sidebar_users
+from .facets import recipe_facets
+from .filters import filter_recipes, filter_signature, param_conditions
+from .resultcache import cached_page
+from .export import EXPORTS, FORMATS as EXPORT_FORMATS, astream_export, stream_export
+from .session_filters import get_temp_filters, set_temp_filters
 
 
+MAX_BATCH_SAVE = 500# recipe ids accepted by one batch save request
+REVIEWS_PER_PAGE = 10# reviews on the detail page, the rest comes from the "load more" endpoint
+REVIEW_ORDERING = ['-created_at', '-id']
+
+
+@require_POST
 def toggle_recipe_save(request, pk):
     if not request.user.is_authenticated:
         return JsonResponse({'error': 'Login required'}, status=401)
 
-    recipe = get_object_or_404(Recipe, pk=pk)
-    user = request.user
-    if user.saved_recipes.filter(pk=pk).exists():# check the status of the saved recipe button
-        user.saved_recipes.remove(recipe)
-        saved = False
-    else:
-        user.saved_recipes.add(recipe)
-        saved = True
+    try:
+        # delete-or-insert in one transaction (see SavedRecipe.toggle), no exists() check to race against
+        saved, title, saved_count = SavedRecipe.toggle(request.user.pk, pk)
+    except Recipe.DoesNotExist:
+        raise Http404("No recipe matches the given query.")
+    invalidate_sidebar(request.user.pk)# the saved list in the sidebar changed
     # return JSON response indicating the new saved status
-    return JsonResponse({'saved': saved, 'recipe_title': recipe.title})# return the status to the js about the save button
+    return JsonResponse({'saved': saved, 'recipe_title': title, 'saved_count': saved_count})# return the status to the js about the save button
+
+
+def parse_batch_save(body):
+    """{"save": [ids], "unsave": [ids]} -> (save ids, unsave ids); raises ValueError with a message for the client."""
+    try:
+        data = json.loads(body or b'{}')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ValueError("Body must be JSON.")
+    if not isinstance(data, dict):
+        raise ValueError('Expected {"save": [...], "unsave": [...]}.')
+    lists = []
+    for key in ('save', 'unsave'):
+        ids = data.get(key) or []
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            raise ValueError(f'"{key}" must be a list of recipe ids.')
+        lists.append(list(dict.fromkeys(ids)))# dedupe, keep order
+    save_ids, unsave_ids = lists
+    if len(save_ids) + len(unsave_ids) > MAX_BATCH_SAVE:
+        raise ValueError(f"At most {MAX_BATCH_SAVE} recipe ids per request.")
+    if set(save_ids) & set(unsave_ids):
+        raise ValueError("A recipe id cannot be in both save and unsave.")
+    return save_ids, unsave_ids
+
+
+@require_POST
+def batch_save_recipes(request):
+    # offline clients replay their queued taps as the final state per recipe, applying it twice is harmless
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=401)
+    try:
+        save_ids, unsave_ids = parse_batch_save(request.body)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    missing = SavedRecipe.set_saved(request.user.pk, save_ids, unsave_ids)
+    invalidate_sidebar(request.user.pk)
+    return JsonResponse({
+        'saved': [pk for pk in save_ids if pk not in missing],
+        'unsaved': unsave_ids,
+        'missing': missing,
+    })
+
+def export_data(request, kind):
+    """A chef's own recipes, their reviews or saved-recipe edges, streamed (?format=jsonl|csv, ?gzip=1)."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=401)
+    if not request.user.is_chef:
+        return JsonResponse({'error': 'Only chefs can export their recipes'}, status=403)
+    fmt = request.GET.get('format', 'jsonl')
+    if kind not in EXPORTS or fmt not in EXPORT_FORMATS:
+        raise Http404("Unknown export.")
+    compress = request.GET.get('gzip') in ('1', 'true')
+
+    # an async iterator under ASGI, a sync one would be read into memory before the first byte is sent
+    stream = astream_export if isinstance(request, ASGIRequest) else stream_export
+    filename = f'{kind}.{fmt}' + ('.gz' if compress else '')
+    response = StreamingHttpResponse(
+        stream(kind, fmt, compress, chef=request.user),
+        content_type='application/gzip' if compress else EXPORT_FORMATS[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
 
 def terms_chef(request):
     return render(request, 'users/terms_chef.html')
@@ -90,136 +175,230 @@ def recommendation(request):
         diet = request.POST.get('dietary')      
         allergies = request.POST.get('allergies') 
         #
-        request.session['temp_filters'] = {
+        filters = {
             'health_condition': h_cond,
             'dietary': diet,
             'allergies': allergies 
         }
-        
-        return redirect('dashboard')
+        # session or signed cookie (users/session_filters.py), written only when they changed
+        return set_temp_filters(request, redirect('dashboard'), filters)
 
     return render(request, 'users/recommendation.html')
 
 def reset_filters(request):
-    if 'temp_filters' in request.session:
-        del request.session['temp_filters']
-    return redirect('dashboard')
+    return set_temp_filters(request, redirect('dashboard'), None)
+
+def uses_result_cache(request, recommendation_active):
+    # the unfiltered listing is already a short index scan, only filtered ones are worth caching
+    params = request.GET
+    return settings.RESULT_CACHE_ENABLED and bool(recommendation_active or params.get('q') or param_conditions(params))
+
+def next_page_urls(request, page):
+    # same filters as the current request, only the cursor moves forward
+    if not page.has_next():
+        return None, None
+    params = request.GET.copy()
+    params['cursor'] = page.next_cursor
+    query = params.urlencode()
+    return f"{reverse('dashboard')}?{query}", f"{reverse('dashboard-feed')}?{query}"
 
 class RecipeListView(LoginRequiredMixin, ListView):
     model = Recipe
     template_name = 'users/dashboard.html'# template name to redirect info to
     context_object_name = 'recipes'# custom object name you will use
-    ordering = ['-created_at']# display element as from the recent to the oldest
+    ordering = ['-created_at', '-id']# display element as from the recent to the oldest (id breaks ties for the cursor)
+    paginate_by = 24# cards per page, the rest is fetched by the feed while scrolling
+    with_facets = True# option counts of the filter panel (users/facets.py)
 
     def get_queryset(self):
-        queryset = super().get_queryset()# create a query set to take all info to be filter
+        queryset = super().get_queryset().select_related('chef')# chef names are shown on every card
+        # recommendation profile from the session + search/sidebar filters from GET (users/filters.py)
+        self.session_filters = get_temp_filters(self.request)
+        queryset, self.keyset_ordering, self.is_recommendation_active = filter_recipes(
+            queryset, self.session_filters, self.request.GET
+        )
+        return queryset# return the final filtered queryset
 
-        queryset = queryset.annotate(ingredient_str = Cast('ingredients', TextField()))# casting the json data into a string to be able to loop through it
-        session_filters = self.request.session.get('temp_filters', None)
-        self.is_recommendation_active = False# set recommendation to false by default to False
+    def paginate_queryset(self, queryset, page_size):
+        # keyset pagination: the cursor holds the (created_at, id) of the last card shown, no OFFSET scan
+        paginator = KeysetPaginator(page_size, getattr(self, 'keyset_ordering', self.ordering))
+        cursor = self.request.GET.get('cursor')
+        page = None
+        if uses_result_cache(self.request, getattr(self, 'is_recommendation_active', False)):
+            # same filters as many other users: ordered ids from the cache, then a primary key fetch
+            signature = filter_signature(self.session_filters, self.request.GET)
+            page = cached_page(queryset, Recipe.objects.select_related('chef'), signature, paginator, cursor)
+        if page is None:
+            page = paginator.paginate(queryset, cursor)
+        return paginator, page, page.object_list, page.has_next()
 
-        if session_filters:
-            h_cond = session_filters.get('health_condition')
-            diet = session_filters.get('dietary')
-            allergies_text = session_filters.get('allergies')
+    def get_context_data(self, **kwargs):# add extra context data to the template
+        context = super().get_context_data(**kwargs)
+        context['is_filtered'] = getattr(self, 'is_recommendation_active', False)
+        context['next_page_url'], context['next_feed_url'] = next_page_urls(self.request, context['page_obj'])
+        context['recipe_cards'] = render_recipe_cards(context['recipes'], self.request)# cached card fragments
+        if self.with_facets:
+            context['facets'] = recipe_facets(self.session_filters, self.request.GET)
+        return context
 
-            # Filter by Health
-            if h_cond and h_cond not in ['None', '', 'Select']:
-                queryset = queryset.filter(health_condition=h_cond)
-                self.is_recommendation_active = True
-            
-            # Filter by Diet
-            if diet and diet not in ['None', '', 'Select']:
-                queryset = queryset.filter(dietary=diet)
-                self.is_recommendation_active = True
-
-            # Excluse allergies
-            if allergies_text:
-                self.is_recommendation_active = True
-                raw_allergens = [a.strip().lower() for a in allergies_text.split(',') if a.strip()]# saparating each ingredient and converting it to lowercase
-                final_allergens = []
-                #loop to check if allergens are in raw allergen and also verify if it in plural
-                for allergen in raw_allergens:
-                    final_allergens.append(allergen)
-                    if allergen.endswith('s'):
-                        final_allergens.append(allergen[:-1])
-                    if allergen.endswith('es'):
-                        final_allergens.append(allergen[:-2])
-                #exclude all ingredients with the allergen
-                for allergen in final_allergens:
-                    queryset = queryset.exclude(ingredient_str__icontains=allergen)
-            
-            # 2. Search & Filters (GET request)
-        query = self.request.GET.get('q')#search query parameter
-        if query:# if a search query is provided
-            queryset = queryset.filter(#search in title, description, and origin country
-                Q(title__icontains=query) | # case-insensitive contains 
-                Q(description__icontains=query) | # case-insensitive contains
-                Q(origin_country__icontains=query)
-            )
-
-        dietary_query = self.request.GET.get('dietary')# dietary filter parameter
-        if dietary_query:# if a dietary filter is provided
-            queryset = queryset.filter(dietary=dietary_query)# filter by dietary
-        
-        min_price = self.request.GET.get('min_price')# minimum price filter parameter
-        max_price = self.request.GET.get('max_price')# maximum price filter parameter
-        try:
-            if min_price: 
-                queryset = queryset.filter(budget__gte=float(min_price))# filter by minimum budget
-            if max_price: 
-                queryset = queryset.filter(budget__lte=float(max_price))# filter by maximum budget
-        except ValueError:
-            pass # If they typed text instead of numbers, simply ignore the filter
-
-        meal_times = self.request.GET.getlist('meal_time')
-        if meal_times: #
-            queryset = queryset.filter(meal_time__in=meal_times)
-
-        meal_types = self.request.GET.getlist('meal_type')# verity if the mealtype was checked by the user
-        if meal_types: 
-            queryset = queryset.filter(meal_type__in=meal_types)# if present attach it to the query set
+class RecipeFeedView(RecipeListView):
+    # next page of dashboard cards for the infinite scroll, same filters as the dashboard
+    with_facets = False
+    def render_to_response(self, context, **response_kwargs):
+        html = render_to_string('users/partials/recipe_cards.html', context, request=self.request)
+        return JsonResponse({
+            'html': html,
+            'next': context['next_feed_url'],
+            'count': len(context['recipes']),
+        })
+
+class SavedRecipeListView(LoginRequiredMixin, ListView):
+    # "show all" page behind the sidebar's saved list, newest save first (index on user, -saved_at)
+    template_name = 'users/recipe_links.html'
+    context_object_name = 'links'
+    paginate_by = 50
 
-        return queryset# return the final filtered queryset
+    def get_queryset(self):
+        return (
+            SavedRecipe.objects.filter(user=self.request.user)
+            .order_by('-saved_at')
+            .values('saved_at', 'recipe_id', 'recipe__title')
+        )
 
-    def get_context_data(self, **kwargs):# add extra context data to the template
+    def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['is_filtered'] = getattr(self, 'is_recommendation_active', False)
+        context['heading'] = 'Saved Recipes'
+        context['links'] = [
+            {'pk': row['recipe_id'], 'title': row['recipe__title'], 'when': row['saved_at']}
+            for row in context['links']
+        ]
+        return context
+
+class ChefRecipeListView(LoginRequiredMixin, ListView):
+    # "show all" page behind the sidebar's made recipes list
+    template_name = 'users/recipe_links.html'
+    context_object_name = 'links'
+    paginate_by = 50
+
+    def get_queryset(self):
+        return (
+            Recipe.objects.filter(chef=self.request.user)
+            .order_by('-created_at', '-id')
+            .values('pk', 'title', 'created_at')
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['heading'] = 'My Recipes'
+        context['links'] = [
+            {'pk': row['pk'], 'title': row['title'], 'when': row['created_at']}
+            for row in context['links']
+        ]
         return context
 
+
+def detail_queryset(user):
+    """Recipes with what the detail page and its validators need, in one query."""
+    # newest review write, an edit included (upsert keeps created_at)
+    latest_review = Review.objects.filter(recipe=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+    queryset = Recipe.objects.select_related('chef').annotate(last_review_at=Subquery(latest_review))
+    if user.is_authenticated:
+        queryset = queryset.annotate(is_saved=Exists(SavedRecipe.objects.filter(user=user, recipe=OuterRef('pk'))))
+    return queryset
+
+
+def review_page(recipe_id, cursor=None):
+    # newest first over review_recipe_recent_idx, reviewers joined in
+    reviews = Review.objects.filter(recipe_id=recipe_id).select_related('user')
+    page = KeysetPaginator(REVIEWS_PER_PAGE, REVIEW_ORDERING).paginate(reviews, cursor)
+    next_url = page.has_next() and f"{reverse('recipe-reviews', args=[recipe_id])}?cursor={page.next_cursor}"
+    return page, next_url or None
+
+
+def recipe_body_context(recipe):
+    # context of the cached detail partials, only built on a cache miss
+    ingredients_list, instructions_list = recipe_lists(recipe)
+    page, next_reviews_url = review_page(recipe.pk)
+    return {
+        'recipe': recipe,
+        'reviews': page.object_list,
+        'next_reviews_url': next_reviews_url,
+        'ingredients_list': ingredients_list,
+        'instructions_list': instructions_list,
+    }
+
+
+def recipe_reviews(request, pk):
+    """Next page of a recipe's review feed for the "load more" button."""
+    page, next_url = review_page(pk, request.GET.get('cursor'))
+    if not page.object_list and not Recipe.objects.filter(pk=pk).exists():
+        raise Http404("No recipe matches the given query.")
+    html = render_to_string('users/partials/review_items.html', {'reviews': page.object_list}, request=request)
+    return JsonResponse({'html': html, 'next': next_url, 'count': len(page)})
+
+
+def detail_etag(request, recipe, generation):
+    """ETag of the detail page as request.user sees it.
+
+    The recipe part comes from updated_at, the latest review write and the cache
+    generation (bumped on any recipe/review change, deletions included); the
+    user part covers the header, the save button and the sidebar. There is no
+    Last-Modified: no timestamp covers a saved recipe or a deleted review.
+    """
+    state = [
+        DETAIL_MARKUP_VERSION, recipe.pk, generation, recipe.updated_at.timestamp(), recipe.last_review_at,
+        recipe.rating_count, recipe.chef.username,
+    ]
+    user = request.user
+    if user.is_authenticated:
+        state += [user.pk, user.username, user.first_name, user.last_name, user.email, recipe.is_saved, get_sidebar(user)]
+    return quote_etag(hashlib.md5(repr(state).encode()).hexdigest())
+
+
+def conditional_detail(request, recipe, generation):
+    """Return a 304 when the client's copy is current, else None; stores the ETag on the request."""
+    request.detail_etag = detail_etag(request, recipe, generation)
+    if messages.get_messages(request):# a flash message is shown once, the page must be rendered
+        return None
+    response = get_conditional_response(request, etag=request.detail_etag)
+    return response and add_validators(request, response)
+
+
+def add_validators(request, response):
+    response['ETag'] = request.detail_etag
+    patch_cache_control(response, private=True, no_cache=True)# the page is per user, always revalidate
+    return response
+
+
 class RecipeDetailView(FormMixin, DetailView):
     model = Recipe
     template_name = 'users/recipe_detail.html'
     context_object_name = 'recipe'
     form_class = ReviewForm 
 
+    def get_queryset(self):
+        return detail_queryset(self.request.user)# chef, latest review and saved flag in the same query
+
+    def get(self, request, *args, **kwargs):
+        generation = recipe_generation(self.kwargs['pk'])# before the row, see render_recipe_body
+        self.object = self.get_object()
+        not_modified = conditional_detail(request, self.object, generation)
+        if not_modified is not None:
+            return not_modified
+        context = self.get_context_data(object=self.object, generation=generation)
+        return add_validators(request, self.render_to_response(context))
+
     def get_success_url(self):# redirect to the same recipe detail page after form submission
         return reverse('recipe-detail', kwargs={'pk': self.object.pk})
 
     def get_context_data(self, **kwargs):# add extra context data to the template for ingredients and instructions
         context = super().get_context_data(**kwargs)# get the existing context data
         context['form'] = self.get_form()# add the review form to the context
-        
-        raw_ing = self.object.ingredients# get the raw ingredients data
-        # 1. Ingredients
-        if isinstance(raw_ing, list):# if it's already a list, use it directly
-            context['ingredients_list'] = raw_ing# assign to context
-        elif isinstance(raw_ing, str):# if it's a string, try to parse it as JSON
-            try:
-                context['ingredients_list'] = json.loads(raw_ing)# parse JSON string to list
-            except (json.JSONDecodeError, TypeError):# handle parsing errors
-                context['ingredients_list'] = [{'name': raw_ing, 'qty': ''}] # Fallback
-
-        # 2. Instructions
-        raw_inst = self.object.instructions# get the raw instructions data
-        if isinstance(raw_inst, list):# if it's already a list, use it directly
-            context['instructions_list'] = raw_inst# assign to context
-        elif isinstance(raw_inst, str):# if it's a string, try to parse it as JSON
-            try:
-                context['instructions_list'] = json.loads(raw_inst)# parse JSON string to list
-            except (json.JSONDecodeError, TypeError):# handle parsing errors
-                context['instructions_list'] = [raw_inst] # Fallback
-
+        context['is_saved'] = getattr(self.object, 'is_saved', False)# annotated by detail_queryset
+        generation = kwargs.get('generation')
+        if generation is None:# re-rendered after an invalid review form
+            generation = recipe_generation(self.object.pk)
+        context['recipe_body'] = render_recipe_body(self.object, generation, lambda: recipe_body_context(self.object))
         return context# return the final context data
 
     # Handle POST request for submitting reviews
@@ -236,11 +415,11 @@ class RecipeDetailView(FormMixin, DetailView):
             return self.form_invalid(form)
     # process valid form submission
     def form_valid(self, form):
-        review = form.save(commit=False)# create review instance without saving to database yet
-        review.recipe = self.object# link review to the current recipe
-        review.user = self.request.user# link review to the logged-in user
-        review.save()# save the review to the database
-        messages.success(self.request, "Review submitted!")
+        # a user has one review per recipe: posting again replaces the rating and text
+        _, created = Review.upsert(
+            self.object, self.request.user, form.cleaned_data['rating'], form.cleaned_data['content']
+        )
+        messages.success(self.request, "Review submitted!" if created else "Review updated!")
         return super().form_valid(form)# continue with the default form valid processing
 
 class RecipeDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
@@ -251,6 +430,13 @@ class RecipeDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         recipe = self.get_object()# get the current recipe object
         return self.request.user == recipe.chef# check if the logged-in user is the chef of the recipe
 
+    def form_valid(self, form):
+        # collect the sidebars showing this recipe before the cascade removes the saves
+        affected_users = recipe_sidebar_users(self.object)
+        response = super().form_valid(form)
+        invalidate_sidebar(*affected_users)
+        return response
+
 
 class RecipeCreateView(LoginRequiredMixin, CreateView):
     model = Recipe# table where data will be saved
@@ -307,6 +493,7 @@ class RecipeCreateView(LoginRequiredMixin, CreateView):
         else:
             recipe.health_condition = health_val 
         recipe.save()# save the recipe to the database
+        invalidate_sidebar(recipe.chef_id)# new entry in the chef's made recipes list
         return redirect(self.success_url)# redirect to the success URL
     
 class RecipeUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
@@ -358,4 +545,18 @@ class RecipeUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
             recipe.instructions = "[]"# saving an empty set to the db
 
         recipe.save()# save the data to the db after adding custom logic to it for validation
+        if 'title' in form.changed_data:# the sidebars only show titles, of the chef and of everyone who saved it
+            invalidate_recipe_sidebars(recipe)
         return redirect(self.success_url)# redirect to the success URL
+
+
+@staff_member_required
+def db_pool_stats(request):
+    """Connection pool counters of the worker process that serves the request, for sizing DB_POOL_*."""
+    pool = getattr(connection, 'pool', None)# only the PostgreSQL backend has one
+    return JsonResponse({
+        'pid': os.getpid(),# every gunicorn worker has its own pool, refresh to sample others
+        'vendor': connection.vendor,
+        'pool': pool.get_stats() if pool else None,
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+    })